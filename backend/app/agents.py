@@ -1,8 +1,19 @@
 import os
+import re
+import time
 import vertexai
 from vertexai.generative_models import GenerativeModel, SafetySetting
 from app.services.rag import RAGService
-from typing import List, Dict
+from app.services.sessions import MAX_RECENT_TURNS
+from app.services.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from app.services.metrics import AGENT_GENERATE_SECONDS
+from app.services.tracing import tracer, set_span_attributes
+from app.services.resilience import (
+    upstream, Deadline, UpstreamUnavailable, CHAT_DEADLINE_SECONDS, RETRIEVAL_BUDGET_SHARE, GEMINI_TIMEOUT_SECONDS
+)
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+from app.models import TopicScope
 
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
@@ -18,17 +29,39 @@ except Exception as e:
 class Agent:
     def __init__(self, model_name=None, system_instruction=""):
         # Use env var if no specific model passed
+        self.model_name = model_name or MODEL_NAME
         self.model = GenerativeModel(
-            model_name or MODEL_NAME,
+            self.model_name,
             system_instruction=system_instruction
         )
 
-    def generate(self, prompt: str) -> str:
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-             return f"Error generating content: {e}"
+    def generate(self, prompt: str, timeout: float = GEMINI_TIMEOUT_SECONDS) -> str:
+        """
+        Deadline-bounded, hedged Gemini call. Raises UpstreamUnavailable on
+        failure, timeout or an open circuit, so an error never reaches a script.
+        """
+        agent_name = type(self).__name__
+        start = time.perf_counter()
+        outcome = "ok"
+        with tracer.start_as_current_span("agent.generate", attributes={
+            "agent.name": agent_name, "llm.model": self.model_name, "llm.prompt_chars": len(prompt)
+        }) as span:
+            try:
+                # Each agent's prompts are alike in size, so each gets its own hedge delay
+                text = upstream(f"gemini:{self.model_name}").call(lambda: self.model.generate_content(prompt).text, timeout,
+                                                                  call_class=agent_name)
+                span.set_attribute("llm.result_chars", len(text))
+                return text
+            except UpstreamUnavailable as e:
+                 outcome = "error"
+                 span.record_exception(e)
+                 print(f"❌ {agent_name} generation failed: {e}")
+                 raise
+            finally:
+                span.set_attribute("llm.outcome", outcome)
+                AGENT_GENERATE_SECONDS.labels(
+                    agent=agent_name, model=self.model_name, outcome=outcome
+                ).observe(time.perf_counter() - start)
 
 class ResearchAgent(Agent):
     def __init__(self):
@@ -42,10 +75,11 @@ class ResearchAgent(Agent):
         )
         self.rag = RAGService(project_id=PROJECT_ID)
 
-    from typing import List, Dict
-    def research(self, query: str) -> str:
-        # 1. Retrieve from Vector DB
-        context = self.rag.search(query)
+    @tracer.start_as_current_span("agent.research")
+    def research(self, query: str, scope: Optional[TopicScope] = None) -> str:
+        # 1. Retrieve from Vector DB (scoped to the topic's book/pages when known)
+        context = self.rag.search(query, scope)
+        set_span_attributes({"research.query_chars": len(query), "research.context_chars": len(context)})
         
         # 2. Synthesize with Gemini
         prompt = f"""
@@ -70,17 +104,34 @@ class ChatAgent(Agent):
         )
         self.rag = RAGService(project_id=PROJECT_ID)
 
-    def chat(self, query: str, history: List[dict] = []) -> str:
+    @tracer.start_as_current_span("agent.chat")
+    def chat(self, query: str, history: List[dict] = [], summary: str = "", scope: Optional[TopicScope] = None,
+             deadline: Optional[Deadline] = None) -> str:
+        # One budget per turn: retrieval gets its share, generation whatever is left
+        deadline = deadline or Deadline(CHAT_DEADLINE_SECONDS)
         # 1. Rewrite Query if needed (Contextual RAG)
         search_query = self._rewrite_query(query, history)
+        set_span_attributes({"chat.history_turns": len(history), "chat.query_rewritten": search_query != query,
+                             "chat.summary_chars": len(summary)})
+
+        # 2. A classmate asked the same thing recently: reuse that answer. Only for a
+        #    conversation's opening question; follow-ups ("why?") depend on their own history
+        standalone = not history and not summary
+        cached = answer_cache.lookup(search_query, scope) if ANSWER_CACHE_ENABLED and standalone else None
+        if cached:
+            set_span_attributes({"chat.answer_cache_hit": cached["answer"] is not None,
+                                 "chat.answer_cache_similarity": cached["similarity"]})
+            if cached["answer"] is not None:
+                print(f"♻️ Answer cache hit ({cached['similarity']:.2f}) for: {search_query[:80]}")
+                return cached["answer"]
         
-        # 2. Retrieve from Vector DB
-        context = self.rag.search(search_query)
+        # 3. Retrieve from Vector DB
+        context = self.rag.search(search_query, scope, timeout=deadline.share(RETRIEVAL_BUDGET_SHARE))
         
-        # 3. Synthesize with Gemini (with History)
+        # 4. Synthesize with Gemini (with History)
         history_text = ""
         if history:
-             for turn in history[-3:]:
+             for turn in history[-MAX_RECENT_TURNS:]:
                  role = turn.get("role", "user")
                  content = turn.get("content", "")
                  history_text += f"{role}: {content}\n"
@@ -88,6 +139,9 @@ class ChatAgent(Agent):
         prompt = f"""
         You are an expert Tutor. Answer the query based on the Context and Conversation History.
         
+        Earlier Conversation (Summary):
+        {summary or "None"}
+        
         Conversation History:
         {history_text}
         
@@ -99,7 +153,10 @@ class ChatAgent(Agent):
         Task: Provide a helpful, accurate answer.
         If the query is "explain more", use the history to understand what to explain.
         """
-        return self.generate(prompt)
+        answer = self.generate(prompt, timeout=deadline.remaining())
+        if cached:
+            answer_cache.put(scope, cached, answer)
+        return answer
 
     def _rewrite_query(self, query: str, history: List[dict]) -> str:
         if not history: return query
@@ -125,6 +182,19 @@ class ScriptwriterAgent(Agent):
             Format: Use a Split-Script format (Audio | Visual)."""
         )
 
+@dataclass
+class ValidationVerdict:
+    approved: bool
+    confidence: Optional[float] = None # 0.0 to 1.0; None when the validator itself failed
+    reason: str = ""
+
+    @property
+    def status(self) -> str:
+        """video_library.status for a lesson rendered under this verdict."""
+        if self.confidence is None:
+            return "unvalidated"
+        return "processed" if self.approved else "flagged"
+
 class ValidationAgent(Agent):
     def __init__(self):
         super().__init__(
@@ -136,5 +206,82 @@ class ValidationAgent(Agent):
             2. Age Appropriateness (Is language simple?)
             3. Safety (No dangerous chemicals/experiments without warning).
             
-            Output: "APPROVED" or "REJECTED: <Reason>"."""
+            Output exactly two lines:
+            "APPROVED" or "REJECTED: <Reason>"
+            "CONFIDENCE: <0-100>" (how sure you are the script is accurate and safe)."""
+        )
+
+    def validate(self, fact_brief: str, script: str) -> ValidationVerdict:
+        prompt = f"""
+        Fact Brief:
+        {fact_brief}
+        
+        Script:
+        {script}
+        """
+        try:
+            text = self.generate(prompt)
+        except UpstreamUnavailable as e:
+            # Validation is advisory: a validator outage must not block lessons
+            return ValidationVerdict(approved=True, reason=str(e))
+
+        verdict = text.strip().splitlines()[0].strip() if text.strip() else ""
+        approved = verdict.upper().startswith("APPROVED")
+        reason = verdict.split(":", 1)[1].strip() if not approved and ":" in verdict else ""
+        match = re.search(r"CONFIDENCE:\s*(\d+(?:\.\d+)?)", text, re.IGNORECASE)
+        confidence = min(100.0, float(match.group(1))) / 100 if match else (0.9 if approved else 0.3)
+        return ValidationVerdict(approved=approved, confidence=round(confidence, 2), reason=reason or verdict)
+
+class SummarizerAgent(Agent):
+    def __init__(self):
+        super().__init__(
+            model_name=FAST_MODEL_NAME, # Cheap model; runs after the reply is sent
+            system_instruction="""You maintain a running summary of a student's tutoring conversation.
+            Keep the topics asked about, what was already explained, and any open questions.
+            Stay under 120 words. Output only the summary."""
         )
+
+    def summarize(self, previous_summary: str, turns: List[tuple]) -> str:
+        new_turns = "\n".join(f"{role}: {content}" for role, content in turns)
+        prompt = f"""
+        Current Summary:
+        {previous_summary or "None"}
+        
+        New Turns:
+        {new_turns}
+        
+        Task: Return the updated summary.
+        """
+        try:
+            return self.generate(prompt)
+        except UpstreamUnavailable:
+            # Keep the previous summary; the next fold retries
+            return previous_summary
+
+class TranslatorAgent(Agent):
+    def __init__(self):
+        super().__init__(
+            model_name=MODEL_NAME, # Uses Config; scripts are rendered, so quality matters
+            system_instruction="""You are an expert translator of school lesson scripts.
+            Translate the Audio column into the target language for students of that language.
+            Keep the Split-Script format (Audio | Visual), section headings, formulas,
+            units and [Figure <id>] references exactly as they are.
+            Output only the translated script."""
+        )
+
+    def translate(self, script: str, language: str, feedback: Optional[str] = None) -> str:
+        prompt = f"""
+        Target Language: {language}
+        
+        Script:
+        {script}
+        """
+        if feedback:
+            prompt += f"""
+        A reviewer rejected the previous translation for: {feedback}
+        Avoid that problem.
+        """
+        try:
+            return self.generate(prompt)
+        except UpstreamUnavailable as e:
+            raise Exception(f"Translation to {language} failed: {e}") from e
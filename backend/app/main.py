@@ -1,19 +1,41 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
-from app.models import GenerateLessonRequest, JobResponse, JobStatus, ChatRequest, ChatResponse, UploadURLRequest, ProcessFileRequest
-from app.services.heygen import HeyGenClient
-from app.agents import ResearchAgent, ScriptwriterAgent, ValidationAgent, ChatAgent
+from app.models import TopicScope, GenerateLessonRequest, BatchGenerateRequest, BatchResponse, BatchItem, JobResponse, JobStatus, TopicMatch, ChatRequest, ChatResponse, UploadURLRequest, BatchUploadURLRequest, ProcessFileRequest, IngestionStatus
+from app.services.heygen import HeyGenClient, HEYGEN_RENDER_ENABLED
+from app.agents import ResearchAgent, ScriptwriterAgent, ValidationAgent, ValidationVerdict, ChatAgent, SummarizerAgent, TranslatorAgent
 import uuid
 import os
+import re
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Dict, List, Optional, Tuple
 
-from app.services.db import DatabaseService
+from app.services.db import DatabaseService, BoundedCache, BASE_LESSON_LANGUAGE
 from app.services.parser import DocumentParser
-from app.services.stitcher import StitcherService
+from app.services.stitcher import StitcherService, LESSON_OUTPUT_FORMAT
 from app.services.storage import StorageService
-from pydantic import BaseModel
+from app.services.events import JobEventBus, format_sse
+from app.services.sessions import ChatSessionStore
+from app.services.jobs import JobStore, TERMINAL_STATUSES
+from app.services.diagrams import DiagramExtractor
+from app.services.renderer import SegmentedRenderer
+from app.services.rag import RAGService, topic_query, topic_context_cache
+from app.services.answer_cache import answer_cache
+from app.services.topic_index import topic_index
+from app.services.ingestion import IngestionCoordinator
+from app.services.admission import AdmissionController, AdmissionDecision, PIPELINE_WORKERS, client_identity
+from app.services.resilience import UpstreamUnavailable
+from app.services.tracing import tracer, set_span_attributes
+from opentelemetry.context import Context
+from app.services.metrics import (
+    PIPELINE_STAGE_SECONDS, LESSONS_TOTAL, QUEUE_DEPTH, JOBS_IN_FLIGHT, SCRIPT_VALIDATIONS, record_cache, render_metrics
+)
 
 # Initialize Services
 db_service = DatabaseService()
@@ -22,141 +44,714 @@ storage_service = StorageService()
 # Note: Parser requires DOCAI_PROCESSOR_ID env var to work effectively
 doc_parser = DocumentParser(project_id=os.getenv("GOOGLE_CLOUD_PROJECT", "demo"))
 
-jobs_db = {}
+job_store = JobStore(db_service)
+
+def _invalidate_retrieval_caches():
+    # Pinned contexts and cached chat answers were built from the old data store
+    topic_context_cache.clear()
+    answer_cache.clear()
+
+# One coordinator per process: uploads arriving close together share an import.
+# Retrieval caches are dropped once new documents are searchable.
+ingestion = IngestionCoordinator(
+    lambda: RAGService(project_id=os.getenv("GOOGLE_CLOUD_PROJECT")),
+    on_indexed=lambda uris: _invalidate_retrieval_caches(),
+    store=db_service,
+)
+job_events = JobEventBus()
+admission = AdmissionController()
+chat_sessions = ChatSessionStore(db_service)
+# Ids arrive from clients (/prefetch, /chat), so the cache is bounded
+topic_scopes = BoundedCache(int(os.getenv("MAX_CACHED_TOPIC_SCOPES", 5000)))
+
+def resolve_topic_scope(topic_id: str) -> TopicScope:
+    """
+    Topic -> book/page range. Found topics are cached (topics don't move);
+    unknown ids get a bare scope and are looked up again next time, so a
+    book ingested later scopes its topics as soon as they exist.
+    """
+    scope = topic_scopes.get(topic_id)
+    if scope is None:
+        scope = db_service.get_topic_scope(topic_id)
+        if scope is None:
+            return TopicScope(topic_id=topic_id)
+        topic_scopes[topic_id] = scope
+    return scope
+
+# Parsed book trees by source PDF; parsing is a long DocAI operation, so each book is parsed once
+book_structures: Dict[str, dict] = {}
+book_structure_locks: Dict[str, threading.Lock] = {}
+book_structure_locks_guard = threading.Lock()
+
+def load_book_structure(gcs_uri: str, refresh: bool = False) -> dict:
+    """Cached extract_hierarchy. Concurrent first requests for a book share one parse."""
+    if not refresh and gcs_uri in book_structures:
+        return book_structures[gcs_uri]
+    with book_structure_locks_guard:
+        lock = book_structure_locks.setdefault(gcs_uri, threading.Lock())
+    with lock:
+        if refresh or gcs_uri not in book_structures:
+            structure = doc_parser.extract_hierarchy(gcs_uri)
+            topic_index.add_hierarchy(structure)
+            book_structures[gcs_uri] = structure
+        return book_structures[gcs_uri]
+
+# Warm start: what recent traffic asked for most is loaded before the first request
+WARM_START_TOPICS = int(os.getenv("WARM_START_TOPICS", 50))
+WARM_START_BOOKS = int(os.getenv("WARM_START_BOOKS", 5))
+WARM_START_WINDOW_SECONDS = int(os.getenv("WARM_START_WINDOW_SECONDS", 7 * 86400))
+
+def _warm_start() -> List[str]:
+    """Preloads the hottest topics' library entries and scopes. Returns the hot topics."""
+    hot = db_service.get_hot_topics(WARM_START_TOPICS, WARM_START_WINDOW_SECONDS)
+    entries = db_service.preload_core_lessons(hot)
+    for topic_id in hot:
+        resolve_topic_scope(topic_id)
+    print(f"🔥 Warm start: {len(hot)} hot topic(s), {entries} library entr{'y' if entries == 1 else 'ies'} preloaded")
+    return hot
+
+def _warm_book_structures(hot: List[str]):
+    # Parsing can take minutes per book; runs after startup
+    for gcs_uri in db_service.get_book_uris(hot)[:WARM_START_BOOKS]:
+        try:
+            load_book_structure(gcs_uri)
+        except Exception as e:
+            print(f"⚠️ Warm start: could not parse {gcs_uri}: {e}")
+
+# Bounds concurrent pipelines per instance; admitted jobs beyond this wait as QUEUED
+pipeline_slots = threading.BoundedSemaphore(PIPELINE_WORKERS)
+# Core renders run here so the pipeline thread can validate the script meanwhile
+render_pool = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="render")
+# Batch items fan out here; each task still takes a pipeline slot before running
+batch_pool = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="batch")
+MAX_SCRIPT_REWRITES = int(os.getenv("MAX_SCRIPT_REWRITES", 2))
+
+def set_job_status(job_id: str, status: JobStatus, message: Optional[str] = None, result: Optional[str] = None):
+    """
+    Records a status transition (with per-stage durations) and pushes it to
+    the job's and the teacher's event streams.
+    """
+    job = job_store.transition(job_id, status, message, result)
+    if job is None:
+        return
+
+    streams = [f"job:{job_id}"]
+    if job.teacher_id:
+        streams.append(f"teacher:{job.teacher_id}")
+    job_events.publish(streams, _job_event(job))
+
+def _job_event(job) -> dict:
+    """Event payload for a job's current state (live transitions and stream snapshots)."""
+    return {
+        "job_id": job.job_id,
+        "status": job.status.value,
+        "message": job.message or f"Current Step: {job.status.value}",
+        "result": job.result,
+        "timestamp": job.updated_at,
+        "elapsed": round(job.updated_at - job.created_at, 3),
+        "stage_durations": dict(job.stage_durations or {}),
+    }
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Textbook RAG Platform Starting...")
+    # Free-text topic resolution needs the catalog; books ingested later are added one by one
+    await run_in_threadpool(topic_index.add_catalog, db_service.get_topic_catalog())
+    if not len(topic_index) and not doc_parser.client:
+        # Offline demo: index the same sample book /book-structure serves
+        await run_in_threadpool(load_book_structure, "default")
+    hot = await run_in_threadpool(_warm_start)
+    threading.Thread(target=_warm_book_structures, args=(hot,), name="warm-books", daemon=True).start()
     yield
     print("🛑 Shutting down...")
+    flushed = await run_in_threadpool(db_service.flush_library_writes)
+    print(f"💾 Flushed {flushed} pending library write(s)")
 
 app = FastAPI(title="Textbook-to-Video RAG Platform", lifespan=lifespan)
 
-async def process_lesson_job(job_id: str, request: GenerateLessonRequest):
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per HTTP request; background jobs open their own root span."""
+    route = request.url.path
+    with tracer.start_as_current_span(f"{request.method} {route}", attributes={
+        "http.method": request.method, "http.target": route
+    }) as span:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+        return response
+
+def process_lesson_job(job_id: str, request: GenerateLessonRequest):
     """
     Orchestrates the Smart Content Pipeline: Core Lesson Lookup -> Personalization -> Assembly.
+    Sync on purpose: BackgroundTasks runs it in the threadpool so the blocking
+    agent/ffmpeg calls don't stall the event loop (and the progress streams).
     """
-    print(f"[{job_id}] 🏁 Starting Lesson Orchestration for Topic: {request.topic_id}")
-    
+    try:
+        with pipeline_slots:
+            print(f"[{job_id}] 🏁 Starting Lesson Orchestration for Topic: {request.topic_id}")
+            QUEUE_DEPTH.dec()
+            JOBS_IN_FLIGHT.inc()
+            
+            # Empty context: the job outlives the POST, so it gets its own trace
+            with tracer.start_as_current_span("lesson.job", context=Context(), attributes={
+                "job.id": job_id, "topic.id": request.topic_id, "lesson.language": request.language
+            }):
+                _run_lesson_pipeline(job_id, request)
+    finally:
+        admission.job_finished(job_id)
+
+def _run_lesson_pipeline(job_id: str, request: GenerateLessonRequest):
     try:
         # services
         researcher = ResearchAgent()
         scriptwriter = ScriptwriterAgent()
         heygen = HeyGenClient()
-        db = DatabaseService()
+        db = db_service # Shared, so its connection pool and script caches carry across jobs
 
         # Step 1: Check Library for Core Lesson
-        jobs_db[job_id]["status"] = JobStatus.RESEARCHING # checking cache
-        core_video_url = db.get_core_lesson(request.topic_id)
+        set_job_status(job_id, JobStatus.RESEARCHING) # checking cache
+        core_lesson = _lookup_core_lesson(request.topic_id, db, request.language)
         
-        if not core_video_url:
-            print(f"[{job_id}] ⚡ Cache Miss. Generating Core Lesson from RAG...")
-            # 1.1 RAG lookup for Topic
-            # In a real app, RAGService would query by topic metadata ("Chapter 1.2")
-            fact_brief = researcher.research(f"Explain {request.topic_id}") 
-            
-            # 1.2 Script & Produce Core
-            jobs_db[job_id]["status"] = JobStatus.SCRIPTING
-            core_script = scriptwriter.generate(f"Create a 5-minute core lesson script on: {fact_brief}")
-            
-            # 1.3 Render Core
-            jobs_db[job_id]["status"] = JobStatus.RENDERING
-            # core_video_url = heygen.generate(core_script) # Simulated
-            core_video_url = "https://mock.com/core_lesson_coulombs.mp4"
-            
-            # 1.4 Cache it
-            db.cache_core_lesson(request.topic_id, core_video_url)
+        if not core_lesson:
+            print(f"[{job_id}] ⚡ Cache Miss. Generating {request.language} Core Lesson...")
+            core_lesson = _produce_core_lesson([job_id], request.topic_id, db, researcher, scriptwriter, heygen, request.language)
         else:
             print(f"[{job_id}] ✅ Library Hit! Using pre-generated Core Lesson.")
 
         # Step 2: Personalization (The Teacher's Layer)
-        jobs_db[job_id]["status"] = "PERSONALIZING" 
-        intro_prompt = f"Write a 15-second intro for {request.teacher_name}'s class. Topic: {request.topic_id}. Tone: {request.tone}. Date: Today."
-        intro_script = scriptwriter.generate(intro_prompt)
-        print(f"[{job_id}] 👤 Generated Custom Intro Script: {intro_script[:50]}...")
-        
-        # intro_video_url = heygen.generate(intro_script, avatar=request.avatar_id)
-        intro_video_url = "https://mock.com/custom_intro.mp4"
+        set_job_status(job_id, JobStatus.PERSONALIZING)
+        with PIPELINE_STAGE_SECONDS.labels("personalizing").time():
+            intro_script = scriptwriter.generate(_intro_prompt(request))
+            print(f"[{job_id}] 👤 Generated Custom Intro Script: {intro_script[:50]}...")
+            intro_video_url = _render_intro(intro_script, request)
 
         # Step 3: Stitching (Assembly)
-        jobs_db[job_id]["status"] = JobStatus.STITCHING
-        print(f"[{job_id}] 🧵 Stitching: [Custom Intro] + [Core Lesson]...")
+        _assemble_lesson(job_id, request, intro_video_url, core_lesson)
+
+    except Exception as e:
+        _fail_job(job_id, request.topic_id, e)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+def _lookup_core_lesson(topic_id: str, db: DatabaseService, language: str = BASE_LESSON_LANGUAGE) -> Optional[dict]:
+    with PIPELINE_STAGE_SECONDS.labels("core_lookup").time():
+        core_lesson = db.get_core_lesson(topic_id, language)
+    record_cache("core_lesson", bool(core_lesson))
+    set_span_attributes({"core_lesson.cache_hit": bool(core_lesson)})
+    return core_lesson
+
+def _produce_core_lesson(job_ids: List[str], topic_id: str, db: DatabaseService,
+                         researcher: ResearchAgent, scriptwriter: ScriptwriterAgent, heygen: HeyGenClient,
+                         language: str = BASE_LESSON_LANGUAGE) -> dict:
+    """
+    RAG -> Fact Brief -> Script (once per topic, in the base language)
+    -> Translate (once per language and script version) -> Render + Validate -> Library.
+    Every job in job_ids is waiting on this core lesson and sees the same status transitions.
+    """
+    source = db.get_core_source(topic_id)
+    record_cache("core_script", source is not None)
+    if source is None:
+        # 1.1 RAG lookup for Topic, scoped to its book/pages (uses pinned context if prefetched)
+        scope = resolve_topic_scope(topic_id)
+        with PIPELINE_STAGE_SECONDS.labels("research").time():
+            fact_brief = researcher.research(topic_query(scope), scope)
         
-        # Use the real Stitcher Service
-        final_video_url = stitcher_service.stitch(intro_video_url, core_video_url)
-        print(f"[{job_id}] ✅ Stiching Complete! Final URL: {final_video_url}")
+        # 1.2 Script & Produce Core
+        for job_id in job_ids:
+            set_job_status(job_id, JobStatus.SCRIPTING)
+        with PIPELINE_STAGE_SECONDS.labels("scripting").time():
+            core_script = scriptwriter.generate(_core_script_prompt(fact_brief, db.get_visual_assets(topic_id)))
+        source = db.save_core_source(topic_id, fact_brief, core_script)
+    else:
+        print(f"♻️ Reusing stored fact brief and script for {topic_id} (version {source['script_version']})")
+
+    if language == BASE_LESSON_LANGUAGE:
+        script = source["script"]
+        rewrite = lambda previous, reason: scriptwriter.generate(_rewrite_prompt(previous, reason))
+    else:
+        script = _translate_script(job_ids, topic_id, source, language, db)
+        rewrite = lambda previous, reason: TranslatorAgent().translate(source["script"], language, feedback=reason)
+    
+    # 1.3 Render Core while the validator checks the script
+    core_video_url, final_script, verdict = _render_validated(job_ids, source["fact_brief"], script, language, heygen, rewrite)
+    if final_script != script:
+        if language == BASE_LESSON_LANGUAGE:
+            source = db.save_core_source(topic_id, source["fact_brief"], final_script)
+        else:
+            db.save_translation(topic_id, language, source["script_version"], final_script)
+    
+    # 1.4 Cache it
+    db.cache_core_lesson(topic_id, core_video_url, language, transcript=final_script, version=source["script_version"],
+                         confidence=verdict.confidence, status=verdict.status)
+    return {"video_url": core_video_url, "confidence": verdict.confidence, "status": verdict.status}
+
+def _render_validated(job_ids: List[str], fact_brief: str, script: str, language: str,
+                      heygen: HeyGenClient, rewrite) -> Tuple[str, str, ValidationVerdict]:
+    """
+    Speculative render: HeyGen starts on the script immediately while the
+    fast validator checks it against the fact brief, so validation adds no
+    serial round-trip. A rejection cancels the render and rewrites the
+    script. After MAX_SCRIPT_REWRITES the last render is kept but flagged.
+    Returns (video_url, script rendered, verdict).
+    """
+    validator = ValidationAgent()
+    for attempt in range(MAX_SCRIPT_REWRITES + 1):
+        for job_id in job_ids:
+            set_job_status(job_id, JobStatus.RENDERING)
+        cancelled = threading.Event()
+        render = render_pool.submit(contextvars.copy_context().run, _render_core, script, language, heygen, cancelled)
+
+        with PIPELINE_STAGE_SECONDS.labels("validating").time():
+            verdict = validator.validate(fact_brief, script)
+        SCRIPT_VALIDATIONS.labels(verdict="error" if verdict.confidence is None else
+                                  "approved" if verdict.approved else "rejected").inc()
+        set_span_attributes({"validation.approved": verdict.approved, "validation.attempt": attempt})
+
+        if verdict.approved or attempt == MAX_SCRIPT_REWRITES:
+            # Only the part of the render that outlasted validation shows up here
+            with PIPELINE_STAGE_SECONDS.labels("rendering").time():
+                core_video_url = render.result()
+            return core_video_url, script, verdict
+
+        print(f"🛑 Script rejected ({verdict.reason}). Cancelling render and rewriting...")
+        cancelled.set()
+        for job_id in job_ids:
+            set_job_status(job_id, JobStatus.SCRIPTING, message=f"Rewriting script: {verdict.reason}")
+        with PIPELINE_STAGE_SECONDS.labels("scripting").time():
+            script = rewrite(script, verdict.reason)
+
+def _rewrite_prompt(script: str, reason: str) -> str:
+    return f"""
+    Revise this core lesson script. The reviewer rejected it for: {reason}
+    Fix that problem and keep everything else.
+    
+    Script:
+    {script}
+    """
+
+def _translate_script(job_ids: List[str], topic_id: str, source: dict, language: str, db: DatabaseService) -> str:
+    version = source["script_version"]
+    translated = db.get_translation(topic_id, language, version)
+    record_cache("translation", translated is not None)
+    if translated is None:
+        for job_id in job_ids:
+            set_job_status(job_id, JobStatus.SCRIPTING, message=f"Translating lesson to {language}")
+        with PIPELINE_STAGE_SECONDS.labels("translating").time():
+            translated = TranslatorAgent().translate(source["script"], language)
+        db.save_translation(topic_id, language, version, translated)
+    return translated
+
+def _render_core(core_script: str, language: str, heygen: HeyGenClient,
+                 cancelled: Optional[threading.Event] = None) -> Optional[str]:
+    """Returns the rendered video URL, or None if cancelled first."""
+    if HEYGEN_RENDER_ENABLED:
+        # One HeyGen job per script section, rendered in parallel and cached per section
+        return SegmentedRenderer(heygen, stitcher_service, db_service).render(core_script, language, cancelled)
+    # Simulated
+    if language == BASE_LESSON_LANGUAGE:
+        return "https://mock.com/core_lesson_coulombs.mp4"
+    return f"https://mock.com/core_lesson_coulombs_{language.lower()}.mp4"
+
+def _core_script_prompt(fact_brief: str, visuals: List[dict]) -> str:
+    prompt = f"Create a 5-minute core lesson script on: {fact_brief}"
+    if visuals:
+        # Textbook diagrams extracted at ingestion, for the Visual column
+        figures = "\n".join(f"- [Figure {v['asset_id']}] (page {v['page']}) {v['description'] or 'Untitled diagram'}" for v in visuals)
+        prompt += f"\n\nTextbook diagrams you can show (cite as [Figure <id>] in the Visual column):\n{figures}"
+    return prompt
+
+def _intro_prompt(request: GenerateLessonRequest) -> str:
+    return f"Write a 15-second intro for {request.teacher_name}'s class in {request.language}. Topic: {request.topic_id}. Tone: {request.tone}. Date: Today."
+
+def _render_intro(intro_script: str, request: GenerateLessonRequest) -> str:
+    # intro_video_url = heygen.generate(intro_script, avatar=request.avatar_id)
+    return "https://mock.com/custom_intro.mp4"
+
+def _assemble_lesson(job_id: str, request: GenerateLessonRequest, intro_video_url: str, core_lesson: dict):
+    set_job_status(job_id, JobStatus.STITCHING)
+    core_video_url = core_lesson["video_url"]
+    print(f"[{job_id}] 🧵 Stitching: [Custom Intro] + [Core Lesson]...")
+    
+    # HLS mode reuses the core's stored segments; mp4 mode writes a full file
+    with PIPELINE_STAGE_SECONDS.labels("stitching").time():
+        if LESSON_OUTPUT_FORMAT == "hls":
+            final_video_url = stitcher_service.stitch_hls(intro_video_url, core_video_url)
+        else:
+            final_video_url = stitcher_service.stitch(intro_video_url, core_video_url)
+    print(f"[{job_id}] ✅ Stiching Complete! Final URL: {final_video_url}")
+
+    set_job_status(job_id, JobStatus.COMPLETED, message=_ready_message(core_lesson), result=final_video_url)
+    LESSONS_TOTAL.labels(topic_id=_topic_label(request.topic_id), outcome="completed").inc()
+
+def _ready_message(core_lesson: dict) -> str:
+    message = "Lesson Ready!"
+    if core_lesson.get("confidence") is not None:
+        message += f" Confidence: {round(core_lesson['confidence'] * 100)}%"
+    if core_lesson.get("status") == "flagged":
+        message += " (flagged for review)"
+    return message
+
+def _fail_job(job_id: str, topic_id: str, error: Exception):
+    print(f"[{job_id}] ❌ Job Failed: {error}")
+    set_job_status(job_id, JobStatus.FAILED, message=str(error))
+    LESSONS_TOTAL.labels(topic_id=_topic_label(topic_id), outcome="failed").inc()
+
+def _topic_label(topic_id: Optional[str]) -> str:
+    # Request-supplied ids only become metric labels once they are known catalog topics
+    return topic_id if topic_id in topic_index else "unknown"
+
+def _write_intros_batch(requests: List[GenerateLessonRequest], scriptwriter: ScriptwriterAgent) -> Dict[str, str]:
+    """
+    One LLM call for every intro in a batch. Intros the model skipped are
+    generated individually so a partial answer never fails the batch.
+    """
+    first = requests[0]
+    topics = "\n".join(f"- {r.topic_id}" for r in requests)
+    prompt = f"""
+    Write a separate 15-second intro for each topic below for {first.teacher_name}'s class.
+    Language: {first.language}. Tone: {first.tone}. Date: Today.
+    Start each intro with a line '### <topic_id>' and nothing else on that line.
+
+    Topics:
+    {topics}
+    """
+    with PIPELINE_STAGE_SECONDS.labels("personalizing").time():
+        text = scriptwriter.generate(prompt)
+    intros = {}
+    for block in re.split(r"^\s*###\s*", text, flags=re.MULTILINE)[1:]:
+        heading, _, body = block.partition("\n")
+        if heading.strip() and body.strip():
+            intros[heading.strip()] = body.strip()
+
+    for r in requests:
+        if r.topic_id not in intros:
+            intros[r.topic_id] = scriptwriter.generate(_intro_prompt(r))
+    return intros
+
+def process_lesson_batch(batch_id: str, items: List[Tuple[str, GenerateLessonRequest]]):
+    """
+    Schedules a whole unit as one piece of work:
+    - each distinct topic's core lesson is looked up (and produced) once
+    - all intros come from a single batched LLM call
+    - core productions and assemblies fan out over batch_pool, each holding
+      its own pipeline slot, so a batch shares capacity with single jobs
+      instead of running serially on one permit
+    """
+    job_ids = [job_id for job_id, _ in items]
+    try:
+        print(f"[{batch_id}] 📚 Starting Batch of {len(items)} lessons")
+        with tracer.start_as_current_span("lesson.batch", context=Context(), attributes={
+            "batch.id": batch_id, "batch.size": len(items)
+        }):
+            _run_lesson_batch(batch_id, items)
+    finally:
+        for job_id in job_ids:
+            admission.job_finished(job_id)
+
+def _in_slot(fn, *args):
+    # One pipeline permit per unit of batch work, taken on the pool thread
+    with pipeline_slots:
+        return fn(*args)
+
+def _submit_batch_work(fn, *args):
+    return batch_pool.submit(contextvars.copy_context().run, _in_slot, fn, *args)
+
+def _assemble_batch_item(job_id: str, request: GenerateLessonRequest, intro_video_url: str, core_lesson: dict):
+    QUEUE_DEPTH.dec()
+    JOBS_IN_FLIGHT.inc()
+    try:
+        _assemble_lesson(job_id, request, intro_video_url, core_lesson)
+    except Exception as e:
+        _fail_job(job_id, request.topic_id, e)
+    finally:
+        JOBS_IN_FLIGHT.dec()
 
-        jobs_db[job_id]["status"] = JobStatus.COMPLETED
-        jobs_db[job_id]["message"] = f"Lesson Ready! Confidence: 94%"
-        jobs_db[job_id]["result"] = final_video_url
+def _run_lesson_batch(batch_id: str, items: List[Tuple[str, GenerateLessonRequest]]):
+    researcher = ResearchAgent()
+    scriptwriter = ScriptwriterAgent()
+    heygen = HeyGenClient()
+    db = db_service
+    pending = {job_id for job_id, _ in items}
 
+    try:
+        by_topic: Dict[str, List[Tuple[str, GenerateLessonRequest]]] = {}
+        for job_id, request in items:
+            by_topic.setdefault(request.topic_id, []).append((job_id, request))
+            set_job_status(job_id, JobStatus.RESEARCHING)
+
+        # 1. Shared core lookups
+        cores = {topic_id: _lookup_core_lesson(topic_id, db, group[0][1].language) for topic_id, group in by_topic.items()}
+
+        # 2. Intros for every distinct topic in one call
+        for job_id, _ in items:
+            set_job_status(job_id, JobStatus.PERSONALIZING)
+        intros = _write_intros_batch([group[0][1] for group in by_topic.values()], scriptwriter)
+        intro_urls = {topic_id: _render_intro(intros[topic_id], group[0][1]) for topic_id, group in by_topic.items()}
+
+        # 3. Hits assemble straight away; each miss produces its core once, then
+        #    its group assembles as soon as that core is ready
+        assemblies = []
+        productions = {}
+        for topic_id, group in by_topic.items():
+            if cores[topic_id]:
+                for job_id, request in group:
+                    assemblies.append(_submit_batch_work(_assemble_batch_item, job_id, request, intro_urls[topic_id], cores[topic_id]))
+                    pending.discard(job_id)
+            else:
+                print(f"[{batch_id}] ⚡ Cache Miss for {topic_id}. Producing core for {len(group)} lesson(s)...")
+                group_ids = [job_id for job_id, _ in group]
+                productions[_submit_batch_work(_produce_core_lesson, group_ids, topic_id, db, researcher, scriptwriter,
+                                               heygen, group[0][1].language)] = topic_id
+
+        for future in as_completed(productions):
+            topic_id = productions[future]
+            group = by_topic[topic_id]
+            try:
+                cores[topic_id] = future.result()
+            except Exception as e:
+                for job_id, _ in group:
+                    _fail_job(job_id, topic_id, e)
+                    QUEUE_DEPTH.dec()
+                    pending.discard(job_id)
+                continue
+            for job_id, request in group:
+                assemblies.append(_submit_batch_work(_assemble_batch_item, job_id, request, intro_urls[topic_id], cores[topic_id]))
+                pending.discard(job_id)
+
+        wait(assemblies)
     except Exception as e:
-        print(f"[{job_id}] ❌ Job Failed: {e}")
-        jobs_db[job_id]["status"] = JobStatus.FAILED
-        jobs_db[job_id]["message"] = str(e)
+        for job_id, request in items:
+            if job_id in pending:
+                _fail_job(job_id, request.topic_id, e)
+                QUEUE_DEPTH.dec()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/api/v1/book-structure")
 async def get_book_structure(gcs_uri: str = "default"):
     """
     Returns the Smart Topic Tree (Chapters > Topics)
     """
-    return doc_parser.extract_hierarchy(gcs_uri)
+    return await run_in_threadpool(load_book_structure, gcs_uri)
+
+@app.get("/api/v1/topics/search", response_model=List[TopicMatch])
+async def search_topics(q: str, limit: int = 5, book_id: Optional[str] = None):
+    """
+    Ranked topics for free text ("explain ohms law"), typo- and synonym-tolerant.
+    Served from memory; cheap enough to call on every keystroke.
+    """
+    return [TopicMatch(**match) for match in topic_index.search(q, limit=min(limit, 50), book_id=book_id)]
+
+TOPIC_ID_PATTERN = re.compile(r"^[A-Za-z0-9]+(?:_[A-Za-z0-9]+)+$") # "PHY12_01_02"
+
+def _resolve_topic(text: str) -> str:
+    """Topic id for an id or free text; 404 with the closest topics when nothing matches well."""
+    topic_id = topic_index.resolve(text)
+    if topic_id:
+        return topic_id
+    if TOPIC_ID_PATTERN.match(text.strip()):
+        # An id from a book this instance hasn't indexed yet; the pipeline resolves it as before
+        return text.strip()
+    suggestions = [f"{m['topic_id']} ({m['title']})" for m in topic_index.search(text, limit=3)]
+    raise HTTPException(
+        status_code=404,
+        detail=f"No topic matches '{text}'." + (f" Closest: {', '.join(suggestions)}" if suggestions else ""),
+    )
+
+def _enforce(decision: AdmissionDecision):
+    """Rejects fast with 429 + Retry-After instead of letting work pile up."""
+    if not decision.allowed and decision.permanent:
+        raise HTTPException(status_code=400, detail=decision.reason)
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=decision.reason,
+            headers={"Retry-After": str(decision.retry_after)},
+        )
+
+def _client_id(http_request: Request) -> str:
+    return client_identity(http_request.headers, http_request.client.host if http_request.client else None)
+
+@app.post("/api/v1/topics/{topic_id}/prefetch")
+async def prefetch_topic(topic_id: str, background_tasks: BackgroundTasks):
+    """
+    Called when a teacher opens a topic in the book tree.
+    Retrieves the topic's scoped context in the background and pins it, so
+    generating the lesson or chatting about it skips the retrieval round-trip.
+    """
+    scope = await run_in_threadpool(resolve_topic_scope, topic_id)
+    rag_service = RAGService(project_id=os.getenv("GOOGLE_CLOUD_PROJECT"))
+    background_tasks.add_task(rag_service.prefetch, scope)
+    return {"topic_id": topic_id, "scope": scope.dict(), "status": "prefetching"}
 
 @app.post("/api/v1/generate", response_model=JobResponse)
-async def generate_lesson(request: GenerateLessonRequest, background_tasks: BackgroundTasks):
+async def generate_lesson(request: GenerateLessonRequest, http_request: Request, background_tasks: BackgroundTasks):
+    if not request.topic_id and not request.topic_query:
+        raise HTTPException(status_code=400, detail="topic_id or topic_query is required")
+    if not request.topic_id:
+        request = request.copy(update={"topic_id": _resolve_topic(request.topic_query)})
+
     job_id = str(uuid.uuid4())
-    jobs_db[job_id] = {"job_id": job_id, "status": JobStatus.QUEUED}
+    teacher_id = request.teacher_id or request.teacher_name
+    _enforce(admission.admit_generate(job_id, _client_id(http_request)))
+
+    await run_in_threadpool(job_store.create, job_id, teacher_id, request.topic_id, None, request.topic_query)
+    set_job_status(job_id, JobStatus.QUEUED)
+    QUEUE_DEPTH.inc()
+    set_span_attributes({"job.id": job_id, "topic.id": request.topic_id})
     background_tasks.add_task(process_lesson_job, job_id, request)
     return JobResponse(
         job_id=job_id,
         status=JobStatus.QUEUED,
-        message="Request queued. The Brain is analyzing your query."
+        message="Request queued. The Brain is analyzing your query.",
+        topic_id=request.topic_id
+    )
+
+
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 50))
+
+@app.post("/api/v1/generate-batch", response_model=BatchResponse)
+async def generate_lesson_batch(request: BatchGenerateRequest, http_request: Request, background_tasks: BackgroundTasks):
+    """
+    Queues lessons for many topics with shared personalization settings.
+    Returns one batch id plus a job id per topic; each job also streams on /jobs/{id}/events.
+    """
+    if not request.topic_ids:
+        raise HTTPException(status_code=400, detail="topic_ids must not be empty")
+    # A batch bigger than the whole queue would be refused with 429 forever
+    max_batch = min(MAX_BATCH_SIZE, admission.max_queue_depth)
+    if len(request.topic_ids) > max_batch:
+        raise HTTPException(status_code=400, detail=f"At most {max_batch} topics per batch")
+
+    batch_id = str(uuid.uuid4())
+    teacher_id = request.teacher_id or request.teacher_name
+    shared = request.dict(exclude={"topic_ids"})
+    # Ids pass straight through the index; free-text entries keep their wording as topic_query
+    resolved = [(_resolve_topic(entry), entry) for entry in request.topic_ids]
+    items = [
+        (str(uuid.uuid4()), GenerateLessonRequest(topic_id=topic_id, topic_query=entry if entry != topic_id else None, **shared))
+        for topic_id, entry in resolved
+    ]
+    _enforce(admission.admit_batch([job_id for job_id, _ in items], _client_id(http_request)))
+
+    def register():
+        for job_id, item in items:
+            job_store.create(job_id, teacher_id, item.topic_id, batch_id, item.topic_query)
+            set_job_status(job_id, JobStatus.QUEUED)
+            QUEUE_DEPTH.inc()
+
+    await run_in_threadpool(register)
+    set_span_attributes({"batch.id": batch_id, "batch.size": len(items)})
+
+    background_tasks.add_task(process_lesson_batch, batch_id, items)
+    return BatchResponse(
+        batch_id=batch_id,
+        items=[BatchItem(topic_id=item.topic_id, job_id=job_id, status=JobStatus.QUEUED) for job_id, item in items],
+        message=f"{len(items)} lessons queued as one batch."
     )
 
+@app.get("/api/v1/batches/{batch_id}", response_model=BatchResponse)
+async def get_batch_status(batch_id: str):
+    jobs = await run_in_threadpool(job_store.get_batch, batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
 
+    items = [BatchItem(topic_id=job.topic_id, job_id=job.job_id, status=job.status, result=job.result) for job in jobs]
+    done = sum(1 for i in items if i.status in TERMINAL_STATUSES)
+    return BatchResponse(batch_id=batch_id, items=items, message=f"{done}/{len(items)} lessons finished.")
 
 @app.post("/api/v1/process-upload")
-async def process_upload(request: ProcessFileRequest):
+async def process_upload(request: ProcessFileRequest, background_tasks: BackgroundTasks):
     """
-    Triggers 1. Auto-Ingest to Vertex AI (Index)
+    Triggers 1. Auto-Ingest to Vertex AI (Index, coalesced with other uploads)
              2. Document AI Parsing (Topic Extraction)
+             3. Diagram Extraction into visual_assets (background)
+    Indexing progress: GET /api/v1/ingestion/status?gcs_uri=...
     """
     print(f"🔄 Processing Upload: {request.gcs_uri}")
     try:
-        # 1. Trigger Auto-Ingestion (Fire & Forget or Wait?)
-        # For responsiveness, we can background task it, 
-        # BUT user wants to know when "Indexing" is done.
-        # Vertex Import is long-running. We'll start it and return success.
-        rag_service = RAGService(project_id=os.getenv("GOOGLE_CLOUD_PROJECT"))
-        rag_service.import_documents(request.gcs_uri)
+        # 1. Queue for indexing; the coordinator batches it with nearby uploads
+        indexing = await run_in_threadpool(ingestion.submit, request.gcs_uri)
         
         # 2. Trigger Parsing (Topic Extraction)
-        # This returns the structure immediately (or mocked)
-        structure = doc_parser.extract_hierarchy(request.gcs_uri)
+        # Blocks on a long-running DocAI operation, so keep it off the event loop
+        structure = await run_in_threadpool(load_book_structure, request.gcs_uri, True)
+
+        # 3. Diagrams are CPU-heavy; run after responding
+        background_tasks.add_task(DiagramExtractor(db_service).extract_gcs, request.gcs_uri, structure["book_id"])
         
         return {
-            "message": "Ingestion started & Structure parsed.",
-            "structure": structure
+            "message": "Ingestion queued & Structure parsed.",
+            "structure": structure,
+            "indexing": IngestionStatus(**indexing)
         }
     except Exception as e:
         print(f"❌ Processing Failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/ingestion/status", response_model=IngestionStatus)
+async def get_ingestion_status(gcs_uri: str):
+    """
+    Indexing status of one uploaded file: pending -> queued -> importing -> indexed/failed.
+    """
+    status = await run_in_threadpool(ingestion.status, gcs_uri)
+    if status is None:
+        raise HTTPException(status_code=404, detail="File not submitted for ingestion")
+    return IngestionStatus(**status)
+
+@app.get("/api/v1/ingestion")
+async def get_ingestion_overview():
+    """
+    Files and import operations this instance is tracking: active ones plus
+    those finished within INGESTION_RETENTION_SECONDS.
+    """
+    return ingestion.snapshot()
+
+@app.get("/api/v1/chat/cache")
+async def get_answer_cache_stats():
+    """
+    Semantic answer cache on this instance: hit rate and the distribution of
+    best-match similarities (to tune ANSWER_CACHE_THRESHOLD).
+    """
+    return answer_cache.stats()
+
 @app.post("/api/v1/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request, background_tasks: BackgroundTasks):
     """
     Interactive Chat with RAG Context.
+    The conversation lives server-side: clients send only the new message and
+    the session_id returned by the previous turn.
     """
+    _enforce(admission.admit_chat(_client_id(http_request)))
     try:
+        session = await run_in_threadpool(chat_sessions.get_or_create, request.session_id)
+        # Legacy clients still send history; a session's own window wins once it exists
+        history = session.history() or request.history
+
+        scope = await run_in_threadpool(resolve_topic_scope, request.topic_id) if request.topic_id else None
         agent = ChatAgent()
-        # We can pass history to context if needed, 
-        # for now we're doing single-turn RAG for simplicity.
-        response_text = agent.chat(request.message, request.history)
+        response_text = await run_in_threadpool(agent.chat, request.message, history, session.summary, scope)
+
+        await run_in_threadpool(chat_sessions.append_exchange, session, request.message, response_text)
+        # Rolling summary is maintained off the request path
+        background_tasks.add_task(chat_sessions.fold_into_summary, session, SummarizerAgent().summarize)
         
         return ChatResponse(
             reply=response_text,
-            sources=["Textbook (RAG)"] 
+            sources=["Textbook (RAG)"],
+            session_id=session.session_id
         )
+    except UpstreamUnavailable as e:
+        # Out of budget or upstream degraded: fail fast rather than answer from nothing
+        print(f"⚠️ Chat Unavailable: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"❌ Chat Failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -167,22 +762,127 @@ async def get_upload_url(request: UploadURLRequest):
     Generates a generic Presigned URL to upload a file directly to GCS.
     """
     try:
-        return storage_service.generate_upload_url(request.filename, request.content_type)
+        # May open a resumable session or refresh signing credentials: blocking network calls
+        return await run_in_threadpool(storage_service.generate_upload_url, request.filename, request.content_type,
+                                       size=request.size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+MAX_UPLOAD_BATCH = int(os.getenv("MAX_UPLOAD_BATCH", 100))
+
+@app.post("/api/v1/upload-urls")
+async def get_upload_urls(request: BatchUploadURLRequest):
+    """
+    Generates upload URLs for many files in one call.
+    Small files get signed PUT URLs; large PDFs get resumable session URLs.
+    """
+    if len(request.files) > MAX_UPLOAD_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_UPLOAD_BATCH} files per request")
+    try:
+        files = [f.dict() for f in request.files]
+        # Signing and opening resumable sessions are blocking GCS calls
+        uploads = await run_in_threadpool(storage_service.generate_upload_urls, files, origin=request.origin)
+        return {"uploads": uploads}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/jobs/{job_id}", response_model=JobResponse)
 async def get_job_status(job_id: str):
-    if job_id not in jobs_db:
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    job = jobs_db[job_id]
+
     return JobResponse(
         job_id=job_id,
-        status=job["status"],
-        message=job.get("message", f"Current Step: {job['status']}")
+        status=job.status,
+        message=job.message or f"Current Step: {job.status.value}",
+        result=job.result,
+        topic_id=job.topic_id
     )
 
+# Job streams re-read the stored job this often, to follow jobs running on other instances
+JOB_STREAM_POLL_SECONDS = float(os.getenv("JOB_STREAM_POLL_SECONDS", 5))
+
+def _event_stream(request: Request, stream_key: str, last_event_id: int, job_id: Optional[str] = None):
+    """
+    SSE response for a stream. A job stream (job_id set) starts with a snapshot
+    of the job's stored state, so it is correct even when this instance never
+    saw the job's events (restart, evicted history, job running elsewhere),
+    follows live events, re-reads the job every JOB_STREAM_POLL_SECONDS and
+    closes once the job is COMPLETED/FAILED.
+    """
+    async def generator():
+        last_seen = 0.0 # updated_at of the newest job state sent
+        after = last_event_id
+        if job_id:
+            cursor = job_events.cursor() # events after this are replayed, none are missed
+            job = await run_in_threadpool(job_store.get, job_id)
+            if job is not None:
+                # Event ids are wall-clock microseconds, so a client holding this state has a newer id
+                state_id = max(cursor, int(job.updated_at * 1_000_000))
+                if state_id > last_event_id:
+                    yield format_sse(state_id, _job_event(job))
+                    last_seen = job.updated_at
+                if job.finished:
+                    return
+            after = max(after, cursor)
+
+        heartbeat = JOB_STREAM_POLL_SECONDS if job_id else 15.0
+        async for item in job_events.subscribe(stream_key, after, heartbeat=heartbeat):
+            if await request.is_disconnected():
+                break
+            if item is None:
+                job = await run_in_threadpool(job_store.get, job_id) if job_id else None
+                if job is not None and job.updated_at > last_seen:
+                    # Changed without an event here: the job runs on another instance
+                    yield format_sse(max(job_events.cursor(), int(job.updated_at * 1_000_000)), _job_event(job))
+                    last_seen = job.updated_at
+                    if job.finished:
+                        break
+                    continue
+                yield format_sse(None, None)
+                continue
+            event_id, payload = item
+            yield format_sse(event_id, payload)
+            last_seen = max(last_seen, payload.get("timestamp") or 0.0)
+            if job_id and payload["status"] in (s.value for s in TERMINAL_STATUSES):
+                break
+
+    return StreamingResponse(
+        generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _resume_from(last_event_id_header: Optional[str], last_event_id: Optional[int]) -> int:
+    # EventSource sends Last-Event-ID on reconnect; the query param covers manual clients
+    if last_event_id is not None:
+        return last_event_id
+    try:
+        return int(last_event_id_header) if last_event_id_header else 0
+    except ValueError:
+        return 0
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request, last_event_id: Optional[int] = None,
+                            last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """
+    Server-Sent Events stream of a job's status transitions.
+    Starts with the job's current state (skipped when Last-Event-ID is already
+    newer) and closes after COMPLETED/FAILED.
+    """
+    if await run_in_threadpool(job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _event_stream(request, f"job:{job_id}", _resume_from(last_event_id_header, last_event_id), job_id=job_id)
+
+@app.get("/api/v1/teachers/{teacher_id}/events")
+async def stream_teacher_events(teacher_id: str, request: Request, last_event_id: Optional[int] = None,
+                                last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """
+    Server-Sent Events stream of every job transition for one teacher.
+    """
+    return _event_stream(request, f"teacher:{teacher_id}", _resume_from(last_event_id_header, last_event_id))
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8080))
@@ -1,20 +1,36 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, constr
 from typing import List, Optional
 from enum import Enum
 
 class JobStatus(str, Enum):
+    QUEUED = "QUEUED"
     PENDING = "PENDING"
     RESEARCHING = "RESEARCHING"
     SCRIPTING = "SCRIPTING"
     VALIDATING = "VALIDATING"
     RENDERING = "RENDERING"
+    PERSONALIZING = "PERSONALIZING"
     STITCHING = "STITCHING"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
 
+# teacher_jobs.topic_query and teacher_id are VARCHAR(255); longer text would fail the job row's insert
+MAX_TOPIC_QUERY_LENGTH = 255
+MAX_TEACHER_ID_LENGTH = 255
+
 class GenerateLessonRequest(BaseModel):
-    topic_id: str  # "PHY12_01_02"
-    teacher_name: str = "Teacher"
+    topic_id: Optional[str] = None  # "PHY12_01_02"
+    topic_query: Optional[str] = Field(None, max_length=MAX_TOPIC_QUERY_LENGTH) # Free text ("Explain Coulomb's law") resolved to a topic when topic_id is omitted
+    teacher_id: Optional[str] = Field(None, max_length=MAX_TEACHER_ID_LENGTH) # Defaults to teacher_name for per-teacher streams
+    teacher_name: str = Field("Teacher", max_length=MAX_TEACHER_ID_LENGTH)
+    language: str = "English"
+    tone: str = "Exam Focus"
+    avatar_id: Optional[str] = None
+
+class BatchGenerateRequest(BaseModel):
+    topic_ids: List[constr(max_length=MAX_TOPIC_QUERY_LENGTH)] # One lesson per entry, e.g. a whole unit; entries may be free text
+    teacher_id: Optional[str] = Field(None, max_length=MAX_TEACHER_ID_LENGTH)
+    teacher_name: str = Field("Teacher", max_length=MAX_TEACHER_ID_LENGTH)
     language: str = "English"
     tone: str = "Exam Focus"
     avatar_id: Optional[str] = None
@@ -24,6 +40,33 @@ class JobResponse(BaseModel):
     status: JobStatus
     message: str = ""
     result: Optional[str] = None
+    topic_id: Optional[str] = None # The topic the request resolved to
+
+class BatchItem(BaseModel):
+    topic_id: str
+    job_id: str
+    status: JobStatus
+    result: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    items: List[BatchItem]
+    message: str = ""
+
+class TopicScope(BaseModel):
+    """Where a topic lives in the library; used to scope retrieval."""
+    topic_id: str
+    title: Optional[str] = None
+    book_id: Optional[str] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+
+class TopicMatch(BaseModel):
+    topic_id: str
+    title: str
+    chapter: str = ""
+    book_id: Optional[str] = None
+    score: float # 0..1; free text resolves when the best score reaches TOPIC_MATCH_MIN_SCORE
 
 class TopicItem(BaseModel):
     topic_id: str
@@ -41,15 +84,32 @@ class BookStructure(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    history: List[dict] = [] # [{"role": "user", "content": "..."}]
+    topic_id: Optional[str] = None # Scopes retrieval to the topic open in the book tree
+    session_id: Optional[str] = None # Server-side conversation; omit to start a new one
+    teacher_id: Optional[str] = None # Informational only: rate limits key on the caller (see client_identity)
+    history: List[dict] = [] # Legacy: only used when no session_id is sent
 
 class ChatResponse(BaseModel):
     reply: str
     sources: List[str] = []
+    session_id: Optional[str] = None
 
 class UploadURLRequest(BaseModel):
     filename: str
     content_type: str = "application/pdf"
+    size: Optional[int] = None # Bytes. Large files get a resumable session URL
+
+class BatchUploadURLRequest(BaseModel):
+    files: List[UploadURLRequest]
+    origin: Optional[str] = None # Browser origin, needed for CORS on resumable sessions
 
 class ProcessFileRequest(BaseModel):
     gcs_uri: str
+
+class IngestionStatus(BaseModel):
+    gcs_uri: str
+    status: str # pending, queued, importing, indexed, failed
+    operation: Optional[str] = None # Discovery Engine import operation id
+    error: Optional[str] = None
+    submitted_at: float
+    updated_at: float
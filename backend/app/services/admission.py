@@ -0,0 +1,276 @@
+import os
+import time
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Pipeline capacity: lesson jobs that may render at once on one instance
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 8))
+# Jobs allowed in the system (queued + running) before /generate sheds load
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", PIPELINE_WORKERS * 4))
+
+# Token buckets: (refill per minute, burst); per client identity and across all clients
+GENERATE_CLIENT_LIMIT = (float(os.getenv("GENERATE_CLIENT_PER_MIN", 5)), int(os.getenv("GENERATE_CLIENT_BURST", 10)))
+GENERATE_GLOBAL_LIMIT = (float(os.getenv("GENERATE_GLOBAL_PER_MIN", 120)), int(os.getenv("GENERATE_GLOBAL_BURST", 60)))
+CHAT_CLIENT_LIMIT = (float(os.getenv("CHAT_CLIENT_PER_MIN", 30)), int(os.getenv("CHAT_CLIENT_BURST", 20)))
+CHAT_GLOBAL_LIMIT = (float(os.getenv("CHAT_GLOBAL_PER_MIN", 1200)), int(os.getenv("CHAT_GLOBAL_BURST", 200)))
+
+# Proxies in front of the app that append to X-Forwarded-For (1 on Cloud Run, 2 behind an
+# external load balancer). 0 trusts no header: the peer address is the client.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+# Header carrying the signed-in user when IAP fronts the app (X-Goog-Authenticated-User-Email).
+# Only set this when every request passes through IAP; otherwise clients can forge it.
+IDENTITY_HEADER = os.getenv("IDENTITY_HEADER", "")
+
+# Jobs older than this are assumed dead (crashed instance) and stop counting toward depth
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 3600))
+DRAIN_WINDOW_SECONDS = 600
+# Used for Retry-After before any job has finished
+DEFAULT_JOB_SECONDS = float(os.getenv("DEFAULT_JOB_SECONDS", 60))
+MAX_RETRY_AFTER = 600
+
+def client_identity(headers, peer: Optional[str]) -> str:
+    """
+    Rate-limit key for a request: the authenticated user when IDENTITY_HEADER
+    is configured, else the client address. Body fields (teacher_id/name) are
+    never used: any caller could pick a fresh one per request.
+    """
+    if IDENTITY_HEADER:
+        user = headers.get(IDENTITY_HEADER.lower())
+        if user:
+            return f"user:{user}"
+    if TRUSTED_PROXY_HOPS:
+        # Each trusted proxy appends the address it saw; anything further left is client-supplied
+        forwarded = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return f"ip:{forwarded[-TRUSTED_PROXY_HOPS]}"
+    return f"ip:{peer or 'unknown'}"
+
+@dataclass
+class AdmissionDecision:
+    allowed: bool
+    retry_after: int = 0
+    reason: str = ""
+    permanent: bool = False # Retrying the same request can never succeed
+
+class MemoryCounterStore:
+    """
+    In-process fallback. Limits are per instance when Redis is unavailable.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._jobs = {}
+        self._completions = deque()
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (float(burst), now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def refund(self, key: str, burst: int, amount: float):
+        with self._lock:
+            if key in self._buckets:
+                tokens, ts = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + amount), ts)
+
+    def add_job(self, job_id: str):
+        with self._lock:
+            self._jobs[job_id] = time.time()
+
+    def remove_job(self, job_id: str):
+        now = time.time()
+        with self._lock:
+            if self._jobs.pop(job_id, None) is not None:
+                self._completions.append(now)
+
+    def queue_depth(self) -> int:
+        cutoff = time.time() - JOB_LEASE_SECONDS
+        with self._lock:
+            for job_id in [j for j, ts in self._jobs.items() if ts < cutoff]:
+                del self._jobs[job_id]
+            return len(self._jobs)
+
+    def completions_since(self, since: float) -> int:
+        with self._lock:
+            while self._completions and self._completions[0] < since:
+                self._completions.popleft()
+            return len(self._completions)
+
+class RedisCounterStore:
+    """
+    Shared store so limits hold across every instance behind the load balancer.
+    """
+    TOKEN_BUCKET_LUA = """
+    local tokens_key = KEYS[1]
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local data = redis.call('HMGET', tokens_key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    local retry = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    else
+        retry = (cost - tokens) / rate
+    end
+    redis.call('HSET', tokens_key, 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', tokens_key, math.ceil(burst / rate) + 60)
+    return {allowed, tostring(retry)}
+    """
+
+    REFUND_LUA = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    if tokens then
+        redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + tonumber(ARGV[2])))
+    end
+    return 0
+    """
+
+    JOBS_KEY = "admission:jobs"
+    COMPLETIONS_KEY = "admission:completions"
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client.ping()
+        self._take = self.client.register_script(self.TOKEN_BUCKET_LUA)
+        self._refund = self.client.register_script(self.REFUND_LUA)
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry = self._take(keys=[f"admission:bucket:{key}"], args=[rate, burst, time.time(), cost])
+        return bool(int(allowed)), float(retry)
+
+    def refund(self, key: str, burst: int, amount: float):
+        self._refund(keys=[f"admission:bucket:{key}"], args=[burst, amount])
+
+    def add_job(self, job_id: str):
+        self.client.zadd(self.JOBS_KEY, {job_id: time.time()})
+
+    def remove_job(self, job_id: str):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zrem(self.JOBS_KEY, job_id)
+        pipe.zadd(self.COMPLETIONS_KEY, {job_id: now})
+        pipe.zremrangebyscore(self.COMPLETIONS_KEY, 0, now - DRAIN_WINDOW_SECONDS)
+        pipe.execute()
+
+    def queue_depth(self) -> int:
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.JOBS_KEY, 0, time.time() - JOB_LEASE_SECONDS)
+        pipe.zcard(self.JOBS_KEY)
+        return int(pipe.execute()[1])
+
+    def completions_since(self, since: float) -> int:
+        return int(self.client.zcount(self.COMPLETIONS_KEY, since, "+inf"))
+
+class AdmissionController:
+    """
+    Admission control for /generate and /chat:
+    - per-client (see client_identity) and global token buckets
+    - a cap on jobs in the system, sized from pipeline capacity
+    - Retry-After derived from the observed queue drain rate
+    Uses Redis when REDIS_URL is set and reachable, else per-instance memory.
+    """
+    def __init__(self, redis_url: Optional[str] = None, max_queue_depth: int = MAX_QUEUE_DEPTH):
+        self.max_queue_depth = max_queue_depth
+        self.store = MemoryCounterStore()
+        redis_url = redis_url or os.getenv("REDIS_URL")
+        if redis_url:
+            if redis is None:
+                print("⚠️ REDIS_URL set but redis package missing. Using in-process rate limits.")
+            else:
+                try:
+                    self.store = RedisCounterStore(redis_url)
+                    print("✅ Admission control using shared Redis counters.")
+                except Exception as e:
+                    print(f"⚠️ Redis unavailable ({e}). Using in-process rate limits.")
+
+    def _call(self, fn, *args, default=None):
+        # Fail open if the shared store hiccups: rate limiting must not take the API down
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"⚠️ Admission store error: {e}")
+            return default
+
+    def drain_rate(self) -> float:
+        """Jobs finished per second over the recent window (all instances when shared)."""
+        completed = self._call(self.store.completions_since, time.time() - DRAIN_WINDOW_SECONDS, default=0)
+        return completed / DRAIN_WINDOW_SECONDS
+
+    def _queue_retry_after(self, depth: int) -> int:
+        excess = depth - self.max_queue_depth + 1
+        rate = self.drain_rate()
+        seconds = excess / rate if rate > 0 else excess * DEFAULT_JOB_SECONDS / PIPELINE_WORKERS
+        return _clamp_retry(seconds)
+
+    def _take_buckets(self, scope: str, client_id: str, client_limit, global_limit, cost: int = 1) -> AdmissionDecision:
+        """Takes `cost` tokens from both buckets, or from neither."""
+        buckets = ((f"{scope}:client:{client_id}", client_limit, "Client"), (f"{scope}:global", global_limit, "Global"))
+        for _, (_, burst), label in buckets:
+            if cost > burst:
+                # Every item pays full price; a bucket can't ever hold this many tokens
+                return AdmissionDecision(False, reason=f"At most {burst} lessons per request ({label.lower()} {scope} burst).",
+                                         permanent=True)
+        taken = []
+        for key, (per_min, burst), label in buckets:
+            allowed, retry = self._call(self.store.take, key, per_min / 60.0, burst, cost, default=(True, 0.0))
+            if not allowed:
+                for taken_key, taken_burst in taken:
+                    self._call(self.store.refund, taken_key, taken_burst, cost)
+                return AdmissionDecision(False, _clamp_retry(retry), f"{label} {scope} rate limit exceeded.")
+            taken.append((key, burst))
+        return AdmissionDecision(True)
+
+    def admit_generate(self, job_id: str, client_id: str) -> AdmissionDecision:
+        depth = self._call(self.store.queue_depth, default=0)
+        if depth >= self.max_queue_depth:
+            return AdmissionDecision(False, self._queue_retry_after(depth), "Lesson queue is full. Please retry shortly.")
+
+        decision = self._take_buckets("generate", client_id, GENERATE_CLIENT_LIMIT, GENERATE_GLOBAL_LIMIT)
+        if decision.allowed:
+            self._call(self.store.add_job, job_id)
+        return decision
+
+    def admit_batch(self, job_ids: List[str], client_id: str) -> AdmissionDecision:
+        """Admits a whole batch or none of it; each item counts toward queue depth."""
+        if len(job_ids) > self.max_queue_depth:
+            return AdmissionDecision(False, reason=f"At most {self.max_queue_depth} lessons fit in the queue at once.",
+                                     permanent=True)
+        depth = self._call(self.store.queue_depth, default=0)
+        if depth + len(job_ids) > self.max_queue_depth:
+            return AdmissionDecision(False, self._queue_retry_after(depth + len(job_ids) - 1),
+                                     f"Lesson queue cannot take {len(job_ids)} more lessons right now.")
+
+        decision = self._take_buckets("generate", client_id, GENERATE_CLIENT_LIMIT, GENERATE_GLOBAL_LIMIT, cost=len(job_ids))
+        if decision.allowed:
+            for job_id in job_ids:
+                self._call(self.store.add_job, job_id)
+        return decision
+
+    def admit_chat(self, client_id: str) -> AdmissionDecision:
+        return self._take_buckets("chat", client_id, CHAT_CLIENT_LIMIT, CHAT_GLOBAL_LIMIT)
+
+    def job_finished(self, job_id: str):
+        self._call(self.store.remove_job, job_id)
+
+def _clamp_retry(seconds: float) -> int:
+    return int(min(MAX_RETRY_AFTER, max(1, math.ceil(seconds))))
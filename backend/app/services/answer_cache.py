@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import zlib
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+import numpy as np
+from app.services.metrics import ANSWER_CACHE_SIMILARITY, record_cache
+from app.services.resilience import upstream
+from app.models import TopicScope
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# "vertex" (text embeddings) or "hashing" (offline, deterministic); default follows credentials
+ANSWER_CACHE_EMBEDDER = os.getenv("ANSWER_CACHE_EMBEDDER", "vertex" if os.getenv("GOOGLE_CLOUD_PROJECT") else "hashing")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-004")
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", 1))
+# Classmates ask within minutes; older answers are not reused
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 900))
+# Recent answers kept per book/topic; the oldest slot is overwritten first
+ANSWER_CACHE_SCOPE_SIZE = int(os.getenv("ANSWER_CACHE_SCOPE_SIZE", 512))
+MAX_CACHED_SCOPES = int(os.getenv("MAX_CACHED_SCOPES", 200))
+SIMILARITY_WINDOW = 1000
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Question scaffolding carries no meaning for matching
+STOP_WORDS = frozenset(
+    "a an the is are was were be of in on to for and or what whats how why which who does do did "
+    "can could please tell me about i you it this that with".split()
+)
+
+def _terms(text: str) -> List[str]:
+    """Lowercased content words; apostrophes and plural 's' dropped (Coulomb's -> coulomb)."""
+    words = _WORD.findall(text.lower().replace("'", "").replace("\u2019", ""))
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+            for w in words if w not in STOP_WORDS]
+
+class HashingEmbedder:
+    """
+    Offline embedder: hashed word and character-trigram counts, L2-normalized.
+    Deterministic across processes, so tests and benchmarks need no credentials.
+    Catches rewordings that share content words ("what's coulomb's law" / "define coulombs law").
+    """
+    name = "hashing"
+    default_threshold = 0.85
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _terms(text):
+            features = [(word, 1.0)] + [(f"#{g}", 0.5) for g in self._trigrams(word)]
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _trigrams(word: str) -> List[str]:
+        padded = f" {word} "
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+class VertexEmbedder:
+    """Vertex AI text embeddings; paraphrases land close even without shared words."""
+    name = "vertex"
+    default_threshold = 0.92
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        from vertexai.language_models import TextEmbeddingModel
+        self.model_name = model_name
+        self.model = TextEmbeddingModel.from_pretrained(model_name)
+
+    def embed(self, text: str) -> np.ndarray:
+        values = upstream(f"embeddings:{self.model_name}").call(
+            lambda: self.model.get_embeddings([text])[0].values, EMBEDDING_TIMEOUT_SECONDS
+        )
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def build_embedder(kind: str = ANSWER_CACHE_EMBEDDER):
+    if kind == "vertex":
+        try:
+            return VertexEmbedder()
+        except Exception as e:
+            print(f"⚠️ Vertex embeddings unavailable ({e}). Using offline hashing embedder.")
+    return HashingEmbedder()
+
+class _ScopeIndex:
+    """Fixed-size ring of (embedding, answer) for one book/topic; one matrix product per lookup."""
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires = np.zeros(capacity, dtype=np.float64) # 0 = empty slot
+        self.answers: List[Optional[str]] = [None] * capacity
+        self.next_slot = 0
+
+    def best(self, query: np.ndarray, now: float):
+        live = self.expires > now
+        if not live.any():
+            return None, 0.0
+        scores = np.where(live, self.vectors @ query, -1.0)
+        i = int(np.argmax(scores))
+        return self.answers[i], float(scores[i])
+
+    def add(self, vector: np.ndarray, answer: str, expires: float):
+        i = self.next_slot
+        self.vectors[i] = vector
+        self.expires[i] = expires
+        self.answers[i] = answer
+        self.next_slot = (i + 1) % len(self.answers)
+
+class SemanticAnswerCache:
+    """
+    Chat answers keyed by the meaning of the (rewritten) query, per book or
+    topic. A query whose embedding is within `threshold` cosine similarity of
+    a recent answer in the same scope reuses that answer, skipping retrieval
+    and generation. clear() drops everything (the data store changed); answers
+    generated across a clear() are not stored.
+    """
+    def __init__(self, embedder=None, threshold: Optional[float] = None, ttl: int = ANSWER_CACHE_TTL_SECONDS,
+                 scope_size: int = ANSWER_CACHE_SCOPE_SIZE, max_scopes: int = MAX_CACHED_SCOPES):
+        self._embedder = embedder
+        self._threshold = threshold
+        self.ttl = ttl
+        self.scope_size = scope_size
+        self.max_scopes = max_scopes
+        self._lock = threading.Lock()
+        self._scopes: Dict[str, _ScopeIndex] = {}
+        self._epoch = 0
+        self._lookups = 0
+        self._hits = 0
+        self._similarities = deque(maxlen=SIMILARITY_WINDOW)
+
+    @property
+    def embedder(self):
+        # Built on first use so importing the app doesn't load a model
+        if self._embedder is None:
+            self._embedder = build_embedder()
+        return self._embedder
+
+    @property
+    def threshold(self) -> float:
+        if self._threshold is None:
+            self._threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", self.embedder.default_threshold))
+        return self._threshold
+
+    @staticmethod
+    def scope_key(scope: Optional[TopicScope]) -> str:
+        if scope is None:
+            return "global"
+        return f"topic:{scope.topic_id}" if scope.topic_id else f"book:{scope.book_id}"
+
+    def lookup(self, query: str, scope: Optional[TopicScope] = None) -> dict:
+        """
+        Returns {"answer", "similarity", "vector", "epoch"}; answer is None on a miss.
+        Pass the result to put() so the query isn't embedded twice.
+        """
+        try:
+            vector = self.embedder.embed(query)
+        except Exception as e:
+            # The cache must never fail a chat turn
+            print(f"⚠️ Answer cache embedding failed: {e}")
+            return {"answer": None, "similarity": 0.0, "vector": None, "epoch": None}
+
+        now = time.time()
+        with self._lock:
+            index = self._scopes.get(self.scope_key(scope))
+            answer, similarity = index.best(vector, now) if index is not None else (None, 0.0)
+            hit = answer is not None and similarity >= self.threshold
+            self._lookups += 1
+            self._hits += hit
+            self._similarities.append(similarity)
+            epoch = self._epoch
+
+        record_cache("chat_answer", hit)
+        ANSWER_CACHE_SIMILARITY.labels(result="hit" if hit else "miss").observe(similarity)
+        return {"answer": answer if hit else None, "similarity": round(similarity, 4), "vector": vector, "epoch": epoch}
+
+    def put(self, scope: Optional[TopicScope], lookup: dict, answer: str):
+        if lookup.get("vector") is None:
+            return
+        key = self.scope_key(scope)
+        with self._lock:
+            if lookup["epoch"] != self._epoch:
+                return # Generated from context that has since been re-imported
+            index = self._scopes.pop(key, None)
+            if index is None:
+                index = _ScopeIndex(self.scope_size, len(lookup["vector"]))
+            # Re-inserted last: dict order doubles as LRU order for scope eviction
+            self._scopes[key] = index
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.pop(next(iter(self._scopes)))
+            index.add(lookup["vector"], answer, time.time() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+            self._epoch += 1
+        print("🧹 Answer cache cleared (data store changed)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            similarities = sorted(self._similarities)
+            now = time.time()
+            entries = sum(int((index.expires > now).sum()) for index in self._scopes.values())
+            lookups, hits, scopes = self._lookups, self._hits, len(self._scopes)
+
+        def pct(p):
+            return round(similarities[min(len(similarities) - 1, int(len(similarities) * p / 100))], 4) if similarities else None
+
+        return {
+            "embedder": self.embedder.name,
+            "threshold": self.threshold,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "scopes": scopes,
+            "similarity": {"p10": pct(10), "p50": pct(50), "p90": pct(90), "p99": pct(99), "window": len(similarities)},
+        }
+
+answer_cache = SemanticAnswerCache()
@@ -1,7 +1,100 @@
 import os
-import sqlalchemy
-from sqlalchemy import create_engine, text
-from typing import Optional
+import json
+import hashlib
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from sqlalchemy import create_engine, text, bindparam
+from sqlalchemy.exc import DataError, IntegrityError
+from typing import List, Optional, Tuple
+from app.services.metrics import DB_QUERY_SECONDS
+from app.services.write_behind import WriteBehindBuffer
+from app.services.tracing import tracer, set_span_attributes
+from app.models import TopicScope, JobStatus
+
+def _to_epoch(value) -> Optional[float]:
+    """DB timestamps come back as datetimes (pg8000) or ISO strings (SQLite)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+def _from_epoch(ts: float) -> datetime.datetime:
+    # Stored as naive UTC, matching CURRENT_TIMESTAMP defaults
+    return datetime.datetime.utcfromtimestamp(ts)
+
+def is_permanent_db_error(error: Exception) -> bool:
+    """Constraint violations and bad values fail the same way on every retry."""
+    return isinstance(error, (IntegrityError, DataError))
+
+VISUAL_ASSET_BATCH_SIZE = 500
+# Library rows, scripts, translations and segment URLs kept in process; least recently used go first
+MEMORY_CACHE_SIZE = int(os.getenv("DB_MEMORY_CACHE_SIZE", 20000))
+
+class BoundedCache:
+    """Thread-safe LRU dict (get / [key] = value) holding at most max_entries."""
+    def __init__(self, max_entries: int = MEMORY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict" = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+# Language the research + script pipeline runs in; others are translated from it
+BASE_LESSON_LANGUAGE = os.getenv("BASE_LESSON_LANGUAGE", "English")
+
+def script_version(script: str) -> str:
+    """Content hash of a core script; translations are keyed on it."""
+    return hashlib.sha1(script.encode("utf-8")).hexdigest()[:12]
+
+# teacher_jobs column widths; longer values would make Postgres reject the whole write
+JOB_STEP_MAX_CHARS = 100
+JOB_TEXT_MAX_CHARS = 255
+
+def _clip(value: Optional[str], limit: int) -> Optional[str]:
+    return value[:limit] if value else value
+
+JOB_COLUMNS = ("job_id, teacher_id, COALESCE(matched_topic_id, topic_query), batch_id, status, message, result_url, "
+               "stage_durations, created_at, updated_at, topic_query")
+
+def _job_row_to_dict(row) -> dict:
+    durations = row[7]
+    if isinstance(durations, str):
+        durations = json.loads(durations)
+    return {
+        "job_id": str(row[0]),
+        "teacher_id": row[1],
+        "topic_id": row[2],
+        "batch_id": str(row[3]) if row[3] else None,
+        "status": JobStatus(row[4].upper()),
+        "message": row[5],
+        "result": row[6],
+        "stage_durations": durations,
+        "created_at": _to_epoch(row[8]),
+        "updated_at": _to_epoch(row[9]),
+        "topic_query": row[10],
+    }
 
 class DatabaseService:
     """
@@ -25,49 +118,557 @@ class DatabaseService:
         except Exception as e:
             print(f"⚠️ DB Init Warning: {e}")
 
-        # In-Memory Fallback for Demo/Local without Docker Compose DB
-        self.memory_cache = {}
+        # In-Memory Fallback for Demo/Local without Docker Compose DB; bounded, so the
+        # warm-start preload and long uptimes can't grow it without limit
+        self.memory_cache = BoundedCache()
+        # New library entries are upserted in batches off the request path
+        self.library_writes = WriteBehindBuffer("video_library", self._upsert_core_lessons, is_permanent=is_permanent_db_error)
 
-    def get_core_lesson(self, topic_id: str) -> Optional[str]:
+    @tracer.start_as_current_span("db.get_core_lesson")
+    def get_core_lesson(self, topic_id: str, language: str = BASE_LESSON_LANGUAGE) -> Optional[dict]:
         """
-        Checks if the generic 'Core Lesson' exists for this Topic ID.
+        Checks if the generic 'Core Lesson' exists for this Topic ID in this language.
+        Returns {"video_url", "confidence", "status"} (validator verdict) or None.
         """
-        print(f"💾 Checking Library for Topic: {topic_id}")
+        print(f"💾 Checking Library for Topic: {topic_id} ({language})")
+
+        # 1. Preloaded at startup, or written here and possibly not flushed yet
+        key = ("core_lesson", topic_id, language)
+        cached = self.memory_cache.get(key)
+        if cached is not None:
+            set_span_attributes({"topic.id": topic_id, "cache.hit": True, "cache.source": "memory"})
+            return dict(cached)
         
-        # 1. Try DB
+        # 2. Try DB (unique (topic_id, language) index covers these columns)
         if self.engine:
             try:
-                with self.engine.connect() as conn:
+                with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_core_lesson").time():
                     # Looking up in video_library
                     result = conn.execute(
-                        text("SELECT core_video_url FROM video_library WHERE topic_id = :tid"), 
-                        {"tid": topic_id}
+                        text("""
+                            SELECT video_url, confidence_score, status FROM video_library WHERE topic_id = :tid AND language = :lang
+                        """),
+                        {"tid": topic_id, "lang": language}
                     ).fetchone()
                     if result:
                         print(f"✅ Library Hit: {topic_id}")
-                        return result[0]
+                        set_span_attributes({"topic.id": topic_id, "cache.hit": True, "cache.source": "db"})
+                        entry = {"video_url": result[0], "confidence": result[1], "status": result[2]}
+                        self.memory_cache[key] = entry
+                        return dict(entry)
             except Exception as e:
                 print(f"❌ DB Read Error: {e}")
 
-        # 2. Mock Fallback (Pretend we have cache for 1.2)
-        if topic_id == "PHY12_01_02":
-             return "https://mock-storage.google.com/core_lessons/coulombs_law.mp4"
+        # 3. Mock Fallback (Pretend we have cache for 1.2)
+        mock_hit = topic_id == "PHY12_01_02" and language == BASE_LESSON_LANGUAGE
+        set_span_attributes({"topic.id": topic_id, "cache.hit": mock_hit, "cache.source": "mock"})
+        if mock_hit:
+             return {"video_url": "https://mock-storage.google.com/core_lessons/coulombs_law.mp4", "confidence": 0.94, "status": "processed"}
         
         return None
 
-    def cache_core_lesson(self, topic_id: str, video_url: str):
+    @tracer.start_as_current_span("db.cache_core_lesson")
+    def cache_core_lesson(self, topic_id: str, video_url: str, language: str = BASE_LESSON_LANGUAGE,
+                          transcript: Optional[str] = None, version: Optional[str] = None,
+                          confidence: Optional[float] = None, status: str = "processed"):
         """
-        Saves the new Core Lesson to the library.
+        Saves the new Core Lesson to the library, with the script it was
+        rendered from and the validator's confidence and verdict.
+        Visible to this instance immediately; written to the DB in the next
+        write-behind batch (one row per topic and language, newest wins).
         """
-        print(f"💾 Saving to Library: {topic_id}")
-        
+        print(f"💾 Saving to Library: {topic_id} ({language})")
+        self.memory_cache[("core_lesson", topic_id, language)] = {"video_url": video_url, "confidence": confidence, "status": status}
         if self.engine:
-            try:
-                with self.engine.connect() as conn:
+            self.library_writes.put((topic_id, language), {
+                "tid": topic_id, "lang": language, "url": video_url, "transcript": transcript, "version": version,
+                "confidence": confidence, "status": status,
+            })
+
+    def _upsert_core_lessons(self, rows: List[dict]):
+        """Write-behind flush: one executemany upsert per batch. Raises so the batch is retried."""
+        with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("upsert_core_lessons").time():
+            conn.execute(
+                text("""
+                    INSERT INTO video_library (topic_id, language, video_url, transcript, script_version, confidence_score, status)
+                    VALUES (:tid, :lang, :url, :transcript, :version, :confidence, :status)
+                    ON CONFLICT (topic_id, language) DO UPDATE SET
+                        video_url = EXCLUDED.video_url, transcript = EXCLUDED.transcript,
+                        script_version = EXCLUDED.script_version, confidence_score = EXCLUDED.confidence_score,
+                        status = EXCLUDED.status, created_at = CURRENT_TIMESTAMP
+                """),
+                rows
+            )
+            conn.commit()
+
+    def flush_library_writes(self) -> int:
+        """Drains pending library upserts (shutdown)."""
+        return self.library_writes.flush() if self.engine else 0
+
+    def get_hot_topics(self, limit: int, since_seconds: float) -> List[str]:
+        """
+        Topic ids most requested in recent teacher_jobs, busiest first.
+        Jobs don't record a language, so callers preload every language of a hot topic.
+        """
+        if not self.engine:
+            return []
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_hot_topics").time():
+                rows = conn.execute(
+                    text("""
+                        SELECT matched_topic_id, COUNT(*) AS requests FROM teacher_jobs
+                        WHERE matched_topic_id IS NOT NULL AND created_at >= :since
+                        GROUP BY matched_topic_id ORDER BY requests DESC LIMIT :limit
+                    """),
+                    {"since": _from_epoch(time.time() - since_seconds), "limit": limit}
+                ).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return []
+
+    def preload_core_lessons(self, topic_ids: List[str]) -> int:
+        """Loads every language's library entry for these topics into memory in one query."""
+        if not self.engine or not topic_ids:
+            return 0
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("preload_core_lessons").time():
+                rows = conn.execute(
+                    text("""
+                        SELECT topic_id, language, video_url, confidence_score, status FROM video_library
+                        WHERE topic_id IN :ids
+                    """).bindparams(bindparam("ids", expanding=True)),
+                    {"ids": list(topic_ids)}
+                ).fetchall()
+            for row in rows:
+                self.memory_cache[("core_lesson", row[0], row[1])] = {"video_url": row[2], "confidence": row[3], "status": row[4]}
+            return len(rows)
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return 0
+
+    def get_book_uris(self, topic_ids: List[str]) -> List[str]:
+        """Source PDFs of the books these topics belong to."""
+        if not self.engine or not topic_ids:
+            return []
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_book_uris").time():
+                rows = conn.execute(
+                    text("""
+                        SELECT DISTINCT b.gcs_uri FROM topics t
+                        JOIN chapters c ON t.chapter_id = c.chapter_id JOIN books b ON c.book_id = b.book_id
+                        WHERE t.topic_id IN :ids
+                    """).bindparams(bindparam("ids", expanding=True)),
+                    {"ids": list(topic_ids)}
+                ).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return []
+
+    @tracer.start_as_current_span("db.get_core_source")
+    def get_core_source(self, topic_id: str) -> Optional[dict]:
+        """
+        The latest base-language fact brief and core script for a topic, the
+        source every language's lesson is rendered or translated from.
+        """
+        key = ("core_source", topic_id)
+        cached = self.memory_cache.get(key)
+        if cached or not self.engine:
+            return cached
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_core_source").time():
+                row = conn.execute(
+                    text("""
+                        SELECT fact_brief, script, script_version FROM lesson_scripts
+                        WHERE topic_id = :tid AND language = :lang
+                        ORDER BY created_at DESC LIMIT 1
+                    """),
+                    {"tid": topic_id, "lang": BASE_LESSON_LANGUAGE}
+                ).fetchone()
+            if not row:
+                return None
+            source = {"fact_brief": row[0], "script": row[1], "script_version": row[2]}
+            self.memory_cache[key] = source
+            return source
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return None
+
+    def save_core_source(self, topic_id: str, fact_brief: str, script: str) -> dict:
+        version = script_version(script)
+        source = {"fact_brief": fact_brief, "script": script, "script_version": version}
+        self.memory_cache[("core_source", topic_id)] = source
+        self._save_script(topic_id, BASE_LESSON_LANGUAGE, version, script, fact_brief)
+        return source
+
+    @tracer.start_as_current_span("db.get_render_segment")
+    def get_render_segment(self, segment_key: str) -> Optional[str]:
+        """
+        URL of an already-rendered script section, by content key.
+        """
+        key = ("segment", segment_key)
+        cached = self.memory_cache.get(key)
+        if cached or not self.engine:
+            return cached
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_render_segment").time():
+                row = conn.execute(
+                    text("SELECT video_url FROM render_segments WHERE segment_key = :key"),
+                    {"key": segment_key}
+                ).fetchone()
+            if row:
+                self.memory_cache[key] = row[0]
+                return row[0]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+        return None
+
+    def save_render_segment(self, segment_key: str, video_url: str):
+        self.memory_cache[("segment", segment_key)] = video_url
+        if not self.engine:
+            return
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("save_render_segment").time():
+                conn.execute(
+                    text("""
+                        INSERT INTO render_segments (segment_key, video_url) VALUES (:key, :url)
+                        ON CONFLICT (segment_key) DO UPDATE SET video_url = EXCLUDED.video_url
+                    """),
+                    {"key": segment_key, "url": video_url}
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+
+    @tracer.start_as_current_span("db.get_translation")
+    def get_translation(self, topic_id: str, language: str, version: str) -> Optional[str]:
+        """
+        Cached translation of a base script version into a language.
+        """
+        key = ("translation", topic_id, language, version)
+        cached = self.memory_cache.get(key)
+        if cached or not self.engine:
+            return cached
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_translation").time():
+                row = conn.execute(
+                    text("""
+                        SELECT script FROM lesson_scripts
+                        WHERE topic_id = :tid AND language = :lang AND script_version = :version
+                    """),
+                    {"tid": topic_id, "lang": language, "version": version}
+                ).fetchone()
+            if row:
+                self.memory_cache[key] = row[0]
+                return row[0]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+        return None
+
+    def save_translation(self, topic_id: str, language: str, version: str, script: str):
+        self.memory_cache[("translation", topic_id, language, version)] = script
+        self._save_script(topic_id, language, version, script)
+
+    def _save_script(self, topic_id: str, language: str, version: str, script: str, fact_brief: Optional[str] = None):
+        if not self.engine:
+            return
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("save_script").time():
+                conn.execute(
+                    text("""
+                        INSERT INTO lesson_scripts (topic_id, language, script_version, script, fact_brief)
+                        VALUES (:tid, :lang, :version, :script, :brief)
+                        ON CONFLICT (topic_id, language, script_version) DO UPDATE SET script = EXCLUDED.script
+                    """),
+                    {"tid": topic_id, "lang": language, "version": version, "script": script, "brief": fact_brief}
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+
+    @tracer.start_as_current_span("db.load_chat_session")
+    def load_chat_session(self, session_id: str) -> Optional[dict]:
+        """
+        Loads a persisted chat session (rolling summary + recent turns).
+        """
+        if not self.engine:
+            return None
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("load_chat_session").time():
+                row = conn.execute(
+                    text("SELECT summary, recent_turns, turn_count FROM chat_sessions WHERE session_id = :sid"),
+                    {"sid": session_id}
+                ).fetchone()
+            if not row:
+                return None
+            turns = row[1] if isinstance(row[1], list) else json.loads(row[1] or "[]")
+            return {"summary": row[0] or "", "turns": turns, "turn_count": row[2] or 0}
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return None
+
+    @tracer.start_as_current_span("db.save_chat_session")
+    def save_chat_session(self, session_id: str, summary: str, turns: List[Tuple[str, str]], turn_count: int):
+        """
+        Upserts a chat session. Only the bounded turn window is stored, so rows stay small.
+        """
+        if not self.engine:
+            return
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("save_chat_session").time():
+                conn.execute(
+                    text("""
+                        INSERT INTO chat_sessions (session_id, summary, recent_turns, turn_count, updated_at)
+                        VALUES (:sid, :summary, :turns, :count, CURRENT_TIMESTAMP)
+                        ON CONFLICT (session_id) DO UPDATE SET
+                            summary = EXCLUDED.summary,
+                            recent_turns = EXCLUDED.recent_turns,
+                            turn_count = EXCLUDED.turn_count,
+                            updated_at = EXCLUDED.updated_at
+                    """),
+                    {"sid": session_id, "summary": summary, "turns": json.dumps(turns), "count": turn_count}
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+
+    @tracer.start_as_current_span("db.get_topic_scope")
+    def get_topic_scope(self, topic_id: str) -> Optional[TopicScope]:
+        """
+        Resolves a topic to its book and page range for scoped retrieval.
+        """
+        if not self.engine:
+            return None
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_topic_scope").time():
+                row = conn.execute(
+                    text("""
+                        SELECT t.title, t.page_start, t.page_end, c.book_id
+                        FROM topics t JOIN chapters c ON t.chapter_id = c.chapter_id
+                        WHERE t.topic_id = :tid
+                    """),
+                    {"tid": topic_id}
+                ).fetchone()
+            if not row:
+                return None
+            return TopicScope(topic_id=topic_id, title=row[0], page_start=row[1], page_end=row[2], book_id=row[3])
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return None
+
+    def get_topic_catalog(self) -> List[dict]:
+        """
+        Every topic with its chapter and book title, for the free-text topic index.
+        """
+        if not self.engine:
+            return []
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_topic_catalog").time():
+                rows = conn.execute(
+                    text("""
+                        SELECT t.topic_id, t.title, c.title, c.book_id
+                        FROM topics t JOIN chapters c ON t.chapter_id = c.chapter_id
+                    """)
+                ).fetchall()
+            return [{"topic_id": row[0], "title": row[1], "chapter_title": row[2], "book_id": row[3]} for row in rows]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return []
+
+    def get_topic_page_ranges(self, book_id: str) -> List[Tuple[str, int, int]]:
+        """
+        (topic_id, page_start, page_end) for every topic in a book, ordered by page.
+        """
+        if not self.engine:
+            return []
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_topic_page_ranges").time():
+                rows = conn.execute(
+                    text("""
+                        SELECT t.topic_id, t.page_start, t.page_end
+                        FROM topics t JOIN chapters c ON t.chapter_id = c.chapter_id
+                        WHERE c.book_id = :book_id AND t.page_start IS NOT NULL
+                        ORDER BY t.page_start
+                    """),
+                    {"book_id": book_id}
+                ).fetchall()
+            return [(row[0], row[1], row[2]) for row in rows]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return []
+
+    def insert_visual_assets(self, rows: List[dict]) -> int:
+        """
+        Batched insert of extracted diagrams. Re-running extraction on a book
+        is a no-op for figures already stored (unique on book_id + phash).
+        """
+        if not self.engine or not rows:
+            return 0
+        inserted = 0
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("insert_visual_assets").time():
+                for i in range(0, len(rows), VISUAL_ASSET_BATCH_SIZE):
+                    batch = rows[i:i + VISUAL_ASSET_BATCH_SIZE]
+                    result = conn.execute(
+                        text("""
+                            INSERT INTO visual_assets (book_id, topic_id, image_url, description, original_page_number, phash)
+                            VALUES (:book_id, :topic_id, :image_url, :description, :page, :phash)
+                            ON CONFLICT (book_id, phash) DO NOTHING
+                        """),
+                        batch
+                    )
+                    # Rows skipped by ON CONFLICT aren't counted; -1 means the driver didn't report
+                    inserted += max(0, result.rowcount)
+                conn.commit()
+            print(f"✅ Stored {inserted} visual assets.")
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+        return inserted
+
+    def get_visual_assets(self, topic_id: str, limit: int = 8) -> List[dict]:
+        if not self.engine:
+            return []
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("get_visual_assets").time():
+                rows = conn.execute(
+                    text("""
+                        SELECT asset_id, image_url, description, original_page_number
+                        FROM visual_assets WHERE topic_id = :tid
+                        ORDER BY original_page_number LIMIT :limit
+                    """),
+                    {"tid": topic_id, "limit": limit}
+                ).fetchall()
+            return [{"asset_id": r[0], "image_url": r[1], "description": r[2], "page": r[3]} for r in rows]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return []
+
+    def save_job(self, record, created: bool = False):
+        """
+        Write-through of a job's state to teacher_jobs (one upsert per transition).
+        """
+        if not self.engine:
+            return
+        params = {
+            "job_id": record.job_id,
+            "teacher_id": _clip(record.teacher_id, JOB_TEXT_MAX_CHARS),
+            "topic": record.topic_id,
+            "query": _clip(record.topic_query or record.topic_id, JOB_TEXT_MAX_CHARS),
+            "batch_id": record.batch_id,
+            "status": record.status.value.lower(),
+            # Full text goes to message; current_step is a short progress label
+            "step": _clip(record.message or record.status.value, JOB_STEP_MAX_CHARS),
+            "message": record.message,
+            "result": record.result,
+            "durations": json.dumps(record.stage_durations) if record.stage_durations else None,
+            "created_at": _from_epoch(record.created_at),
+            "updated_at": _from_epoch(record.updated_at),
+        }
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("save_job").time():
+                if created:
                     conn.execute(
-                        text("INSERT INTO video_library (topic_id, core_video_url, confidence_score) VALUES (:tid, :url, 95)"),
-                        {"tid": topic_id, "url": video_url}
+                        text("""
+                            INSERT INTO teacher_jobs (job_id, teacher_id, topic_query, matched_topic_id, batch_id,
+                                                      status, current_step, message, result_url, stage_durations,
+                                                      created_at, updated_at)
+                            VALUES (:job_id, :teacher_id, :query, (SELECT topic_id FROM topics WHERE topic_id = :topic),
+                                    :batch_id, :status, :step, :message, :result, :durations, :created_at, :updated_at)
+                            ON CONFLICT (job_id) DO NOTHING
+                        """),
+                        params
                     )
-                    conn.commit()
-            except Exception as e:
-                print(f"❌ DB Write Error: {e}")
+                else:
+                    conn.execute(
+                        text("""
+                            UPDATE teacher_jobs SET status = :status, current_step = :step, message = :message,
+                                   result_url = :result, stage_durations = :durations, updated_at = :updated_at
+                            WHERE job_id = :job_id
+                        """),
+                        params
+                    )
+                conn.commit()
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+
+    @tracer.start_as_current_span("db.load_job")
+    def load_job(self, job_id: str) -> Optional[dict]:
+        if not self.engine:
+            return None
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("load_job").time():
+                row = conn.execute(
+                    text(f"SELECT {JOB_COLUMNS} FROM teacher_jobs WHERE job_id = :job_id"),
+                    {"job_id": job_id}
+                ).fetchone()
+            return _job_row_to_dict(row) if row else None
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return None
+
+    @tracer.start_as_current_span("db.load_batch_jobs")
+    def load_batch_jobs(self, batch_id: str) -> List[dict]:
+        if not self.engine:
+            return []
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("load_batch_jobs").time():
+                rows = conn.execute(
+                    text(f"SELECT {JOB_COLUMNS} FROM teacher_jobs WHERE batch_id = :batch_id ORDER BY created_at"),
+                    {"batch_id": batch_id}
+                ).fetchall()
+            return [_job_row_to_dict(row) for row in rows]
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return []
+
+    def save_ingestion_files(self, records: List[dict]):
+        """
+        Write-through of file indexing status, so it can be queried from any
+        instance and after the coordinator forgets finished files.
+        """
+        if not self.engine or not records:
+            return
+        params = [{
+            "uri": r["gcs_uri"], "status": r["status"], "operation": r["operation"], "error": r["error"],
+            "submitted_at": _from_epoch(r["submitted_at"]), "updated_at": _from_epoch(r["updated_at"]),
+        } for r in records]
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("save_ingestion_files").time():
+                conn.execute(
+                    text("""
+                        INSERT INTO ingestion_files (gcs_uri, status, operation, error, submitted_at, updated_at)
+                        VALUES (:uri, :status, :operation, :error, :submitted_at, :updated_at)
+                        ON CONFLICT (gcs_uri) DO UPDATE SET
+                            status = EXCLUDED.status,
+                            operation = EXCLUDED.operation,
+                            error = EXCLUDED.error,
+                            submitted_at = EXCLUDED.submitted_at,
+                            updated_at = EXCLUDED.updated_at
+                    """),
+                    params
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+
+    @tracer.start_as_current_span("db.load_ingestion_file")
+    def load_ingestion_file(self, gcs_uri: str) -> Optional[dict]:
+        if not self.engine:
+            return None
+        try:
+            with self.engine.connect() as conn, DB_QUERY_SECONDS.labels("load_ingestion_file").time():
+                row = conn.execute(
+                    text("""
+                        SELECT gcs_uri, status, operation, error, submitted_at, updated_at
+                        FROM ingestion_files WHERE gcs_uri = :uri
+                    """),
+                    {"uri": gcs_uri}
+                ).fetchone()
+            if not row:
+                return None
+            return {"gcs_uri": row[0], "status": row[1], "operation": row[2], "error": row[3],
+                    "submitted_at": _to_epoch(row[4]), "updated_at": _to_epoch(row[5])}
+        except Exception as e:
+            print(f"❌ DB Read Error: {e}")
+            return None
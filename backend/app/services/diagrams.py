@@ -0,0 +1,236 @@
+import io
+import os
+import time
+import bisect
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+from google.cloud import storage
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DIAGRAM_DPI = int(os.getenv("DIAGRAM_DPI", 150))
+DIAGRAM_WORKERS = int(os.getenv("DIAGRAM_WORKERS", os.cpu_count() or 2))
+# Pages handed to a worker at once; each task opens the PDF once
+PAGES_PER_TASK = 8
+# Figure size limits as a fraction of the page; full-page scans are not figures
+MIN_FIGURE_AREA = 0.01
+MAX_FIGURE_AREA = 0.9
+MIN_FIGURE_SIDE = 40 # points
+THUMBNAIL_MAX_SIDE = 800
+# 0 = only identical hashes are duplicates; raise to also merge near-identical scans
+HASH_DISTANCE = int(os.getenv("DIAGRAM_HASH_DISTANCE", 0))
+UPLOAD_WORKERS = 16
+CAPTION_GAP = 40 # points below a figure searched for its caption
+
+def dhash(image) -> str:
+    """64-bit difference hash: survives re-encoding and small rescales of the same figure."""
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    px = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def _merge_boxes(boxes: list) -> list:
+    """Unions overlapping rectangles until none overlap (labels + drawing -> one figure)."""
+    merged = [fitz.Rect(b) for b in boxes]
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        while merged:
+            box = merged.pop()
+            for other in merged[:]:
+                if box.intersects(other):
+                    box |= other
+                    merged.remove(other)
+                    changed = True
+            result.append(box)
+        merged = result
+    return merged
+
+def _figure_boxes(page) -> list:
+    """Embedded images plus clustered vector drawings, filtered by size."""
+    page_area = abs(page.rect)
+    boxes = [fitz.Rect(info["bbox"]) for info in page.get_image_info()]
+    boxes += page.cluster_drawings(x_tolerance=10, y_tolerance=10)
+    figures = []
+    for box in _merge_boxes(boxes):
+        box &= page.rect
+        if box.width < MIN_FIGURE_SIDE or box.height < MIN_FIGURE_SIDE:
+            continue
+        if MIN_FIGURE_AREA <= abs(box) / page_area <= MAX_FIGURE_AREA:
+            figures.append(box)
+    return figures
+
+def _caption(page, box) -> Optional[str]:
+    below = fitz.Rect(box.x0 - 20, box.y1, box.x1 + 20, box.y1 + CAPTION_GAP)
+    text = " ".join(page.get_textbox(below).split())
+    return text[:500] or None
+
+def _extract_pages(pdf_path: str, page_numbers: List[int], dpi: int) -> Tuple[int, List[dict]]:
+    """
+    Worker (runs in a separate process): renders and crops every figure on the
+    given pages. Returns (pages processed, figures) with PNG bytes and hashes.
+    """
+    zoom = dpi / 72
+    figures = []
+    with fitz.open(pdf_path) as doc:
+        for number in page_numbers:
+            page = doc[number]
+            for box in _figure_boxes(page):
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=box, alpha=False)
+                image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                image.thumbnail((THUMBNAIL_MAX_SIDE, THUMBNAIL_MAX_SIDE))
+                buf = io.BytesIO()
+                image.save(buf, "PNG")
+                figures.append({
+                    "page": number + 1,
+                    "phash": dhash(image),
+                    "png": buf.getvalue(),
+                    "caption": _caption(page, box),
+                })
+    return len(page_numbers), figures
+
+class DiagramExtractor:
+    """
+    Post-ingestion stage that fills visual_assets:
+    render + crop figures across cores -> dedupe by perceptual hash ->
+    bulk thumbnail upload -> batched inserts, each figure tagged with the
+    topic whose page range contains it.
+    Without GCS credentials thumbnails are written to a local directory.
+    """
+    def __init__(self, db=None, workers: int = DIAGRAM_WORKERS, output_dir: Optional[str] = None):
+        self.db = db
+        self.workers = workers
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), "diagrams")
+        self.project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        self.bucket_name = f"{self.project_id}-assets" if self.project_id else "demo-bucket"
+        try:
+            self.storage_client = storage.Client() if self.project_id else None
+        except Exception:
+            print("⚠️ Warning: GCS Client failed to init. Diagrams will be written locally.")
+            self.storage_client = None
+
+    def extract_gcs(self, gcs_uri: str, book_id: str) -> dict:
+        """Downloads an ingested textbook and extracts its figures."""
+        if not self.storage_client:
+            print("⚠️ No GCS client; skipping diagram extraction.")
+            return {}
+        bucket_name, _, blob_name = gcs_uri[len("gs://"):].partition("/")
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+            self.storage_client.bucket(bucket_name).blob(blob_name).download_to_filename(tmp.name)
+            return self.extract(tmp.name, book_id)
+
+    def extract(self, pdf_path: str, book_id: str) -> dict:
+        if fitz is None or Image is None:
+            print("⚠️ PyMuPDF/Pillow not installed. Skipping diagram extraction.")
+            return {}
+
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        chunks = [list(range(i, min(i + PAGES_PER_TASK, page_count))) for i in range(0, page_count, PAGES_PER_TASK)]
+
+        start = time.perf_counter()
+        unique: Dict[str, dict] = {}
+        found = 0
+        # spawn: forking a process that runs uvicorn threads is not safe
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_extract_pages, pdf_path, chunk, DIAGRAM_DPI) for chunk in chunks]
+            for future in as_completed(futures):
+                _, figures = future.result()
+                found += len(figures)
+                for figure in figures:
+                    self._dedupe(unique, figure)
+        extract_seconds = time.perf_counter() - start
+
+        assets = sorted(unique.values(), key=lambda f: f["page"])
+        urls = self._upload_all(book_id, assets)
+        topics = self._topic_lookup(book_id)
+        rows = [{
+            "book_id": book_id,
+            "topic_id": topics(asset["page"]),
+            "image_url": urls[asset["phash"]],
+            "description": asset["caption"],
+            "page": asset["page"],
+            "phash": asset["phash"],
+        } for asset in assets if asset["phash"] in urls]
+        inserted = self.db.insert_visual_assets(rows) if self.db else 0
+
+        total_seconds = time.perf_counter() - start
+        stats = {
+            "book_id": book_id,
+            "pages": page_count,
+            "figures_found": found,
+            "figures_unique": len(assets),
+            "rows_inserted": inserted,
+            "extract_seconds": round(extract_seconds, 2),
+            "total_seconds": round(total_seconds, 2),
+            "pages_per_second": round(page_count / extract_seconds, 1) if extract_seconds else 0.0,
+        }
+        print(f"🖼️ {book_id}: {page_count} pages, {len(assets)} unique figures ({found - len(assets)} duplicates) "
+              f"in {extract_seconds:.1f}s -> {stats['pages_per_second']} pages/s")
+        return stats
+
+    def _dedupe(self, unique: Dict[str, dict], figure: dict):
+        # Workers finish out of order; keep the earliest page a figure appears on
+        key = figure["phash"]
+        if HASH_DISTANCE and key not in unique:
+            key = next((h for h in unique if hamming(h, key) <= HASH_DISTANCE), key)
+        existing = unique.get(key)
+        if existing is None or figure["page"] < existing["page"]:
+            unique[key] = figure
+
+    def _topic_lookup(self, book_id: str):
+        """page -> topic_id using the book's topic page ranges."""
+        ranges = self.db.get_topic_page_ranges(book_id) if self.db else []
+        starts = [start for _, start, _ in ranges]
+
+        def lookup(page: int) -> Optional[str]:
+            i = bisect.bisect_right(starts, page) - 1
+            if i >= 0 and page <= (ranges[i][2] or ranges[i][1]):
+                return ranges[i][0]
+            return None
+        return lookup
+
+    def _upload_all(self, book_id: str, assets: List[dict]) -> Dict[str, str]:
+        """
+        Uploads thumbnails concurrently, content-addressed by hash so re-runs
+        overwrite rather than duplicate. Returns phash -> URL.
+        """
+        def upload(asset):
+            name = f"diagrams/{book_id}/{asset['phash']}.png"
+            if not self.storage_client:
+                path = os.path.join(self.output_dir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(asset["png"])
+                return asset["phash"], f"file://{path}"
+            blob = self.storage_client.bucket(self.bucket_name).blob(name)
+            blob.upload_from_string(asset["png"], content_type="image/png")
+            return asset["phash"], f"https://storage.googleapis.com/{self.bucket_name}/{name}"
+
+        urls = {}
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            futures = [pool.submit(upload, asset) for asset in assets]
+            for future in as_completed(futures):
+                try:
+                    phash, url = future.result()
+                    urls[phash] = url
+                except Exception as e:
+                    print(f"❌ Diagram upload failed: {e}")
+        return urls
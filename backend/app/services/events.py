@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+class JobEventBus:
+    """
+    In-process pub/sub for job status transitions.
+    Event ids are wall-clock microseconds (strictly increasing per process), so
+    a Last-Event-ID stays meaningful after a restart or against another
+    instance: it means "after this time", not "after this instance's n-th event".
+    Each stream keeps a bounded history, so a reconnecting client can replay
+    everything after its Last-Event-ID instead of polling /jobs. History is
+    per instance and best effort; job streams start from a snapshot of the
+    job's stored state (see main._event_stream) rather than relying on it.
+    Streams are keyed like "job:<job_id>" or "teacher:<teacher_id>".
+    """
+    def __init__(self, history_per_stream: int = 200, max_streams: int = 10000):
+        self.history_per_stream = history_per_stream
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._streams: "OrderedDict[str, deque]" = OrderedDict()
+        # stream key -> (loop, asyncio.Event) per live subscriber; publish only wakes its own streams
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def cursor(self) -> int:
+        """Id of the latest event published; everything after it is still to come."""
+        with self._lock:
+            return self._last_id
+
+    def publish(self, stream_keys: List[str], payload: dict) -> int:
+        """
+        Appends an event to each stream and wakes that stream's subscribers.
+        Safe to call from worker threads (background jobs run in the threadpool).
+        """
+        with self._lock:
+            event_id = max(self._last_id + 1, time.time_ns() // 1000)
+            self._last_id = event_id
+            waiters = []
+            for key in stream_keys:
+                history = self._streams.get(key)
+                if history is None:
+                    history = deque(maxlen=self.history_per_stream)
+                    self._streams[key] = history
+                    # Evict the least recently active stream
+                    if len(self._streams) > self.max_streams:
+                        self._streams.popitem(last=False)
+                else:
+                    self._streams.move_to_end(key)
+                history.append((event_id, payload))
+                waiters.extend(self._waiters.get(key, ()))
+
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass # Subscriber's loop already closed
+        return event_id
+
+    def replay(self, stream_key: str, after_id: int = 0) -> List[Tuple[int, dict]]:
+        with self._lock:
+            history = self._streams.get(stream_key)
+            if not history:
+                return []
+            return [(eid, payload) for eid, payload in history if eid > after_id]
+
+    async def subscribe(self, stream_key: str, last_event_id: int = 0, heartbeat: float = 15.0) -> AsyncIterator[Optional[Tuple[int, dict]]]:
+        """
+        Yields (event_id, payload) for every event after last_event_id, then waits
+        for new ones. Yields None every `heartbeat` seconds of silence.
+        """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        waiter = (loop, wakeup)
+        with self._lock:
+            self._waiters.setdefault(stream_key, set()).add(waiter)
+        try:
+            while True:
+                wakeup.clear()
+                for event_id, payload in self.replay(stream_key, last_event_id):
+                    last_event_id = event_id
+                    yield event_id, payload
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(stream_key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[stream_key]
+
+def format_sse(event_id: Optional[int], payload: Optional[dict], event: str = "status") -> str:
+    """Serializes one Server-Sent Event frame (or a comment heartbeat)."""
+    if payload is None:
+        return ": keep-alive\n\n"
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
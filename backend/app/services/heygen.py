@@ -1,6 +1,14 @@
 import os
+import time
+import threading
 import requests
 from typing import Optional, Dict, Any
+from app.services.tracing import tracer, set_span_attributes
+
+# Off by default: core renders are simulated unless explicitly enabled
+HEYGEN_RENDER_ENABLED = os.getenv("HEYGEN_RENDER_ENABLED", "false").lower() == "true"
+HEYGEN_POLL_SECONDS = float(os.getenv("HEYGEN_POLL_SECONDS", 10))
+HEYGEN_RENDER_TIMEOUT = float(os.getenv("HEYGEN_RENDER_TIMEOUT", 3600))
 
 class HeyGenClient:
     """
@@ -19,6 +27,7 @@ class HeyGenClient:
             "Content-Type": "application/json"
         }
 
+    @tracer.start_as_current_span("heygen.check_health")
     def check_health(self) -> bool:
         """Simple check to verify API connectivity."""
         if not self.api_key:
@@ -31,6 +40,7 @@ class HeyGenClient:
             print(f"HeyGen Health Check Failed: {e}")
             return False
 
+    @tracer.start_as_current_span("heygen.generate_video")
     def generate_video(self, script_text: str, avatar_id: str = "default_avatar_id", voice_id: str = "default_voice_id") -> Dict[str, Any]:
         """
         Submits a video generation task to HeyGen.
@@ -58,6 +68,7 @@ class HeyGenClient:
             }
         }
         
+        set_span_attributes({"heygen.script_chars": len(script_text), "heygen.avatar_id": avatar_id})
         try:
             response = requests.post(url, json=payload, headers=self._get_headers())
             response.raise_for_status()
@@ -66,6 +77,7 @@ class HeyGenClient:
             print(f"❌ HeyGen Generation Failed: {e}")
             raise
 
+    @tracer.start_as_current_span("heygen.get_status")
     def get_status(self, video_id: str) -> str:
         """
         Checks status of a video generation job.
@@ -79,3 +91,46 @@ class HeyGenClient:
         except Exception as e:
             print(f"❌ Error checking status: {e}")
             return "error"
+
+    @tracer.start_as_current_span("heygen.get_video_url")
+    def get_video_url(self, video_id: str) -> Optional[str]:
+        url = f"{self.base_url}/video_status.get?video_id={video_id}"
+        response = requests.get(url, headers=self._get_headers())
+        response.raise_for_status()
+        return response.json().get("data", {}).get("video_url")
+
+    @tracer.start_as_current_span("heygen.cancel_video")
+    def cancel_video(self, video_id: str):
+        """
+        Stops paying for a render we no longer want. HeyGen has no cancel
+        endpoint; deleting a pending video aborts it.
+        """
+        try:
+            response = requests.delete(f"https://api.heygen.com/v1/video.delete?video_id={video_id}", headers=self._get_headers())
+            response.raise_for_status()
+            print(f"🛑 HeyGen render cancelled: {video_id}")
+        except Exception as e:
+            print(f"⚠️ HeyGen cancel failed for {video_id}: {e}")
+
+    def wait_for_video(self, video_id: str, cancelled: Optional[threading.Event] = None,
+                       poll_interval: float = HEYGEN_POLL_SECONDS, timeout: float = HEYGEN_RENDER_TIMEOUT) -> Optional[str]:
+        """
+        Polls until the video is ready and returns its URL.
+        Returns None if `cancelled` is set first (the render is cancelled upstream).
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if cancelled is not None and cancelled.is_set():
+                self.cancel_video(video_id)
+                return None
+            status = self.get_status(video_id)
+            if status == "completed":
+                return self.get_video_url(video_id)
+            if status in ("failed", "error"):
+                raise Exception(f"HeyGen render {video_id} ended with status: {status}")
+            # Event.wait doubles as an interruptible sleep
+            if cancelled is not None:
+                cancelled.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+        raise Exception(f"HeyGen render {video_id} timed out after {timeout:.0f}s")
@@ -0,0 +1,190 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+
+# URIs arriving within this window share one import operation
+IMPORT_BATCH_WINDOW_SECONDS = float(os.getenv("IMPORT_BATCH_WINDOW_SECONDS", 5))
+# Discovery Engine accepts at most 100 input URIs per GcsSource
+IMPORT_MAX_BATCH = min(100, int(os.getenv("IMPORT_MAX_BATCH", 100)))
+MAX_IMPORTS_IN_FLIGHT = int(os.getenv("MAX_IMPORTS_IN_FLIGHT", 2))
+IMPORT_TIMEOUT_SECONDS = float(os.getenv("IMPORT_TIMEOUT_SECONDS", 6 * 3600))
+# Finished files and operations stay in memory this long; afterwards status comes from the store
+INGESTION_RETENTION_SECONDS = float(os.getenv("INGESTION_RETENTION_SECONDS", 3600))
+
+# Per-file lifecycle
+PENDING = "pending"     # in the current batching window
+QUEUED = "queued"       # batched, waiting for an import slot
+IMPORTING = "importing" # part of a running import operation
+INDEXED = "indexed"
+FAILED = "failed"
+ACTIVE = (PENDING, QUEUED, IMPORTING)
+
+class IngestionCoordinator:
+    """
+    Coalesces Discovery Engine imports across uploads:
+    - URIs submitted within IMPORT_BATCH_WINDOW_SECONDS go out as one
+      ImportDocumentsRequest (up to IMPORT_MAX_BATCH files)
+    - at most MAX_IMPORTS_IN_FLIGHT operations run at once; later batches wait
+    - every file's status and operation id can be queried while it indexes
+    `on_indexed(uris)` runs after each batch finishes (e.g. to invalidate caches).
+    Batching is per process; each status change is written through to `store`
+    (save_ingestion_files / load_ingestion_file), so finished files can be
+    forgotten after `retention` seconds and still be looked up.
+    """
+    def __init__(self, rag_factory, window: float = IMPORT_BATCH_WINDOW_SECONDS,
+                 max_batch: int = IMPORT_MAX_BATCH, max_in_flight: int = MAX_IMPORTS_IN_FLIGHT, on_indexed=None,
+                 store=None, retention: float = INGESTION_RETENTION_SECONDS):
+        self.rag_factory = rag_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.on_indexed = on_indexed
+        self.store = store
+        self.retention = retention
+        self._rag = None
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._window_started = 0.0
+        self._files: Dict[str, dict] = {}
+        self._operations: Dict[str, dict] = {}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._dispatcher: Optional[threading.Thread] = None
+
+    @property
+    def rag(self):
+        # Built on first use so importing the app doesn't open a client
+        if self._rag is None:
+            self._rag = self.rag_factory()
+        return self._rag
+
+    def submit(self, gcs_uri: str) -> dict:
+        """Queues a file for indexing. A file already on its way is not queued twice."""
+        now = time.time()
+        with self._cond:
+            self._prune(now)
+            current = self._files.get(gcs_uri)
+            if current and current["status"] in ACTIVE:
+                return dict(current)
+            if not self._pending:
+                self._window_started = now
+            self._pending.append(gcs_uri)
+            self._files[gcs_uri] = {
+                "gcs_uri": gcs_uri, "status": PENDING, "operation": None, "error": None,
+                "submitted_at": now, "updated_at": now,
+            }
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="ingestion-dispatcher", daemon=True)
+                self._dispatcher.start()
+            self._cond.notify_all()
+            record = dict(self._files[gcs_uri])
+        self._persist([record])
+        return record
+
+    def status(self, gcs_uri: str) -> Optional[dict]:
+        with self._cond:
+            record = self._files.get(gcs_uri)
+            if record:
+                return dict(record)
+        # Finished a while ago, or submitted on another instance
+        return self.store.load_ingestion_file(gcs_uri) if self.store else None
+
+    def snapshot(self) -> dict:
+        """Files and operations this instance is tracking (active or finished within `retention`)."""
+        with self._cond:
+            self._prune(time.time())
+            return {
+                "files": [dict(f) for f in self._files.values()],
+                "operations": [dict(op, gcs_uris=list(op["gcs_uris"])) for op in self._operations.values()],
+            }
+
+    def _set_status(self, uris: List[str], status: str, operation: Optional[str] = None, error: Optional[str] = None):
+        now = time.time()
+        updated = []
+        with self._cond:
+            for uri in uris:
+                record = self._files[uri]
+                record.update(status=status, updated_at=now)
+                if operation:
+                    record["operation"] = operation
+                if error:
+                    record["error"] = error
+                updated.append(dict(record))
+        self._persist(updated)
+
+    def _persist(self, records: List[dict]):
+        if self.store:
+            self.store.save_ingestion_files(records)
+
+    def _prune(self, now: float):
+        """Forgets finished files and operations older than `retention` (caller holds the lock)."""
+        cutoff = now - self.retention
+        for uri in [u for u, f in self._files.items() if f["status"] not in ACTIVE and f["updated_at"] < cutoff]:
+            del self._files[uri]
+        for name in [n for n, op in self._operations.items() if op.get("finished_at", now) < cutoff]:
+            del self._operations[name]
+
+    def _next_batch(self) -> List[str]:
+        """Blocks until the window closes (or the batch is full) and takes the batch."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                remaining = self._window_started + self.window - time.time()
+                if remaining <= 0 or len(self._pending) >= self.max_batch:
+                    break
+                self._cond.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            # Leftovers start a fresh window
+            self._window_started = time.time()
+            return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._next_batch()
+            self._set_status(batch, QUEUED)
+            self._slots.acquire()
+            try:
+                operation = self.rag.start_import(batch)
+            except Exception as e:
+                self._slots.release()
+                self._set_status(batch, FAILED, error=str(e))
+                continue
+            if operation is None:
+                self._slots.release()
+                self._set_status(batch, FAILED, error="Search client not configured")
+                continue
+
+            name = operation.operation.name
+            with self._cond:
+                self._operations[name] = {"operation": name, "gcs_uris": batch, "status": IMPORTING, "started_at": time.time()}
+            self._set_status(batch, IMPORTING, operation=name)
+            print(f"📦 Import {name}: {len(batch)} file(s) coalesced")
+            threading.Thread(target=self._watch, args=(name, operation, batch), name="ingestion-watch", daemon=True).start()
+
+    def _watch(self, name: str, operation, batch: List[str]):
+        """Waits for one operation, maps its errors back to files and frees its slot."""
+        try:
+            response = operation.result(timeout=IMPORT_TIMEOUT_SECONDS)
+            messages = [sample.message for sample in getattr(response, "error_samples", [])]
+            failed = [uri for uri in batch if any(uri in m for m in messages)]
+            indexed = [uri for uri in batch if uri not in failed]
+            self._set_status(indexed, INDEXED)
+            for uri in failed:
+                self._set_status([uri], FAILED, error=next(m for m in messages if uri in m))
+            outcome = INDEXED if not failed else f"{len(failed)} failed"
+        except Exception as e:
+            self._set_status(batch, FAILED, error=str(e))
+            indexed, outcome = [], FAILED
+        finally:
+            self._slots.release()
+
+        with self._cond:
+            self._operations[name].update(status=outcome, finished_at=time.time())
+            self._prune(time.time())
+        print(f"✅ Import {name} finished: {outcome}")
+        if indexed and self.on_indexed:
+            try:
+                self.on_indexed(indexed)
+            except Exception as e:
+                print(f"⚠️ Post-import hook failed: {e}")
@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+from app.models import JobStatus
+
+FINISHED_JOB_TTL_SECONDS = int(os.getenv("FINISHED_JOB_TTL_SECONDS", 900))
+# Hard cap on finished jobs held in memory, whatever the TTL
+MAX_FINISHED_IN_MEMORY = int(os.getenv("MAX_FINISHED_JOBS_IN_MEMORY", 10000))
+
+TERMINAL_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED)
+
+class JobRecord:
+    """Fixed-shape job state. __slots__ keeps each record small and uniform."""
+    __slots__ = (
+        "job_id", "teacher_id", "topic_id", "topic_query", "batch_id", "status", "message", "result",
+        "created_at", "updated_at", "stage_started_at", "stage_durations",
+    )
+
+    def __init__(self, job_id: str, teacher_id: str, topic_id: str, batch_id: Optional[str] = None,
+                 status: JobStatus = JobStatus.QUEUED, message: Optional[str] = None, result: Optional[str] = None,
+                 created_at: Optional[float] = None, updated_at: Optional[float] = None,
+                 stage_durations: Optional[Dict[str, float]] = None, topic_query: Optional[str] = None):
+        now = time.time()
+        self.job_id = job_id
+        self.teacher_id = teacher_id
+        self.topic_id = topic_id
+        self.topic_query = topic_query # Free text the topic was resolved from, if any
+        self.batch_id = batch_id
+        self.status = status
+        self.message = message
+        self.result = result
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+        self.stage_started_at = self.updated_at
+        self.stage_durations = stage_durations
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+class JobStore:
+    """
+    Job state with bounded memory and write-through persistence.
+    - Active jobs stay in memory until they finish.
+    - Finished jobs are evicted after FINISHED_JOB_TTL_SECONDS (or once
+      MAX_FINISHED_IN_MEMORY is exceeded) in O(1) amortized sweeps.
+    - Every transition is written to teacher_jobs, so any instance can
+      answer a status query for any job, including after a restart.
+    """
+    def __init__(self, db=None, ttl: int = FINISHED_JOB_TTL_SECONDS, max_finished: int = MAX_FINISHED_IN_MEMORY):
+        self.db = db
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, JobRecord] = {}
+        self._batches: Dict[str, List[str]] = {}
+        self._finished = deque() # (job_id, finished_at), oldest first
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def create(self, job_id: str, teacher_id: str, topic_id: str, batch_id: Optional[str] = None,
+               topic_query: Optional[str] = None) -> JobRecord:
+        record = JobRecord(job_id, teacher_id, topic_id, batch_id, topic_query=topic_query)
+        with self._lock:
+            self._sweep(record.created_at)
+            self._jobs[job_id] = record
+            if batch_id:
+                self._batches.setdefault(batch_id, []).append(job_id)
+        self._persist(record, created=True)
+        return record
+
+    def transition(self, job_id: str, status: JobStatus, message: Optional[str] = None,
+                   result: Optional[str] = None) -> Optional[JobRecord]:
+        """Applies a status change, accumulating time spent in the previous stage."""
+        now = time.time()
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None:
+                return None
+            if record.status != status:
+                durations = record.stage_durations or {}
+                key = record.status.value
+                durations[key] = round(durations.get(key, 0.0) + now - record.stage_started_at, 3)
+                record.stage_durations = durations
+            record.status = status
+            record.stage_started_at = now
+            record.updated_at = now
+            if message is not None:
+                record.message = message
+            if result is not None:
+                record.result = result
+            if record.finished:
+                self._finished.append((job_id, now))
+            self._sweep(now)
+        self._persist(record)
+        return record
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+        if record is not None:
+            return record
+        # Evicted, restarted, or created on another instance
+        return self._load(job_id)
+
+    def get_batch(self, batch_id: str) -> List[JobRecord]:
+        with self._lock:
+            job_ids = list(self._batches.get(batch_id, []))
+            records = [self._jobs[j] for j in job_ids if j in self._jobs]
+        if job_ids and len(records) == len(job_ids):
+            return records
+        if self.db:
+            rows = self.db.load_batch_jobs(batch_id)
+            if rows:
+                return [JobRecord(**row) for row in rows]
+        return records
+
+    def _sweep(self, now: float):
+        # Caller holds the lock
+        while self._finished:
+            job_id, finished_at = self._finished[0]
+            if finished_at + self.ttl > now and len(self._finished) <= self.max_finished:
+                break
+            self._finished.popleft()
+            record = self._jobs.get(job_id)
+            # A job can be re-queued after finishing; only evict if it is still finished
+            if record is None or not record.finished:
+                continue
+            del self._jobs[job_id]
+            if record.batch_id:
+                members = self._batches.get(record.batch_id)
+                if members and not any(j in self._jobs for j in members):
+                    del self._batches[record.batch_id]
+
+    def _load(self, job_id: str) -> Optional[JobRecord]:
+        if not self.db:
+            return None
+        row = self.db.load_job(job_id)
+        return JobRecord(**row) if row else None
+
+    def _persist(self, record: JobRecord, created: bool = False):
+        if self.db:
+            self.db.save_job(record, created=created)
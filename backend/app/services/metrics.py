@@ -0,0 +1,119 @@
+"""
+Prometheus metrics for the lesson pipeline.
+Labels are kept to bounded sets (stage names, agent classes, configured models);
+topic_id only appears on the lesson counter, and only for topics in the catalog
+(anything else is "unknown"), so it grows with the syllabus, not traffic.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Lesson pipelines run for minutes (HeyGen renders), chat calls for seconds
+PIPELINE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CALL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "lesson_pipeline_stage_seconds",
+    "Time spent in each process_lesson_job stage.",
+    ["stage"],
+    buckets=PIPELINE_BUCKETS,
+)
+
+LESSONS_TOTAL = Counter(
+    "lessons_total",
+    "Lesson jobs finished, by catalog topic (or \"unknown\") and outcome.",
+    ["topic_id", "outcome"],
+)
+
+RAG_SEARCH_SECONDS = Histogram(
+    "rag_search_seconds",
+    "RAGService.search latency.",
+    ["outcome"],
+    buckets=CALL_BUCKETS,
+)
+
+AGENT_GENERATE_SECONDS = Histogram(
+    "agent_generate_seconds",
+    "Agent.generate latency per agent and model.",
+    ["agent", "model", "outcome"],
+    buckets=CALL_BUCKETS,
+)
+
+FFMPEG_SECONDS = Histogram(
+    "ffmpeg_run_seconds",
+    "Wall time of ffmpeg invocations.",
+    ["operation"],
+    buckets=PIPELINE_BUCKETS,
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "DatabaseService query time.",
+    ["query"],
+    buckets=CALL_BUCKETS,
+)
+
+QUEUE_DEPTH = Gauge(
+    "lesson_jobs_queued",
+    "Lesson jobs accepted but not yet started.",
+)
+
+JOBS_IN_FLIGHT = Gauge(
+    "lesson_jobs_in_flight",
+    "Lesson jobs currently running.",
+)
+
+SCRIPT_VALIDATIONS = Counter(
+    "script_validations_total",
+    "Validator verdicts on core scripts (approved/rejected/error).",
+    ["verdict"],
+)
+
+UPSTREAM_CALLS = Counter(
+    "upstream_calls_total",
+    "Deadline-bounded upstream calls by outcome (ok/error/timeout/deadline).",
+    ["upstream", "outcome"],
+)
+
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedges_total",
+    "Backup requests sent because the first one outlived the upstream's p95.",
+    ["upstream"],
+)
+
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open).",
+    ["upstream"],
+)
+
+ANSWER_CACHE_SIMILARITY = Histogram(
+    "answer_cache_similarity",
+    "Best cosine similarity found per semantic answer cache lookup.",
+    ["result"],
+    buckets=(0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.88, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0),
+)
+
+WRITE_BEHIND_ROWS = Counter(
+    "write_behind_rows_total",
+    "Rows flushed by write-behind buffers (written/retried/dropped).",
+    ["buffer", "outcome"],
+)
+
+WRITE_BEHIND_PENDING = Gauge(
+    "write_behind_pending_rows",
+    "Rows waiting in a write-behind buffer.",
+    ["buffer"],
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit/miss). Hit ratio = hit / (hit + miss).",
+    ["cache", "result"],
+)
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def render_metrics():
+    """Returns (body, content_type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
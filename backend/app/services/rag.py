@@ -1,7 +1,76 @@
 import os
-from typing import List, Dict, Any
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
 from google.cloud import discoveryengine
 from google.api_core.client_options import ClientOptions
+from app.services.metrics import RAG_SEARCH_SECONDS, record_cache
+from app.services.tracing import tracer
+from app.services.resilience import upstream, UpstreamUnavailable, RAG_TIMEOUT_SECONDS
+from app.models import TopicScope
+
+# Optional per-book data stores: {"TN_SCERT_PHY_12": "phy12-store", ...}
+BOOK_DATA_STORES = json.loads(os.getenv("BOOK_DATA_STORES", "{}"))
+# Document metadata field holding the book id, for books without their own store.
+# Off by default: start_import() imports raw content (data_schema="content"), which
+# carries no structured fields, so a filter on one would match nothing. Set it only
+# when documents are imported with metadata (data_schema="document" + structData).
+SCOPE_FIELD = os.getenv("RAG_SCOPE_FIELD", "")
+# Set when documents carry a numeric "page" field (page-level import) to filter by topic page range
+FILTER_PAGES = os.getenv("RAG_FILTER_PAGES", "false").lower() == "true"
+PIN_TTL_SECONDS = int(os.getenv("TOPIC_CONTEXT_TTL_SECONDS", 1800))
+MAX_PINNED_TOPICS = int(os.getenv("MAX_PINNED_TOPICS", 500))
+
+def topic_query(scope: TopicScope) -> str:
+    """Canonical research query for a topic, shared by prefetch and the lesson pipeline."""
+    return f"Explain {scope.title or scope.topic_id}"
+
+class TopicContextCache:
+    """
+    Retrieved context pinned per (topic, query) when a teacher opens a topic,
+    so the lesson pipeline's research query skips the Discovery Engine
+    round-trip. Other questions in the topic miss and are searched as asked:
+    the pinned context answers "Explain <title>", not whatever comes next.
+    LRU-bounded with a TTL; shared by every RAGService in the process.
+    """
+    def __init__(self, ttl: int = PIN_TTL_SECONDS, max_topics: int = MAX_PINNED_TOPICS):
+        self.ttl = ttl
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(topic_id: str, query: str) -> Tuple[str, str]:
+        return topic_id, " ".join(query.lower().split())
+
+    def pin(self, topic_id: str, query: str, context: str):
+        key = self._key(topic_id, query)
+        with self._lock:
+            self._entries[key] = (context, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_topics:
+                self._entries.popitem(last=False)
+
+    def get(self, topic_id: str, query: str) -> Optional[str]:
+        key = self._key(topic_id, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            context, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return context
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+topic_context_cache = TopicContextCache()
 
 class RAGService:
     """
@@ -26,14 +95,24 @@ class RAGService:
             except Exception as e:
                 print(f"⚠️ RAG Service Warning: Could not init Vertex AI Client: {e}")
 
-    def import_documents(self, gcs_uri: str):
+    def import_documents(self, gcs_uri: Union[str, List[str]]):
         """
-        Triggers an immediate import of the document from GCS to the Data Store.
+        Triggers an immediate import of the document(s) from GCS to the Data Store.
+        Accepts a single URI or a list so bulk uploads can share one import operation.
+        Returns the operation name.
         """
-        print(f"📥 Triggering Vertex AI Import for: {gcs_uri}")
+        operation = self.start_import([gcs_uri] if isinstance(gcs_uri, str) else list(gcs_uri))
+        return operation.operation.name if operation else None
+
+    def start_import(self, input_uris: List[str]):
+        """
+        Starts one import for all input_uris and returns the long-running
+        operation (None when the client isn't configured).
+        """
+        print(f"📥 Triggering Vertex AI Import for {len(input_uris)} file(s): {input_uris[:3]}")
         if not self.client:
             print("⚠️ Client not ready, skipping import.")
-            return
+            return None
 
         try:
             # Import relies on the whole bucket or prefix
@@ -49,74 +128,141 @@ class RAGService:
                     branch="default_branch",
                 ),
                 gcs_source=discoveryengine.GcsSource(
-                    input_uris=[gcs_uri], data_schema="content"
+                    input_uris=input_uris, data_schema="content"
                 ),
                 # PUBLISH to make it searchable immediately (Auto-Refresh)
                 reconciliation_mode=discoveryengine.ImportDocumentsRequest.ReconciliationMode.INCREMENTAL
             )
 
             # We use a long-running operation
-            operation = self.client.import_documents(request=import_request)
+            with tracer.start_as_current_span("rag.import_documents", attributes={"rag.input_uris": len(input_uris)}):
+                operation = self.client.import_documents(request=import_request)
             print(f"⏳ Import Operation Started: {operation.operation.name}")
-            return operation.operation.name
+            return operation
             
         except Exception as e:
             print(f"❌ Import Failed: {e}")
             raise e
 
-    def search(self, query: str) -> str:
+    def search(self, query: str, scope: Optional[TopicScope] = None, timeout: float = RAG_TIMEOUT_SECONDS) -> str:
         """
         Searches the Vector DB for relevant textbook content.
+        With a scope, context pinned for this exact query is returned as is; otherwise the search is
+        pushed down to the topic's book when it has its own store or metadata filtering
+        is configured (and to its pages when enabled).
+        The call is bounded by timeout and hedged; an upstream failure raises
+        UpstreamUnavailable instead of falling back to mock content.
+        """
+        if scope:
+            pinned = topic_context_cache.get(scope.topic_id, query)
+            record_cache("topic_context", pinned is not None)
+            if pinned is not None:
+                return pinned
+
+        start = time.perf_counter()
+        outcome = "ok"
+        with tracer.start_as_current_span("rag.search", attributes={
+            "rag.data_store": self.data_store_id, "rag.query_chars": len(query),
+            "rag.scoped": scope is not None
+        }) as span:
+            try:
+                result = self._search(query, scope, timeout)
+                if result is None:
+                    outcome = "mock"
+                    result = self._mock_search_results(query)
+                span.set_attribute("rag.result_chars", len(result))
+                return result
+            except UpstreamUnavailable as e:
+                outcome = "unavailable"
+                span.record_exception(e)
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                span.set_attribute("rag.outcome", outcome)
+                RAG_SEARCH_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - start)
+
+    def prefetch(self, scope: TopicScope) -> str:
+        """
+        Runs the topic's canonical research query and pins the result.
+        """
+        query = topic_query(scope)
+        context = self.search(query, scope)
+        topic_context_cache.pin(scope.topic_id, query, context)
+        return context
+
+    def _scope_request(self, scope: Optional[TopicScope]) -> Tuple[str, str]:
+        """
+        Returns (data_store_id, filter) for a scope.
+        A per-book data store needs no filter; otherwise filter on document
+        metadata when SCOPE_FIELD is configured, else search the shared store.
+        """
+        if not scope or not scope.book_id:
+            return self.data_store_id, ""
+
+        book_store = BOOK_DATA_STORES.get(scope.book_id)
+        clauses = [f'{SCOPE_FIELD}: ANY("{scope.book_id}")'] if SCOPE_FIELD and not book_store else []
+        if FILTER_PAGES and scope.page_start is not None and scope.page_end is not None:
+            clauses += [f"page >= {scope.page_start}", f"page <= {scope.page_end}"]
+        return book_store or self.data_store_id, " AND ".join(clauses)
+
+    def _search(self, query: str, scope: Optional[TopicScope] = None, timeout: float = RAG_TIMEOUT_SECONDS) -> Optional[str]:
+        """
+        Runs the Discovery Engine query. Returns None when the client isn't
+        configured (local dev), so the caller falls back to mock results.
         """
         print(f"🔍 RAG Search Query: {query}")
         
         # If client is not initialized (e.g. local dev without creds), return mock
         if not self.client:
-           return self._mock_search_results(query)
+           return None
 
-        try:
-            serving_config = self.client.serving_config_path(
-                project=self.project_id,
-                location=self.location,
-                data_store=self.data_store_id,
-                serving_config="default_config",
-            )
+        data_store_id, search_filter = self._scope_request(scope)
+        serving_config = self.client.serving_config_path(
+            project=self.project_id,
+            location=self.location,
+            data_store=data_store_id,
+            serving_config="default_config",
+        )
 
-            request = discoveryengine.SearchRequest(
-                serving_config=serving_config,
-                query=query,
-                page_size=3,
-                content_search_spec=discoveryengine.SearchRequest.ContentSearchSpec(
-                    snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
-                        return_snippet=True
-                    ),
-                    summary_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec(
-                        summary_result_count=3,
-                        include_citations=True,
-                    ),
+        request = discoveryengine.SearchRequest(
+            serving_config=serving_config,
+            query=query,
+            filter=search_filter,
+            page_size=3,
+            content_search_spec=discoveryengine.SearchRequest.ContentSearchSpec(
+                snippet_spec=discoveryengine.SearchRequest.ContentSearchSpec.SnippetSpec(
+                    return_snippet=True
                 ),
-            )
-
-            response = self.client.search(request)
-            
-            # combine summaries or snippets
-            context = ""
-            if response.summary and response.summary.summary_text:
-                context += f"Summary: {response.summary.summary_text}\n\n"
-            
-            for result in response.results:
-                data = result.document.derived_struct_data
-                if "snippets" in data:
-                     for snippet in data["snippets"]:
-                         text = snippet.get('snippet', '')
-                         print(f"📄 Retrieved Snippet: {text[:200]}...") # Log for debugging
-                         context += f"- {text}\n"
-            
-            return context if context else "No relevant textbook content found."
+                summary_spec=discoveryengine.SearchRequest.ContentSearchSpec.SummarySpec(
+                    summary_result_count=3,
+                    include_citations=True,
+                ),
+            ),
+        )
 
-        except Exception as e:
+        try:
+            # The gRPC timeout also ends the request we stop waiting for
+            response = upstream("discovery_engine").call(lambda: self.client.search(request, timeout=timeout), timeout)
+        except UpstreamUnavailable as e:
             print(f"❌ RAG Search Error: {e}")
-            return self._mock_search_results(query)
+            raise
+        
+        # combine summaries or snippets
+        context = ""
+        if response.summary and response.summary.summary_text:
+            context += f"Summary: {response.summary.summary_text}\n\n"
+        
+        for result in response.results:
+            data = result.document.derived_struct_data
+            if "snippets" in data:
+                 for snippet in data["snippets"]:
+                     text = snippet.get('snippet', '')
+                     print(f"📄 Retrieved Snippet: {text[:200]}...") # Log for debugging
+                     context += f"- {text}\n"
+        
+        return context if context else "No relevant textbook content found."
 
     def _mock_search_results(self, query: str) -> str:
         """
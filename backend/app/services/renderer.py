@@ -0,0 +1,104 @@
+import os
+import re
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from app.services.tracing import tracer, set_span_attributes
+
+# HeyGen segment jobs in flight per instance, across all core renders
+SEGMENT_RENDER_WORKERS = int(os.getenv("SEGMENT_RENDER_WORKERS", 4))
+# Extra attempts for a failed segment; only that segment is re-rendered
+SEGMENT_RETRIES = int(os.getenv("SEGMENT_RETRIES", 1))
+
+# The ScriptwriterAgent's fixed structure: Intro / Concept / Examples / Summary.
+# A heading is a markdown heading/bold line, or the bare name on its own line
+# (optionally with a timing), so narration that starts with "Examples of..." isn't split.
+SECTION_NAMES = r"(intro(?:duction)?|concept|examples?|summary)"
+SECTION_HEADING = re.compile(
+    rf"^\s*(?:(?:#+\s*|-?\s*\*\*)\s*{SECTION_NAMES}\b[^\n]*|{SECTION_NAMES}\s*(?:\([^)\n]*\))?\s*:?\s*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+segment_pool = ThreadPoolExecutor(max_workers=SEGMENT_RENDER_WORKERS, thread_name_prefix="segment")
+
+def split_script_sections(script: str) -> List[Tuple[str, str]]:
+    """
+    Splits a core script into (section, text) at its section headings.
+    Text before the first heading joins the first section. A script without
+    at least two recognizable sections is returned whole.
+    """
+    headings = list(SECTION_HEADING.finditer(script))
+    if len(headings) < 2:
+        return [("full", script.strip())]
+
+    sections = []
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(script)
+        start = 0 if i == 0 else match.start()
+        text = script[start:end].strip()
+        if text:
+            sections.append(((match.group(1) or match.group(2)).lower(), text))
+    return sections
+
+def segment_key(text: str, language: str) -> str:
+    """Cache key of a rendered section: same words, same voice -> same video."""
+    return hashlib.sha1(f"{language}\n{text}".encode("utf-8")).hexdigest()
+
+class SegmentedRenderer:
+    """
+    Renders a core script as one HeyGen job per section, in parallel, and
+    stitches the segments. Each segment is cached by its content, so a
+    rewritten section (or a retry after a failure) re-renders only that
+    section.
+    """
+    def __init__(self, heygen, stitcher, db):
+        self.heygen = heygen
+        self.stitcher = stitcher
+        self.db = db
+
+    @tracer.start_as_current_span("renderer.render")
+    def render(self, script: str, language: str, cancelled: Optional[threading.Event] = None) -> Optional[str]:
+        """Returns the stitched core video URL, or None if cancelled first."""
+        sections = split_script_sections(script)
+        keys = [segment_key(text, language) for _, text in sections]
+        urls = [self.db.get_render_segment(key) for key in keys]
+        missing = [i for i, url in enumerate(urls) if not url]
+        set_span_attributes({"render.sections": len(sections), "render.sections_cached": len(sections) - len(missing)})
+        print(f"🎞️ Core render: {len(sections)} section(s), {len(missing)} to render, {len(sections) - len(missing)} cached")
+
+        futures = {
+            i: segment_pool.submit(contextvars.copy_context().run, self._render_segment, sections[i][1], keys[i], cancelled)
+            for i in missing
+        }
+        # Wait for every segment before raising, so finished ones are cached for the retry
+        errors = []
+        for i, future in futures.items():
+            try:
+                urls[i] = future.result()
+            except Exception as e:
+                errors.append(f"{sections[i][0]}: {e}")
+        if errors:
+            raise Exception(f"Segment render failed ({'; '.join(errors)})")
+        if any(url is None for url in urls):
+            return None # Cancelled
+
+        if len(urls) == 1:
+            return urls[0]
+        return self.stitcher.stitch_urls(urls, f"core/{hashlib.sha1(''.join(keys).encode()).hexdigest()[:16]}.mp4")
+
+    def _render_segment(self, text: str, key: str, cancelled: Optional[threading.Event]) -> Optional[str]:
+        for attempt in range(SEGMENT_RETRIES + 1):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            try:
+                video_id = self.heygen.generate_video(text)["data"]["video_id"]
+                url = self.heygen.wait_for_video(video_id, cancelled)
+                if url:
+                    self.db.save_render_segment(key, url)
+                return url
+            except Exception as e:
+                if attempt == SEGMENT_RETRIES:
+                    raise
+                print(f"⚠️ Segment render failed, retrying ({e})")
@@ -0,0 +1,218 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Optional
+from app.services.metrics import UPSTREAM_CALLS, UPSTREAM_HEDGES, CIRCUIT_STATE
+
+# Whole-request budgets; retrieval gets a share, generation the rest
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", 20))
+RETRIEVAL_BUDGET_SHARE = float(os.getenv("RETRIEVAL_BUDGET_SHARE", 0.3))
+# Per-call ceilings when no request deadline applies (lesson pipeline)
+RAG_TIMEOUT_SECONDS = float(os.getenv("RAG_TIMEOUT_SECONDS", 10))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 90))
+
+# Backup request goes out once the primary outlives the upstream's recent p95
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20 # until then the initial delay is used
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", 0.05))
+HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("HEDGE_INITIAL_DELAY_SECONDS", 2))
+# Hedges allowed per call, so a slow upstream doesn't see its load doubled
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", 0.1))
+LATENCY_WINDOW = 200
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+
+# Abandoned calls (timed out or lost the hedge) finish here in the background
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", 64))
+upstream_pool = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class UpstreamUnavailable(Exception):
+    """An upstream call failed, timed out or was refused by its circuit breaker."""
+    def __init__(self, upstream: str, reason: str, retry_after: int = 1):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class Deadline:
+    """Absolute time budget for one request, shared across the calls it makes."""
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def share(self, fraction: float) -> float:
+        """Slice of what is left, e.g. retrieval's part of the budget."""
+        return self.remaining() * fraction
+
+class LatencyTracker:
+    """Sliding window of successful call latencies."""
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class CircuitBreaker:
+    """
+    Opens after BREAKER_FAILURE_THRESHOLD consecutive failures and refuses
+    calls for BREAKER_RESET_SECONDS; then lets one trial call through
+    (half-open) and closes again if it succeeds.
+    """
+    def __init__(self, name: str, threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self):
+        """Raises UpstreamUnavailable when the call must not go out."""
+        with self._lock:
+            if self._state == OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_seconds:
+                    raise UpstreamUnavailable(self.name, "circuit open", retry_after=max(1, int(self.reset_seconds - waited)))
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._trial_running:
+                    raise UpstreamUnavailable(self.name, "circuit half-open, trial call running")
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                if self._state != OPEN:
+                    print(f"🔌 Circuit for {self.name} opened after {self._failures} failure(s)")
+                self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        # Caller holds the lock
+        self._state = state
+        CIRCUIT_STATE.labels(upstream=self.name).set(_STATE_VALUES[state])
+
+class Upstream:
+    """
+    One external dependency (Discovery Engine, a Gemini model): its circuit
+    breaker, hedging budget and a latency window per call class (a short chat
+    answer and a full core script don't share a p95). call() runs fn with a
+    timeout, sends one backup request once the primary outlives its class's
+    recent p95, and returns the first successful answer.
+    """
+    def __init__(self, name: str, hedge: bool = HEDGE_ENABLED):
+        self.name = name
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(name)
+        self._lock = threading.Lock()
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._calls = 0
+        self._hedges = 0
+
+    def latency(self, call_class: str = "default") -> LatencyTracker:
+        with self._lock:
+            if call_class not in self._latency:
+                self._latency[call_class] = LatencyTracker()
+            return self._latency[call_class]
+
+    def hedge_delay(self, call_class: str = "default") -> float:
+        p95 = self.latency(call_class).percentile(HEDGE_PERCENTILE)
+        return max(HEDGE_MIN_DELAY_SECONDS, p95 if p95 is not None else HEDGE_INITIAL_DELAY_SECONDS)
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > max(1.0, self._calls * HEDGE_MAX_RATIO):
+                return False
+            self._hedges += 1
+            return True
+
+    def call(self, fn: Callable, timeout: float, call_class: str = "default"):
+        """Returns fn()'s result or raises UpstreamUnavailable."""
+        if timeout <= 0:
+            # Earlier steps spent the budget; says nothing about this upstream's health
+            UPSTREAM_CALLS.labels(upstream=self.name, outcome="deadline").inc()
+            raise UpstreamUnavailable(self.name, "no time left in the request budget")
+        self.breaker.allow()
+        with self._lock:
+            self._calls += 1
+
+        start = time.monotonic()
+        deadline = start + timeout
+        attempts = [self._submit(fn)]
+        error = None
+        # One hedge decision per call: once due it is sent or refused, never re-checked
+        hedge_at = start + self.hedge_delay(call_class) if self.hedge else None
+        while attempts:
+            wake = min(deadline, hedge_at) if hedge_at else deadline
+            done, _ = wait(attempts, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                attempts.remove(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self.latency(call_class).observe(time.monotonic() - start)
+                self.breaker.record_success()
+                UPSTREAM_CALLS.labels(upstream=self.name, outcome="ok").inc()
+                return result
+            if time.monotonic() >= deadline:
+                break
+            if hedge_at and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if error is None and self._may_hedge():
+                    UPSTREAM_HEDGES.labels(upstream=self.name).inc()
+                    attempts.append(self._submit(fn))
+
+        self.breaker.record_failure()
+        if attempts:
+            UPSTREAM_CALLS.labels(upstream=self.name, outcome="timeout").inc()
+            raise UpstreamUnavailable(self.name, f"no answer within {timeout:.1f}s")
+        UPSTREAM_CALLS.labels(upstream=self.name, outcome="error").inc()
+        raise UpstreamUnavailable(self.name, str(error)) from error
+
+    def _submit(self, fn: Callable):
+        return upstream_pool.submit(contextvars.copy_context().run, fn)
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+def upstream(name: str) -> Upstream:
+    """Process-wide Upstream per dependency, shared by every client instance."""
+    with _upstreams_lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name)
+        return _upstreams[name]
@@ -0,0 +1,108 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", 1800))
+MAX_SESSIONS_IN_MEMORY = int(os.getenv("CHAT_MAX_SESSIONS", 20000))
+# Turns kept verbatim; older ones are folded into the rolling summary
+MAX_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", 6))
+# Assistant replies are clipped when stored; the summary carries the gist
+MAX_STORED_TURN_CHARS = 2000
+
+class ChatSession:
+    """Compact per-session state: a bounded window of turns plus a rolling summary."""
+    __slots__ = ("session_id", "summary", "turns", "turn_count", "updated_at")
+
+    def __init__(self, session_id: str, summary: str = "", turns: Optional[List[Tuple[str, str]]] = None, turn_count: int = 0):
+        self.session_id = session_id
+        self.summary = summary
+        self.turns = list(turns or [])
+        self.turn_count = turn_count
+        self.updated_at = time.time()
+
+    def history(self) -> List[dict]:
+        return [{"role": role, "content": content} for role, content in self.turns]
+
+    def overflow(self) -> List[Tuple[str, str]]:
+        """Turns beyond the verbatim window, oldest first."""
+        excess = len(self.turns) - MAX_RECENT_TURNS
+        return self.turns[:excess] if excess > 0 else []
+
+class ChatSessionStore:
+    """
+    Server-side chat sessions.
+    Hot sessions live in memory (LRU with TTL eviction); every change is
+    written through to Postgres so a session survives eviction, restarts and
+    landing on a different instance.
+    """
+    def __init__(self, db=None):
+        self.db = db
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def _evict_expired(self, now: float):
+        # Oldest entries sit at the front, so stop at the first live one
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.updated_at < SESSION_TTL_SECONDS and len(self._sessions) <= MAX_SESSIONS_IN_MEMORY:
+                break
+            self._sessions.popitem(last=False)
+
+    def get_or_create(self, session_id: Optional[str]) -> ChatSession:
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            if session_id and session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+                return self._sessions[session_id]
+
+        session = None
+        if session_id and self.db:
+            row = self.db.load_chat_session(session_id)
+            if row:
+                session = ChatSession(session_id, row["summary"], [tuple(t) for t in row["turns"]], row["turn_count"])
+        if session is None:
+            session = ChatSession(session_id or str(uuid.uuid4()))
+
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            existing = self._sessions.get(session.session_id)
+            if existing:
+                return existing
+            self._sessions[session.session_id] = session
+            return session
+
+    def append_exchange(self, session: ChatSession, user_message: str, reply: str):
+        with self._lock:
+            session.turns.append(("user", user_message[:MAX_STORED_TURN_CHARS]))
+            session.turns.append(("assistant", reply[:MAX_STORED_TURN_CHARS]))
+            session.turn_count += 2
+            session.updated_at = time.time()
+        self._persist(session)
+
+    def fold_into_summary(self, session: ChatSession, summarize) -> bool:
+        """
+        Incrementally folds turns that fell out of the verbatim window into
+        the rolling summary. `summarize(previous_summary, turns)` returns the new summary.
+        """
+        with self._lock:
+            overflow = session.overflow()
+            previous = session.summary
+        if not overflow:
+            return False
+
+        summary = summarize(previous, overflow)
+        with self._lock:
+            # Drop exactly the turns we summarized; new ones may have arrived
+            if session.turns[:len(overflow)] == overflow:
+                session.turns = session.turns[len(overflow):]
+                session.summary = summary
+        self._persist(session)
+        return True
+
+    def _persist(self, session: ChatSession):
+        if self.db:
+            self.db.save_chat_session(session.session_id, session.summary, session.turns, session.turn_count)
@@ -1,7 +1,130 @@
 import os
+import glob
+import json
+import hashlib
 import subprocess
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from google.cloud import storage
+from app.services.metrics import FFMPEG_SECONDS
+from app.services.tracing import tracer, set_span_attributes
+
+# Stitch strategies, cheapest first
+STRATEGY_COPY = "copy"           # identical streams: concat demuxer, no re-encode
+STRATEGY_AUDIO = "audio"         # video matches, audio differs: re-encode audio only
+STRATEGY_NORMALIZE = "normalize" # re-encode only the short intro to match the core, then copy
+STRATEGY_REENCODE = "reencode"   # full re-encode through the concat filter
+
+# Speed-first x264 settings for anything we do re-encode
+STITCH_PRESET = os.getenv("STITCH_PRESET", "veryfast")
+STITCH_CRF = os.getenv("STITCH_CRF", "23")
+# Leading clips longer than this are not worth normalizing separately
+NORMALIZE_MAX_SECONDS = float(os.getenv("STITCH_NORMALIZE_MAX_SECONDS", 60))
+
+# "mp4" stitches a full file per lesson; "hls" segments each core once and
+# serves a lesson as a small playlist: intro segments, then the shared core segments
+LESSON_OUTPUT_FORMAT = os.getenv("LESSON_OUTPUT_FORMAT", "mp4").lower()
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", 6))
+HLS_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+
+# ffprobe profile names -> x264 -profile:v values
+H264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high"}
+
+VIDEO_KEYS = ("codec", "width", "height", "pix_fmt", "fps", "time_base", "profile")
+AUDIO_KEYS = ("codec", "sample_rate", "channels")
+
+def _fit_filter(width: int, height: int, fps: Optional[str]) -> str:
+    """Scale-and-pad to the target frame so mixed resolutions don't distort."""
+    chain = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+             f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+    if fps:
+        chain += f",fps={fps}"
+    return chain
+
+def _timescale(time_base: Optional[str]) -> str:
+    # "1/15360" -> "15360"
+    if time_base and "/" in time_base:
+        return time_base.split("/")[1]
+    return "15360"
+
+def parse_media_playlist(text: str, base_url: str) -> List[Tuple[float, str]]:
+    """
+    Returns (duration, absolute uri) per segment of an HLS media playlist.
+    Relative segment URIs are resolved against the playlist's directory.
+    """
+    segments, duration = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#") and duration is not None:
+            uri = line if "://" in line else f"{base_url.rsplit('/', 1)[0]}/{line}"
+            segments.append((duration, uri))
+            duration = None
+    return segments
+
+def build_lesson_playlist(parts: List[List[Tuple[float, str]]]) -> str:
+    """
+    Joins segment lists into one VOD media playlist. Each part after the first
+    starts with a discontinuity, since intro and core are encoded separately.
+    """
+    target = max((int(d + 0.999) for part in parts for d, _ in part), default=HLS_SEGMENT_SECONDS)
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for i, part in enumerate(parts):
+        if i > 0:
+            lines.append("#EXT-X-DISCONTINUITY")
+        for duration, uri in part:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(uri)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+def hls_compatible(probe: dict, reference: dict) -> bool:
+    """
+    True when a clip can be segmented as-is next to the reference. The time
+    base is ignored because HLS remuxes everything to 90kHz MPEG-TS.
+    """
+    if not probe["video"] or not reference["video"] or not probe["audio"] or not reference["audio"]:
+        return False
+    return (all(probe["video"].get(k) == reference["video"].get(k) for k in VIDEO_KEYS if k != "time_base")
+            and all(probe["audio"].get(k) == reference["audio"].get(k) for k in AUDIO_KEYS))
+
+def choose_strategy(probes: List[dict]) -> str:
+    """
+    Picks the cheapest strategy that still produces a correct file.
+    The last input is treated as the core lesson and is never re-encoded unless unavoidable.
+    """
+    if any(p["video"] is None for p in probes):
+        return STRATEGY_REENCODE
+
+    ref = probes[-1]
+    video_match = all(
+        all(p["video"].get(k) == ref["video"].get(k) for k in VIDEO_KEYS) for p in probes
+    )
+    audio_present = [p["audio"] is not None for p in probes]
+    audio_match = all(audio_present) and all(
+        all(p["audio"].get(k) == ref["audio"].get(k) for k in AUDIO_KEYS) for p in probes
+    )
+
+    if video_match and audio_match:
+        return STRATEGY_COPY
+    if video_match and all(audio_present):
+        return STRATEGY_AUDIO
+
+    # Matching the core's stream parameters is only reliable when the core is H.264/AAC
+    core_encodable = ref["video"].get("codec") == "h264" and (ref["audio"] or {}).get("codec") == "aac"
+    leading_short = all(p["duration"] <= NORMALIZE_MAX_SECONDS for p in probes[:-1])
+    if core_encodable and leading_short:
+        return STRATEGY_NORMALIZE
+    return STRATEGY_REENCODE
 
 class StitcherService:
     def __init__(self):
@@ -13,62 +136,299 @@ class StitcherService:
         except:
             print("⚠️ Warning: GCS Client failed to init. Local mode only.")
             self.storage_client = None
+        # core video url -> segment list; segmentation happens once per core
+        self._core_segments: Dict[str, List[Tuple[float, str]]] = {}
+        self._core_probes: Dict[str, dict] = {}
+        self._core_locks: Dict[str, threading.Lock] = {}
+        self._core_locks_guard = threading.Lock()
 
+    @tracer.start_as_current_span("stitcher.stitch")
     def stitch(self, intro_url: str, core_url: str) -> str:
         """
         Downloads two videos, stitches them with FFmpeg, uploads result to GCS.
         Returns the public URL of the final video.
         """
         job_id = str(uuid.uuid4())
+        return self.stitch_urls([intro_url, core_url], f"output/{job_id}_lesson.mp4", job_id)
+
+    def stitch_urls(self, urls: List[str], destination_blob_name: str, job_id: Optional[str] = None) -> str:
+        """
+        Downloads clips (concurrently), concatenates them in order with the
+        cheapest correct strategy and uploads the result. Returns its URL.
+        """
+        job_id = job_id or str(uuid.uuid4())
         work_dir = f"/tmp/{job_id}"
         os.makedirs(work_dir, exist_ok=True)
-        
-        intro_path = f"{work_dir}/intro.mp4"
-        core_path = f"{work_dir}/core.mp4"
+        paths = [f"{work_dir}/part_{i}.mp4" for i in range(len(urls))]
         output_path = f"{work_dir}/final.mp4"
         
-        print(f"[{job_id}] 🧵 Starting Stitching Process...")
+        print(f"[{job_id}] 🧵 Starting Stitching Process ({len(urls)} clips)...")
 
         # 1. Download Files (Mocking download if URLs are fake mock.com)
-        self._download_or_mock(intro_url, intro_path)
-        self._download_or_mock(core_url, core_path)
+        with ThreadPoolExecutor(max_workers=min(8, len(urls))) as pool:
+            list(pool.map(self._download_or_mock, urls, paths))
 
-        # 2. Create FFmpeg List File
-        list_file = f"{work_dir}/input.txt"
-        with open(list_file, "w") as f:
-            f.write(f"file '{intro_path}'\n")
-            f.write(f"file '{core_path}'\n")
-
-        # 3. Run FFmpeg Concat
-        # -y: overwrite
-        # -f concat: use concat demuxer
-        # -safe 0: allow unsafe paths
-        # -c copy: stream copy (fastest, no re-encoding) - assume same codec
-        # If codecs differ, we'd need re-encoding: -c:v libx264 -c:a aac
-        cmd = [
-            "ffmpeg", "-y", 
-            "-f", "concat",
-            "-safe", "0", 
-            "-i", list_file,
-            "-c", "copy",
-            output_path
-        ]
-        
+        # 2. Probe inputs and stitch with the cheapest correct strategy
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            print(f"[{job_id}] ✅ FFmpeg Stitching Complete.")
+            strategy = self.stitch_files(paths, output_path)
+            print(f"[{job_id}] ✅ FFmpeg Stitching Complete (strategy: {strategy}).")
         except subprocess.CalledProcessError as e:
-            print(f"[{job_id}] ❌ FFmpeg Failed: {e.stderr.decode()}")
+            print(f"[{job_id}] ❌ FFmpeg Failed: {e.stderr.decode(errors='replace') if e.stderr else e}")
             raise Exception("Video stitching failed during processing.")
 
-        # 4. Upload to GCS
-        final_url = self._upload_to_gcs(output_path, f"output/{job_id}_lesson.mp4")
+        # 3. Upload to GCS
+        final_url = self._upload_to_gcs(output_path, destination_blob_name)
         
         # Cleanup
         # shutil.rmtree(work_dir) # Optional: keep for debugging in this mock env
         
         return final_url
 
+    @tracer.start_as_current_span("stitcher.stitch_hls")
+    def stitch_hls(self, intro_url: str, core_url: str) -> str:
+        """
+        HLS assembly: no full-length encode or upload per lesson.
+        Segments the short intro, reuses the core's stored segments and
+        uploads a small playlist that plays one after the other.
+        Returns the URL of the lesson's .m3u8.
+        """
+        job_id = str(uuid.uuid4())
+        work_dir = f"/tmp/{job_id}"
+        os.makedirs(work_dir, exist_ok=True)
+        print(f"[{job_id}] 🧵 Building HLS lesson playlist...")
+
+        try:
+            core_segments = self.core_segments(core_url)
+            intro_path = f"{work_dir}/intro.mp4"
+            self._download_or_mock(intro_url, intro_path)
+            intro_segments = self._package_hls(intro_path, f"{work_dir}/intro_hls", f"hls/intro/{job_id}",
+                                               reference_url=core_url)
+        except subprocess.CalledProcessError as e:
+            print(f"[{job_id}] ❌ FFmpeg Failed: {e.stderr.decode(errors='replace') if e.stderr else e}")
+            raise Exception("Video segmenting failed during processing.")
+
+        playlist_path = f"{work_dir}/lesson.m3u8"
+        with open(playlist_path, "w") as f:
+            f.write(build_lesson_playlist([intro_segments, core_segments]))
+        set_span_attributes({"hls.intro_segments": len(intro_segments), "hls.core_segments": len(core_segments)})
+        return self._upload_to_gcs(playlist_path, f"output/{job_id}_lesson.m3u8", content_type=HLS_CONTENT_TYPE)
+
+    def core_segments(self, core_url: str) -> List[Tuple[float, str]]:
+        """
+        The core lesson's HLS segments, produced on first use and stored under
+        a path derived from the core URL, so every instance and every
+        personalized lesson shares one copy.
+        """
+        segments = self._core_segments.get(core_url)
+        if segments is not None:
+            return segments
+        with self._core_locks_guard:
+            lock = self._core_locks.setdefault(core_url, threading.Lock())
+        with lock:
+            segments = self._core_segments.get(core_url)
+            if segments is None:
+                prefix = f"hls/core/{hashlib.sha1(core_url.encode()).hexdigest()[:16]}"
+                segments = self._load_playlist(f"{prefix}/index.m3u8")
+                if segments is None:
+                    work_dir = f"/tmp/core-{uuid.uuid4()}"
+                    os.makedirs(work_dir, exist_ok=True)
+                    core_path = f"{work_dir}/core.mp4"
+                    self._download_or_mock(core_url, core_path)
+                    self._core_probes[core_url] = self.probe(core_path)
+                    segments = self._package_hls(core_path, f"{work_dir}/hls", prefix)
+                    print(f"📦 Core lesson segmented once into {len(segments)} HLS segments: {prefix}")
+                self._core_segments[core_url] = segments
+        return segments
+
+    def _package_hls(self, path: str, out_dir: str, prefix: str, reference_url: Optional[str] = None) -> List[Tuple[float, str]]:
+        """
+        Segments a local MP4 into HLS (stream copy) and uploads the segments
+        and index under prefix. With reference_url, the clip is first
+        re-encoded to the core's parameters unless they already match.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        if reference_url:
+            reference = self._reference_probe(reference_url, out_dir)
+            probe = self.probe(path)
+            if not hls_compatible(probe, reference):
+                normalized = f"{out_dir}/normalized.mp4"
+                self._normalize(path, probe, reference, normalized)
+                path = normalized
+
+        cmd = [
+            "ffmpeg", "-y", "-i", path, "-c", "copy",
+            "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", f"{out_dir}/seg_%05d.ts", f"{out_dir}/index.m3u8",
+        ]
+        self._run_ffmpeg(cmd, "segment")
+
+        for segment in sorted(glob.glob(f"{out_dir}/seg_*.ts")):
+            self._upload_to_gcs(segment, f"{prefix}/{os.path.basename(segment)}", content_type="video/mp2t")
+        index_url = self._upload_to_gcs(f"{out_dir}/index.m3u8", f"{prefix}/index.m3u8", content_type=HLS_CONTENT_TYPE)
+        with open(f"{out_dir}/index.m3u8") as f:
+            return parse_media_playlist(f.read(), index_url)
+
+    def _reference_probe(self, core_url: str, work_dir: str) -> dict:
+        """Stream parameters of the core; probes its first stored segment if this instance didn't segment it."""
+        probe = self._core_probes.get(core_url)
+        if probe is not None:
+            return probe
+        first_segment = self.core_segments(core_url)[0][1]
+        bucket_url = f"https://storage.googleapis.com/{self.bucket_name}/"
+        if first_segment.startswith("file://"):
+            path = first_segment[len("file://"):]
+        elif self.storage_client and first_segment.startswith(bucket_url):
+            path = f"{work_dir}/reference.ts"
+            self.storage_client.bucket(self.bucket_name).blob(first_segment[len(bucket_url):]).download_to_filename(path)
+        else:
+            path = f"{work_dir}/reference.ts"
+            self._download_or_mock(first_segment, path)
+        probe = self.probe(path)
+        self._core_probes[core_url] = probe
+        return probe
+
+    def _load_playlist(self, blob_name: str) -> Optional[List[Tuple[float, str]]]:
+        """Reads an already-uploaded playlist, or None if it isn't stored yet."""
+        if not self.storage_client:
+            return None
+        blob = self.storage_client.bucket(self.bucket_name).blob(blob_name)
+        try:
+            with tracer.start_as_current_span("gcs.download", attributes={"gcs.object": blob_name}):
+                text = blob.download_as_text()
+        except Exception:
+            return None
+        return parse_media_playlist(text, f"https://storage.googleapis.com/{self.bucket_name}/{blob_name}")
+
+    def stitch_files(self, paths: List[str], output_path: str, strategy: Optional[str] = None) -> str:
+        """
+        Concatenates local files into output_path. Probes the inputs and picks
+        the cheapest correct strategy unless one is forced. Returns the strategy used.
+        """
+        probes = [self.probe(p) for p in paths]
+        strategy = strategy or choose_strategy(probes)
+        set_span_attributes({"stitch.strategy": strategy, "stitch.inputs": len(paths)})
+        work_dir = os.path.dirname(output_path) or "."
+
+        if strategy == STRATEGY_COPY:
+            self._concat_demuxer(paths, output_path, ["-c", "copy"])
+        elif strategy == STRATEGY_AUDIO:
+            ref = probes[-1]["audio"] or {}
+            audio_args = ["-c:v", "copy", "-c:a", "aac",
+                          "-ar", str(ref.get("sample_rate", 48000)), "-ac", str(ref.get("channels", 2))]
+            self._concat_demuxer(paths, output_path, audio_args)
+        elif strategy == STRATEGY_NORMALIZE:
+            # Re-encode only the short leading clips to match the core, then stream-copy
+            reference = probes[-1]
+            normalized = []
+            for i, (path, probe) in enumerate(zip(paths[:-1], probes[:-1])):
+                target = f"{work_dir}/normalized_{i}.mp4"
+                self._normalize(path, probe, reference, target)
+                normalized.append(target)
+            self._concat_demuxer(normalized + [paths[-1]], output_path, ["-c", "copy"])
+        elif strategy == STRATEGY_REENCODE:
+            self._concat_reencode(paths, probes, output_path)
+        else:
+            raise ValueError(f"Unknown stitch strategy: {strategy}")
+        return strategy
+
+    def probe(self, path: str) -> dict:
+        """
+        Returns the stream parameters that decide whether inputs can be concatenated losslessly.
+        """
+        cmd = ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-of", "json", path]
+        with FFMPEG_SECONDS.labels("probe").time():
+            result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        data = json.loads(result.stdout or b"{}")
+
+        video = next((st for st in data.get("streams", []) if st.get("codec_type") == "video"), None)
+        audio = next((st for st in data.get("streams", []) if st.get("codec_type") == "audio"), None)
+        return {
+            "duration": float(data.get("format", {}).get("duration", 0) or 0),
+            "video": {
+                "codec": video.get("codec_name"),
+                "profile": video.get("profile"),
+                "width": video.get("width"),
+                "height": video.get("height"),
+                "pix_fmt": video.get("pix_fmt"),
+                "fps": video.get("r_frame_rate"),
+                "time_base": video.get("time_base"),
+            } if video else None,
+            "audio": {
+                "codec": audio.get("codec_name"),
+                "sample_rate": int(audio.get("sample_rate", 0) or 0),
+                "channels": audio.get("channels"),
+            } if audio else None,
+        }
+
+    def _run_ffmpeg(self, cmd: List[str], operation: str):
+        with FFMPEG_SECONDS.labels(operation).time(), tracer.start_as_current_span(f"ffmpeg.{operation}"):
+            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def _concat_demuxer(self, paths: List[str], output_path: str, codec_args: List[str]):
+        # -f concat: use concat demuxer, -safe 0: allow unsafe paths
+        list_file = f"{output_path}.txt"
+        with open(list_file, "w") as f:
+            for path in paths:
+                f.write(f"file '{path}'\n")
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file,
+               *codec_args, "-movflags", "+faststart", output_path]
+        self._run_ffmpeg(cmd, "stitch")
+
+    def _normalize(self, path: str, probe: dict, reference: dict, output_path: str):
+        """Re-encodes one clip to the reference clip's video/audio parameters."""
+        ref_v, ref_a = reference["video"], reference["audio"] or {}
+        cmd = ["ffmpeg", "-y", "-i", path]
+        if not probe["audio"]:
+            cmd += ["-f", "lavfi", "-t", str(probe["duration"] or 1),
+                    "-i", f"anullsrc=r={ref_a.get('sample_rate') or 48000}:cl=stereo"]
+        cmd += [
+            "-vf", _fit_filter(ref_v["width"], ref_v["height"], ref_v["fps"]),
+            "-c:v", "libx264", "-preset", STITCH_PRESET, "-crf", STITCH_CRF,
+            "-pix_fmt", ref_v["pix_fmt"] or "yuv420p",
+            "-video_track_timescale", _timescale(ref_v["time_base"]),
+        ]
+        # Match the H.264 profile so the concat demuxer accepts the joined stream
+        profile = H264_PROFILES.get(ref_v.get("profile"))
+        if profile:
+            cmd += ["-profile:v", profile]
+        cmd += [
+            "-c:a", "aac", "-ar", str(ref_a.get("sample_rate") or 48000), "-ac", str(ref_a.get("channels") or 2),
+            "-shortest", output_path,
+        ]
+        self._run_ffmpeg(cmd, "normalize")
+
+    def _concat_reencode(self, paths: List[str], probes: List[dict], output_path: str):
+        """Full re-encode through the concat filter, scaling everything to the last clip's frame."""
+        ref_v = probes[-1]["video"]
+        ref_a = probes[-1]["audio"] or {}
+        sample_rate = ref_a.get("sample_rate") or 48000
+
+        cmd = ["ffmpeg", "-y"]
+        for path in paths:
+            cmd += ["-i", path]
+        # Silent inputs get a generated audio track so the concat filter sees matching streams
+        silent_inputs = {}
+        for i, probe in enumerate(probes):
+            if not probe["audio"]:
+                silent_inputs[i] = len(paths) + len(silent_inputs)
+                cmd += ["-f", "lavfi", "-t", str(probe["duration"] or 1), "-i", f"anullsrc=r={sample_rate}:cl=stereo"]
+
+        fit = _fit_filter(ref_v["width"], ref_v["height"], ref_v["fps"])
+        filters, concat_inputs = [], ""
+        for i in range(len(paths)):
+            audio_src = f"{silent_inputs[i]}:a" if i in silent_inputs else f"{i}:a"
+            filters.append(f"[{i}:v]{fit}[v{i}]")
+            filters.append(f"[{audio_src}]aresample={sample_rate},aformat=channel_layouts=stereo[a{i}]")
+            concat_inputs += f"[v{i}][a{i}]"
+        filters.append(f"{concat_inputs}concat=n={len(paths)}:v=1:a=1[v][a]")
+
+        cmd += [
+            "-filter_complex", ";".join(filters), "-map", "[v]", "-map", "[a]",
+            "-c:v", "libx264", "-preset", STITCH_PRESET, "-crf", STITCH_CRF, "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-movflags", "+faststart", output_path,
+        ]
+        self._run_ffmpeg(cmd, "reencode")
+
     def _download_or_mock(self, url: str, path: str):
         """
         Real impl would use requests.get(url).
@@ -85,7 +445,8 @@ class StitcherService:
                 "-c:a", "aac", 
                 path
             ]
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with FFMPEG_SECONDS.labels("mock_clip").time(), tracer.start_as_current_span("ffmpeg.mock_clip"):
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         else:
             # Real Download Logic
             import requests
@@ -95,13 +456,16 @@ class StitcherService:
                     for chunk in r.iter_content(chunk_size=8192):
                         f.write(chunk)
 
-    def _upload_to_gcs(self, local_path: str, destination_blob_name: str) -> str:
+    def _upload_to_gcs(self, local_path: str, destination_blob_name: str, content_type: Optional[str] = None) -> str:
         if not self.storage_client:
             return f"file://{local_path}"
             
         bucket = self.storage_client.bucket(self.bucket_name)
         blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(local_path)
+        with tracer.start_as_current_span("gcs.upload", attributes={
+            "gcs.object": destination_blob_name, "gcs.bytes": os.path.getsize(local_path)
+        }):
+            blob.upload_from_filename(local_path, content_type=content_type)
         
         # Make public (optional, or use signed URL)
         # blob.make_public()
@@ -1,7 +1,19 @@
 from google.cloud import storage
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import datetime
+import threading
 import os
 
+URL_EXPIRATION = datetime.timedelta(minutes=15)
+# Refresh cached signing credentials this long before they actually expire
+CREDENTIALS_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+# Files at or above this size get a resumable session instead of a single-PUT URL
+RESUMABLE_THRESHOLD = int(os.getenv("RESUMABLE_UPLOAD_THRESHOLD", 32 * 1024 * 1024))
+# Resumable chunks must be a multiple of 256 KiB
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
+BATCH_SIGNING_WORKERS = 8
+
 class StorageService:
     def __init__(self):
         # We assume the environment has GOOGLE_APPLICATION_CREDENTIALS or is running in Cloud Run (Metadata Server)
@@ -11,57 +23,85 @@ class StorageService:
         self.bucket_name = f"{self.project_id}-assets"
         self._client = None
 
+        # Cached IAM signing state (only used when local signing is unavailable)
+        self._local_signing = True
+        self._credentials = None
+        self._sa_email = None
+        self._credentials_lock = threading.Lock()
+
     @property
     def client(self):
         if not self._client:
             self._client = storage.Client(project=self.project_id)
         return self._client
 
-    def generate_upload_url(self, filename: str, content_type: str = "application/pdf") -> dict:
+    def _resolve_sa_email(self, credentials) -> str:
+        # Auto-detect SA email if available, else construct assumption
+        sa_email = getattr(credentials, "service_account_email", None)
+
+        # Prioritize Env Var if detection failed or returned default
+        if not sa_email or sa_email == "default":
+             sa_email = os.getenv("SERVICE_ACCOUNT_EMAIL")
+
+        if not sa_email or sa_email == "default":
+             # Partial Fallback (Legacy/Last Resort)
+             sa_email = f"sa-prod-rag@{self.project_id}.iam.gserviceaccount.com"
+        return sa_email
+
+    def _credentials_expiring(self) -> bool:
+        if not self._credentials or not self._credentials.valid:
+            return True
+        expiry = getattr(self._credentials, "expiry", None)
+        if expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        return datetime.datetime.utcnow() + CREDENTIALS_REFRESH_MARGIN >= expiry
+
+    def _get_signing_credentials(self):
         """
-        Generates a V4 Signed URL for uploading a file directly to GCS.
-        Robustly handles Cloud Run environment (where local private key is missing)
-        by auto-detecting Service Account email to trigger IAM Signing.
+        Returns (credentials, sa_email) for IAM signing.
+        Credentials are loaded once and refreshed only shortly before they expire,
+        so signing no longer costs a token round-trip per upload.
         """
-        bucket = self.client.bucket(self.bucket_name)
-        blob = bucket.blob(f"textbooks/{filename}")
+        with self._credentials_lock:
+            if self._credentials is None:
+                import google.auth
+                self._credentials, _ = google.auth.default()
+
+            if self._credentials_expiring():
+                from google.auth.transport.requests import Request
+                print("🔄 Refreshing signing credentials...")
+                self._credentials.refresh(Request())
+                self._sa_email = self._resolve_sa_email(self._credentials)
+                print(f"🔑 Using Service Account: {self._sa_email}")
+
+            return self._credentials, self._sa_email
+
+    def _sign(self, blob, method: str, content_type: Optional[str] = None, headers: Optional[dict] = None) -> str:
+        kwargs = {
+            "version": "v4",
+            "expiration": URL_EXPIRATION,
+            "method": method,
+            "content_type": content_type,
+            "headers": headers,
+        }
 
+        if self._local_signing:
+            try:
+                # 1. Try standard signing (works locally)
+                return blob.generate_signed_url(**kwargs)
+            except Exception:
+                # Remember the failure so later calls go straight to IAM signing
+                print("⚠️ Local signing failed (No Private Key). Switching to IAM Signing via Service Account...")
+                self._local_signing = False
+
+        # 2. Fallback: Explicitly use Service Account Email (triggers IAM Signing)
+        credentials, sa_email = self._get_signing_credentials()
         try:
-            # 1. Try standard signing (works locally)
-            url = blob.generate_signed_url(
-                version="v4",
-                expiration=datetime.timedelta(minutes=15),
-                method="PUT",
-                content_type=content_type,
-            )
-        except Exception:
-            # 2. Fallback: Explicitly use Service Account Email (triggers IAM Signing)
-            print("⚠️ Local signing failed (No Private Key). Attempting IAM Signing via Service Account...")
-            import google.auth
-            from google.auth.transport.requests import Request
-            credentials, _ = google.auth.default()
-            credentials.refresh(Request())
-            
-            # Auto-detect SA email if available, else construct assumption
-            sa_email = getattr(credentials, "service_account_email", None)
-            
-            # Prioritize Env Var if detection failed or returned default
-            if not sa_email or sa_email == "default":
-                 sa_email = os.getenv("SERVICE_ACCOUNT_EMAIL")
-            
-            if not sa_email or sa_email == "default":
-                 # Partial Fallback (Legacy/Last Resort)
-                 sa_email = f"sa-prod-rag@{self.project_id}.iam.gserviceaccount.com"
-            
-            print(f"🔑 Using Service Account: {sa_email}")
-            
-            url = blob.generate_signed_url(
-                version="v4",
-                expiration=datetime.timedelta(minutes=15),
-                method="PUT",
-                content_type=content_type,
+            return blob.generate_signed_url(
                 service_account_email=sa_email,
-                access_token=credentials.token # Pass token to be safe
+                access_token=credentials.token, # Pass token to be safe
+                **kwargs
             )
         except Exception as e:
             error_msg = str(e)
@@ -70,8 +110,62 @@ class StorageService:
                  print(f"Run: gcloud iam service-accounts add-iam-policy-binding {sa_email} --member='user:YOUR_EMAIL' --role='roles/iam.serviceAccountTokenCreator'")
             raise e
 
-        return {
-            "upload_url": url,
+    def generate_upload_url(self, filename: str, content_type: str = "application/pdf", size: Optional[int] = None, origin: Optional[str] = None) -> dict:
+        """
+        Generates a V4 Signed URL for uploading a file directly to GCS.
+        Robustly handles Cloud Run environment (where local private key is missing)
+        by auto-detecting Service Account email to trigger IAM Signing.
+
+        Large files (size >= RESUMABLE_THRESHOLD) get a resumable upload session URL
+        instead, which the client fills with chunked PUTs using Content-Range.
+        """
+        bucket = self.client.bucket(self.bucket_name)
+        blob = bucket.blob(f"textbooks/{filename}")
+
+        result = {
             "gcs_uri": f"gs://{self.bucket_name}/textbooks/{filename}",
             "filename": filename
         }
+
+        if size is not None and size >= RESUMABLE_THRESHOLD:
+            # The session URL itself authorizes the upload; no signing needed
+            session_url = blob.create_resumable_upload_session(
+                content_type=content_type,
+                size=size,
+                origin=origin,
+            )
+            result.update({
+                "upload_url": session_url,
+                "upload_type": "resumable",
+                "chunk_size": RESUMABLE_CHUNK_SIZE,
+            })
+        else:
+            result.update({
+                "upload_url": self._sign(blob, "PUT", content_type=content_type),
+                "upload_type": "signed_url",
+            })
+
+        return result
+
+    def generate_upload_urls(self, files: List[dict], origin: Optional[str] = None) -> List[dict]:
+        """
+        Batch version of generate_upload_url.
+        Signing credentials are resolved once and URLs are produced concurrently
+        (IAM signing and resumable sessions are network calls).
+        """
+        if not files:
+            return []
+
+        def _one(f: dict) -> dict:
+            return self.generate_upload_url(
+                f["filename"],
+                f.get("content_type") or "application/pdf",
+                size=f.get("size"),
+                origin=origin,
+            )
+
+        # Sign the first one serially so a local-signing failure is detected once
+        first = _one(files[0])
+        with ThreadPoolExecutor(max_workers=BATCH_SIGNING_WORKERS) as pool:
+            rest = list(pool.map(_one, files[1:]))
+        return [first] + rest
@@ -0,0 +1,258 @@
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+# Minimum score for free text to resolve to a topic without the teacher picking one
+TOPIC_MATCH_MIN_SCORE = float(os.getenv("TOPIC_MATCH_MIN_SCORE", 0.45))
+# ...and must beat the runner-up by this much; otherwise the teacher picks from the suggestions
+TOPIC_MATCH_MIN_MARGIN = float(os.getenv("TOPIC_MATCH_MIN_MARGIN", 0.1))
+# A misspelled query word matches a topic word this similar (trigram Dice)
+FUZZY_TERM_SIMILARITY = 0.6
+# Misspellings remembered with their closest index word; least recently used go first
+FUZZY_MEMO_SIZE = int(os.getenv("TOPIC_FUZZY_MEMO_SIZE", 10000))
+CHAPTER_WEIGHT = 0.4 # a word found only in the chapter title counts this much
+SYNONYM_WEIGHT = 0.8
+
+# Classroom phrasing -> textbook vocabulary; extend with TOPIC_SYNONYMS='{"word": ["synonym", ...]}'
+SYNONYMS: Dict[str, List[str]] = {
+    "plants": ["photosynthesis", "botany"],
+    "electricity": ["current", "electric"],
+    "static": ["electrostatics"],
+    "charge": ["electrostatics", "coulomb"],
+    "resistance": ["ohm"],
+    "magnet": ["magnetism", "magnetic"],
+    "light": ["optics", "ray"],
+    "circuit": ["kirchhoff", "current"],
+    "heat": ["thermodynamics", "thermal"],
+}
+SYNONYMS.update(json.loads(os.getenv("TOPIC_SYNONYMS", "{}")))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Request phrasing that says nothing about the topic
+STOP_WORDS = frozenset(
+    "a an the of in on to for and or is are what how why explain teach lesson about me my class "
+    "please video on with"
+    .split()
+)
+
+def normalize_terms(text: str) -> List[str]:
+    """Lowercased topic words; apostrophes and plural 's' dropped (Kirchhoff's Rules -> kirchhoff rule)."""
+    words = _WORD.findall(text.lower().replace("'", "").replace("’", ""))
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+            for w in words if w not in STOP_WORDS]
+
+def _synonym_terms() -> Dict[str, List[str]]:
+    """SYNONYMS in normalized form, so they match index terms."""
+    terms: Dict[str, List[str]] = {}
+    for word, synonyms in SYNONYMS.items():
+        for key in normalize_terms(word):
+            terms.setdefault(key, []).extend(t for s in synonyms for t in normalize_terms(s))
+    return terms
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class _Topic:
+    __slots__ = ("topic_id", "title", "chapter", "book_id", "title_terms", "chapter_terms")
+
+    def __init__(self, topic_id: str, title: str, chapter: str, book_id: Optional[str]):
+        self.topic_id = topic_id
+        self.title = title
+        self.chapter = chapter
+        self.book_id = book_id
+        self.title_terms = set(normalize_terms(title))
+        self.chapter_terms = set(normalize_terms(chapter)) - self.title_terms
+
+class TopicIndex:
+    """
+    In-memory free text -> topic_id index over every ingested book:
+    - inverted index of normalized title/chapter words, weighted by IDF
+    - misspelled words matched to index vocabulary by trigram similarity
+    - classroom synonyms expanded at query time (SYNONYMS)
+    Books are (re)indexed one at a time, so ingesting a book never rebuilds the rest.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics: Dict[str, _Topic] = {}
+        self._books: Dict[Optional[str], Set[str]] = defaultdict(set)
+        # term -> topic_ids, kept apart so scoring needs no per-topic lookups
+        self._title_postings: Dict[str, Set[str]] = defaultdict(set)
+        self._chapter_postings: Dict[str, Set[str]] = defaultdict(set)
+        self._vocab_grams: Dict[str, Set[str]] = defaultdict(set) # trigram -> terms
+        self._synonyms = _synonym_terms()
+        # query word -> (term, similarity); reset on change
+        self._fuzzy: "OrderedDict[str, Optional[tuple]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._topics)
+
+    def __contains__(self, topic_id) -> bool:
+        return topic_id in self._topics
+
+    def add_book(self, book_id: Optional[str], topics: Iterable[dict]):
+        """Replaces a book's topics. Each topic: {"topic_id", "title", "chapter_title"}."""
+        with self._lock:
+            for topic_id in list(self._books.get(book_id, ())):
+                self._remove(topic_id)
+            for t in topics:
+                if t.get("topic_id") and t.get("title"):
+                    self._add(_Topic(t["topic_id"], t["title"], t.get("chapter_title") or "", book_id))
+        print(f"🗂️ Topic index: {book_id} indexed ({len(self._books.get(book_id, ()))} topics, {len(self._topics)} total)")
+
+    def add_hierarchy(self, structure: dict):
+        """Indexes a parsed book structure (DocumentParser.extract_hierarchy output)."""
+        topics = [
+            {"topic_id": t["topic_id"], "title": t["title"], "chapter_title": chapter.get("title", "")}
+            for chapter in structure.get("chapters", []) for t in chapter.get("topics", [])
+        ]
+        self.add_book(structure.get("book_id"), topics)
+
+    def add_catalog(self, rows: Iterable[dict]):
+        """Indexes topics table rows ({"topic_id", "title", "chapter_title", "book_id"}) grouped by book."""
+        by_book: Dict[Optional[str], List[dict]] = defaultdict(list)
+        for row in rows:
+            by_book[row.get("book_id")].append(row)
+        for book_id, topics in by_book.items():
+            self.add_book(book_id, topics)
+
+    def _add(self, topic: _Topic):
+        # Caller holds the lock
+        self._fuzzy.clear()
+        if topic.topic_id in self._topics:
+            self._remove(topic.topic_id)
+        self._topics[topic.topic_id] = topic
+        self._books[topic.book_id].add(topic.topic_id)
+        for postings, terms in ((self._title_postings, topic.title_terms), (self._chapter_postings, topic.chapter_terms)):
+            for term in terms:
+                if not self._df(term):
+                    for gram in trigrams(term):
+                        self._vocab_grams[gram].add(term)
+                postings[term].add(topic.topic_id)
+
+    def _remove(self, topic_id: str):
+        # Caller holds the lock
+        topic = self._topics.pop(topic_id, None)
+        if topic is None:
+            return
+        self._fuzzy.clear()
+        self._books[topic.book_id].discard(topic_id)
+        for postings, terms in ((self._title_postings, topic.title_terms), (self._chapter_postings, topic.chapter_terms)):
+            for term in terms:
+                postings[term].discard(topic_id)
+                if not postings[term]:
+                    del postings[term]
+                if not self._df(term):
+                    for gram in trigrams(term):
+                        self._vocab_grams[gram].discard(term)
+
+    def _df(self, term: str) -> int:
+        # .get: reading a defaultdict must not create empty postings
+        return len(self._title_postings.get(term, ())) + len(self._chapter_postings.get(term, ()))
+
+    def _expand(self, term: str) -> Dict[str, float]:
+        """Index terms a query word stands for, with weights: itself, synonyms, close spellings."""
+        expanded = {}
+        if self._df(term):
+            expanded[term] = 1.0
+        for synonym in self._synonyms.get(term, ()):
+            if self._df(synonym):
+                expanded.setdefault(synonym, SYNONYM_WEIGHT)
+        if not expanded and len(term) > 3:
+            if term in self._fuzzy:
+                self._fuzzy.move_to_end(term)
+            else:
+                self._fuzzy[term] = self._closest_term(term)
+                if len(self._fuzzy) > FUZZY_MEMO_SIZE:
+                    self._fuzzy.popitem(last=False)
+            if self._fuzzy[term]:
+                closest, similarity = self._fuzzy[term]
+                expanded[closest] = similarity
+        return expanded
+
+    def _closest_term(self, term: str) -> Optional[tuple]:
+        """Most similar index word by trigram Dice, if similar enough to be a misspelling."""
+        grams = trigrams(term)
+        shared = Counter(v for g in grams for v in self._vocab_grams.get(g, ()))
+        best, similarity = None, 0.0
+        for candidate, count in shared.items():
+            # trigrams() pads a word to len + 3 characters, i.e. len + 1 trigrams
+            dice = 2 * count / (len(grams) + len(candidate) + 1)
+            if dice > similarity:
+                best, similarity = candidate, dice
+        return (best, round(similarity, 3)) if similarity >= FUZZY_TERM_SIMILARITY else None
+
+    def search(self, text: str, limit: int = 5, book_id: Optional[str] = None) -> List[dict]:
+        """
+        Ranked matches: [{"topic_id", "title", "chapter", "book_id", "score"}], score in 0..1.
+        An exact topic id scores 1.0.
+        """
+        with self._lock:
+            exact = self._topics.get(text.strip())
+            if exact is not None:
+                return [self._match(exact, 1.0)]
+
+            terms = list(dict.fromkeys(normalize_terms(text)))
+            if not terms:
+                return []
+            total = len(self._topics) or 1
+            idf = lambda t: math.log(1 + total / self._df(t))
+
+            scores: Dict[str, float] = defaultdict(float)
+            covered: Dict[str, int] = defaultdict(int) # title words the query (or its synonyms) hit
+            query_weight = 0.0
+            for term in terms:
+                expanded = self._expand(term)
+                # Unknown words still count against coverage, at an average word's weight
+                query_weight += max((idf(t) for t in expanded), default=math.log(2))
+                # A query word counts once per topic, through its best expansion
+                best: Dict[str, float] = {}
+                for index_term, weight in expanded.items():
+                    value = idf(index_term) * weight
+                    for topic_id in self._title_postings.get(index_term, ()):
+                        if value > best.get(topic_id, 0.0):
+                            best[topic_id] = value
+                        covered[topic_id] += 1
+                    value *= CHAPTER_WEIGHT
+                    for topic_id in self._chapter_postings.get(index_term, ()):
+                        if value > best.get(topic_id, 0.0):
+                            best[topic_id] = value
+                for topic_id, value in best.items():
+                    scores[topic_id] += value
+
+            def final(item):
+                topic_id, score = item
+                topic = self._topics[topic_id]
+                # Mostly: how much of the query matched; a little: how much of the title was asked for
+                title_coverage = min(1.0, covered[topic_id] / len(topic.title_terms)) if topic.title_terms else 0.0
+                return 0.8 * min(1.0, score / query_weight) + 0.2 * title_coverage
+
+            candidates = scores.items()
+            if book_id:
+                candidates = [(t, v) for t, v in candidates if self._topics[t].book_id == book_id]
+            top = heapq.nsmallest(limit, ((-final(item), item[0]) for item in candidates))
+            return [self._match(self._topics[topic_id], -negative) for negative, topic_id in top]
+
+    def resolve(self, text: str, book_id: Optional[str] = None) -> Optional[str]:
+        """
+        Best topic_id for free text, or None when nothing scores TOPIC_MATCH_MIN_SCORE
+        or the runner-up is within TOPIC_MATCH_MIN_MARGIN ("explain law": Coulomb's or Ohm's?).
+        """
+        matches = self.search(text, limit=2, book_id=book_id)
+        if not matches or matches[0]["score"] < TOPIC_MATCH_MIN_SCORE:
+            return None
+        if len(matches) > 1 and matches[0]["score"] - matches[1]["score"] < TOPIC_MATCH_MIN_MARGIN:
+            return None
+        return matches[0]["topic_id"]
+
+    @staticmethod
+    def _match(topic: _Topic, score: float) -> dict:
+        return {"topic_id": topic.topic_id, "title": topic.title, "chapter": topic.chapter,
+                "book_id": topic.book_id, "score": round(score, 3)}
+
+topic_index = TopicIndex()
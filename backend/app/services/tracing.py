@@ -0,0 +1,89 @@
+"""
+OpenTelemetry tracing setup.
+TRACE_EXPORTER selects where spans go:
+  - "otlp": OTLP/gRPC collector (requires opentelemetry-exporter-otlp);
+    the default when OTEL_EXPORTER_OTLP_(TRACES_)ENDPOINT is set
+  - "none": tracing disabled (spans are no-ops); the default otherwise
+  - "file": JSON lines in TRACE_FILE for offline debugging, rotated at
+    TRACE_FILE_MAX_BYTES (one previous file kept). Opt-in only: on Cloud Run
+    /tmp is in memory, so local files cost instance RAM.
+  - "console": pretty-printed to stdout
+"""
+
+import os
+import threading
+from typing import Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+)
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "rag-backend")
+OTLP_CONFIGURED = bool(os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "otlp" if OTLP_CONFIGURED else "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "/tmp/rag-traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 50 * 1024 * 1024))
+
+class JsonLinesFileExporter(SpanExporter):
+    """
+    Appends one compact JSON span per line, so traces can be grepped by job id offline.
+    Once the file reaches max_bytes it is moved to <path>.1 (replacing the previous
+    one) and a new file started, so disk use stays under 2 * max_bytes.
+    """
+    def __init__(self, path: str, max_bytes: int = TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        try:
+            with self._lock:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, "a") as f:
+                    for span in spans:
+                        f.write(span.to_json(indent=None) + "\n")
+            return SpanExportResult.SUCCESS
+        except Exception as e:
+            print(f"⚠️ Trace export failed: {e}")
+            return SpanExportResult.FAILURE
+
+    def shutdown(self):
+        pass
+
+def _build_exporter():
+    if TRACE_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if TRACE_EXPORTER == "file":
+        return JsonLinesFileExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            return OTLPSpanExporter()
+        except Exception as e:
+            print(f"⚠️ OTLP exporter unavailable ({e}). Tracing disabled.")
+    elif TRACE_EXPORTER != "none":
+        print(f"⚠️ Unknown TRACE_EXPORTER '{TRACE_EXPORTER}'. Tracing disabled.")
+    return None
+
+def init_tracing():
+    exporter = _build_exporter()
+    if exporter is None:
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+init_tracing()
+
+tracer = trace.get_tracer("app")
+
+def set_span_attributes(attributes: dict):
+    """Adds attributes to the current span (no-op when tracing is disabled)."""
+    span = trace.get_current_span()
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
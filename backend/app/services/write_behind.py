@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from app.services.metrics import WRITE_BEHIND_ROWS, WRITE_BEHIND_PENDING
+
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", 2))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))
+# Failed flushes back off up to this long before retrying
+WRITE_BEHIND_MAX_BACKOFF = 60
+# A row that keeps failing transiently is dropped after this many flushes
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", 5))
+
+class WriteBehindBuffer:
+    """
+    Takes rows off the request path: put() only records the row (the latest
+    row per key wins) and a background thread hands batches to flush_fn
+    every WRITE_BEHIND_FLUSH_SECONDS, or sooner once a batch fills up.
+    When a batch fails its rows are written one at a time, so one bad row
+    can't hold back the rest. Rows failing with a permanent error (per
+    is_permanent, e.g. a constraint violation) are logged and dropped; rows
+    failing otherwise are re-queued (unless a newer row for their key arrived)
+    and retried with backoff, up to max_attempts flushes.
+    Call flush() on shutdown to drain what is left.
+    """
+    def __init__(self, name: str, flush_fn: Callable[[List[dict]], None],
+                 interval: float = WRITE_BEHIND_FLUSH_SECONDS, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 is_permanent: Callable[[Exception], bool] = lambda e: False,
+                 max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.batch_size = batch_size
+        self.is_permanent = is_permanent
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._pending: Dict[Hashable, dict] = {}
+        self._attempts: Dict[Hashable, int] = {} # failed flushes of the pending row per key
+        self._flush_lock = threading.Lock() # one batch in flight, whoever flushes
+        self._thread: Optional[threading.Thread] = None
+        self._backoff = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, key: Hashable, row: dict):
+        with self._cond:
+            self._pending.pop(key, None) # re-insert so dict order stays oldest-first
+            self._pending[key] = row
+            self._attempts.pop(key, None)
+            WRITE_BEHIND_PENDING.labels(buffer=self.name).set(len(self._pending))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=f"write-behind-{self.name}", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> int:
+        """Writes everything pending now. Returns rows written."""
+        written = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return written
+            count, retry = self._write(batch)
+            written += count
+            if retry:
+                return written
+
+    def _take(self) -> Dict[Hashable, dict]:
+        with self._cond:
+            keys = list(self._pending)[:self.batch_size]
+            batch = {key: self._pending.pop(key) for key in keys}
+            WRITE_BEHIND_PENDING.labels(buffer=self.name).set(len(self._pending))
+            return batch
+
+    def _write(self, batch: Dict[Hashable, dict]) -> Tuple[int, bool]:
+        """Returns (rows written, whether rows were re-queued)."""
+        with self._flush_lock:
+            try:
+                self.flush_fn(list(batch.values()))
+                failed = {}
+            except Exception as e:
+                if len(batch) == 1:
+                    failed = {key: e for key in batch}
+                else:
+                    print(f"⚠️ Write-behind {self.name}: batch of {len(batch)} failed ({e}); writing rows one by one")
+                    failed = self._write_rows(batch)
+
+        retried = 0
+        with self._cond:
+            for key in batch:
+                if key not in failed and key not in self._pending:
+                    self._attempts.pop(key, None)
+        for key, error in failed.items():
+            if self._requeue(key, batch[key], error):
+                retried += 1
+        written = len(batch) - len(failed)
+        WRITE_BEHIND_ROWS.labels(buffer=self.name, outcome="written").inc(written)
+        if retried:
+            self._backoff = min(WRITE_BEHIND_MAX_BACKOFF, max(self.interval, self._backoff * 2))
+            WRITE_BEHIND_ROWS.labels(buffer=self.name, outcome="retried").inc(retried)
+            print(f"⚠️ Write-behind {self.name}: {retried} row(s) failed, retrying in {self._backoff:.1f}s")
+        else:
+            self._backoff = 0.0
+        return written, bool(retried)
+
+    def _write_rows(self, batch: Dict[Hashable, dict]) -> Dict[Hashable, Exception]:
+        # Caller holds _flush_lock
+        failed = {}
+        for key, row in batch.items():
+            try:
+                self.flush_fn([row])
+            except Exception as e:
+                failed[key] = e
+        return failed
+
+    def _requeue(self, key: Hashable, row: dict, error: Exception) -> bool:
+        """Puts a failed row back for the next flush, or drops it. Returns True if re-queued."""
+        with self._cond:
+            if key in self._pending:
+                return False # a newer row for the key arrived and supersedes this one
+            attempts = self._attempts.get(key, 0) + 1
+            permanent = self.is_permanent(error)
+            if permanent or attempts >= self.max_attempts:
+                self._attempts.pop(key, None)
+            else:
+                self._attempts[key] = attempts
+                self._pending[key] = row
+                WRITE_BEHIND_PENDING.labels(buffer=self.name).set(len(self._pending))
+                return True
+        reason = "permanent error" if permanent else f"{attempts} failed attempts"
+        WRITE_BEHIND_ROWS.labels(buffer=self.name, outcome="dropped").inc()
+        print(f"❌ Write-behind {self.name}: dropping row {key} after {reason}: {error}")
+        return False
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + (self._backoff or self.interval)
+                while len(self._pending) < self.batch_size or self._backoff:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._pending:
+                    continue
+            self.flush()
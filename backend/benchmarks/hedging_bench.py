@@ -0,0 +1,135 @@
+"""
+Tail-latency benchmark for deadline-bounded, hedged upstream calls.
+
+Runs ChatAgent.chat (retrieval + generation) against the stand-ins with a
+heavy-tailed Discovery Engine and Gemini, once without hedging and once with
+it, and reports p50/p95/p99, hedges sent and deadline misses. A last scenario
+makes retrieval fail outright to show the circuit breaker failing fast.
+
+Usage (from backend/):
+    python -m benchmarks.hedging_bench
+    python -m benchmarks.hedging_bench --requests 1000 --concurrency 16 --profile slow.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+# Every turn has to reach the upstreams; cached answers would hide the tail being measured
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+from benchmarks.standins import StandIns, install
+from benchmarks.load_test import run_concurrently, summarize
+
+# Mostly fast, occasionally very slow: the case hedging is for
+SLOW_TAIL_PROFILE = {
+    "discovery_engine": {"p50": 250, "p99": 4000},
+    "gemini": {"p50": 900, "p99": 9000},
+}
+QUESTIONS = ["What is Coulomb's law?", "Explain electric field lines", "What is Ohm's law?", "Define capacitance"]
+
+def reset_upstreams(hedge: bool):
+    """Fresh latency windows and breakers, with hedging on or off."""
+    from app.agents import MODEL_NAME
+    from app.services import resilience
+
+    resilience._upstreams.clear()
+    for name in ("discovery_engine", f"gemini:{MODEL_NAME}"):
+        resilience._upstreams[name] = resilience.Upstream(name, hedge=hedge)
+
+def upstream_counts():
+    from app.services import resilience
+    return {name: {"hedges": u._hedges, "calls": u._calls, "circuit": u.breaker.state}
+            for name, u in resilience._upstreams.items()}
+
+def scenario(agent, args, hedge: bool, warmup: int):
+    from app.services.resilience import Deadline
+
+    reset_upstreams(hedge)
+    ask = lambda i: agent.chat(QUESTIONS[i % len(QUESTIONS)], deadline=Deadline(args.deadline))
+    # Fill the latency windows so hedges fire at the observed p95, not the initial delay
+    run_concurrently(ask, warmup, args.concurrency)
+    result = summarize(*run_concurrently(ask, args.requests, args.concurrency))
+    result["upstreams"] = upstream_counts()
+    return result
+
+def scenario_degraded(args):
+    """Retrieval always fails: once the breaker opens, calls are refused without waiting."""
+    from app.agents import ChatAgent
+    from app.services.resilience import Deadline, UpstreamUnavailable
+
+    install(StandIns({**SLOW_TAIL_PROFILE, "discovery_engine": {"p50": 500, "p99": 2000, "error_rate": 1.0}},
+                     time_scale=args.time_scale, seed=args.seed))
+    reset_upstreams(hedge=True)
+    agent = ChatAgent()
+    refused = []
+
+    def ask(i):
+        # Time the refusal itself: how fast does a turn fail?
+        try:
+            agent.chat(QUESTIONS[i % len(QUESTIONS)], deadline=Deadline(args.deadline))
+        except UpstreamUnavailable:
+            refused.append(i)
+
+    result = summarize(*run_concurrently(ask, args.requests, args.concurrency))
+    result["errors"] = len(refused)
+    result["error_rate"] = round(len(refused) / result["requests"], 4) if result["requests"] else 0.0
+    result["upstreams"] = upstream_counts()
+    return result
+
+def print_table(results):
+    print(f"\n{'scenario':<14}{'reqs':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  hedges")
+    for name, r in results.items():
+        hedges = ", ".join(f"{u}: {c['hedges']}/{c['calls']} ({c['circuit']})" for u, c in r["upstreams"].items())
+        print(f"{name:<14}{r['requests']:>6}{r['errors']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}  {hedges}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedged/deadline-bounded upstream call benchmark.")
+    parser.add_argument("--profile", help="JSON file overriding the slow-tail latency profile")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="Multiplier applied to every injected delay")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--deadline", type=float, help="Chat deadline in seconds (default: CHAT_DEADLINE_SECONDS scaled)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    profile = dict(SLOW_TAIL_PROFILE)
+    if args.profile:
+        with open(args.profile) as f:
+            profile.update(json.load(f))
+
+    install(StandIns(profile, time_scale=args.time_scale, seed=args.seed))
+    from app.agents import ChatAgent
+    from app.services.resilience import CHAT_DEADLINE_SECONDS
+
+    if args.deadline is None:
+        args.deadline = CHAT_DEADLINE_SECONDS * args.time_scale
+
+    agent = ChatAgent()
+    print(f"🏋️ Chat turns with slow-tail upstreams | requests={args.requests} concurrency={args.concurrency} "
+          f"deadline={args.deadline:.2f}s")
+    start = time.perf_counter()
+    results = {
+        "no_hedging": scenario(agent, args, hedge=False, warmup=args.warmup),
+        "hedged": scenario(agent, args, hedge=True, warmup=args.warmup),
+        "degraded": scenario_degraded(args),
+    }
+    print_table(results)
+
+    before, after = results["no_hedging"], results["hedged"]
+    if before["p99_ms"]:
+        change = after["p99_ms"] / before["p99_ms"] - 1
+        print(f"\n{'📉' if change <= 0 else '📈'} p99 {before['p99_ms']}ms -> {after['p99_ms']}ms "
+              f"({abs(change):.0%} {'lower' if change <= 0 else 'higher'}) in {time.perf_counter() - start:.1f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results, "config": vars(args)}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Job store memory benchmark: pushes a large number of jobs through the normal
+lifecycle (QUEUED -> ... -> COMPLETED) and reports resident jobs, traced
+Python heap and process RSS at intervals. With finished-job eviction the
+numbers should plateau instead of growing with the job count.
+
+Runs without a database (persistence is write-through and off the hot path).
+
+Usage (from backend/):
+    python -m benchmarks.job_store_bench
+    python -m benchmarks.job_store_bench --jobs 1000000 --ttl 1 --every 100000
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models import JobStatus
+from app.services.jobs import JobStore
+
+LIFECYCLE = [JobStatus.RESEARCHING, JobStatus.SCRIPTING, JobStatus.RENDERING, JobStatus.STITCHING, JobStatus.COMPLETED]
+
+def rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JobStore memory under sustained load.")
+    parser.add_argument("--jobs", type=int, default=1_000_000)
+    parser.add_argument("--ttl", type=float, default=1.0, help="Seconds finished jobs stay in memory")
+    parser.add_argument("--max-finished", type=int, default=10000)
+    parser.add_argument("--every", type=int, default=100_000, help="Report interval (jobs)")
+    args = parser.parse_args()
+
+    store = JobStore(db=None, ttl=args.ttl, max_finished=args.max_finished)
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    print(f"{'jobs':>10}{'resident':>10}{'heap MB':>10}{'peak MB':>10}{'max RSS MB':>12}{'jobs/s':>10}")
+    for i in range(1, args.jobs + 1):
+        job_id = str(uuid.uuid4())
+        store.create(job_id, f"teacher-{i % 500}", f"TOPIC_{i % 300}")
+        for status in LIFECYCLE:
+            store.transition(job_id, status, f"Current Step: {status.value}")
+        if i % args.every == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            rate = i / (time.perf_counter() - start)
+            print(f"{i:>10}{len(store):>10}{current / 2**20:>10.1f}{peak / 2**20:>10.1f}{rss_mb():>12.1f}{rate:>10.0f}")
+
+    tracemalloc.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Offline load test for the API and lesson pipeline.
+
+Starts the FastAPI app in-process (uvicorn on a local port) with every external
+dependency replaced by the stand-ins in benchmarks/standins.py, then drives the
+endpoints at a fixed concurrency and reports throughput, p50/p95/p99 and the
+time spent per pipeline stage (scraped from /metrics).
+
+Usage (from backend/):
+    python -m benchmarks.load_test                       # run + compare to baselines
+    python -m benchmarks.load_test --update-baseline     # record new baselines
+    python -m benchmarks.load_test --profile slow.json --concurrency 32 --requests 400
+
+Exits non-zero when a scenario regresses past its stored baseline (latency,
+throughput or error rate), or when there is no baseline for this load shape.
+baselines.json is committed; re-record it with --update-baseline when a change
+is expected to move the numbers.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.standins import StandIns, install
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+TERMINAL = ("COMPLETED", "FAILED")
+# Settings that change what the numbers mean; a baseline only applies to the same ones
+LOAD_SHAPE = ("profile", "time_scale", "concurrency", "requests", "poll_interval", "seed")
+# Failed requests tolerated above the baseline's own error rate
+ERROR_RATE_TOLERANCE = 0.01
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def summarize(latencies, errors, wall_time):
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "error_rate": round(errors / (len(latencies) + errors), 4) if latencies or errors else 0.0,
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+class AppServer:
+    """Runs the app under uvicorn in a daemon thread so BackgroundTasks behave like production."""
+    def __init__(self):
+        import uvicorn
+        from app.main import app
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+def run_concurrently(fn, total, concurrency):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            fn(i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except Exception:
+            with lock:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return latencies, errors, time.perf_counter() - start
+
+# Requests come from this many simulated classrooms, each behind its own address
+CLIENTS = 40
+
+def client_headers(i):
+    """X-Forwarded-For as Cloud Run's front end sets it (the app runs with TRUSTED_PROXY_HOPS=1)."""
+    client = i % CLIENTS
+    return {"X-Forwarded-For": f"10.0.{client // 256}.{client % 256}"}
+
+def configure_admission(time_scale):
+    """Must run before app.main is imported. Stand-ins compress time by time_scale; so do the rate limits."""
+    os.environ.setdefault("TRUSTED_PROXY_HOPS", "1")
+    for name, per_min in (("GENERATE_CLIENT_PER_MIN", 5), ("GENERATE_GLOBAL_PER_MIN", 120),
+                          ("CHAT_CLIENT_PER_MIN", 30), ("CHAT_GLOBAL_PER_MIN", 1200)):
+        os.environ.setdefault(name, str(per_min / time_scale))
+
+TOPICS = ["PHY12_01_01", "PHY12_01_02", "PHY12_01_03", "PHY12_01_04", "PHY12_02_01", "PHY12_02_02"]
+QUESTIONS = ["What is Coulomb's law?", "Explain electric field lines", "explain more", "What is Ohm's law?"]
+
+def scenario_chat(base_url, session, total, concurrency):
+    def call(i):
+        r = session.post(f"{base_url}/api/v1/chat", json={"message": QUESTIONS[i % len(QUESTIONS)]},
+                         headers=client_headers(i), timeout=120)
+        r.raise_for_status()
+    return summarize(*run_concurrently(call, total, concurrency))
+
+def scenario_generate(base_url, session, total, concurrency, poll_interval):
+    """Measures POST /generate latency, end-to-end job latency and /jobs polling latency."""
+    poll_latencies = []
+    poll_lock = threading.Lock()
+    submit_latencies = []
+
+    def call(i):
+        payload = {"topic_id": TOPICS[i % len(TOPICS)], "teacher_name": f"Teacher {i % 7}"}
+        start = time.perf_counter()
+        r = session.post(f"{base_url}/api/v1/generate", json=payload, headers=client_headers(i), timeout=60)
+        r.raise_for_status()
+        with poll_lock:
+            submit_latencies.append(time.perf_counter() - start)
+        job_id = r.json()["job_id"]
+        while True:
+            poll_start = time.perf_counter()
+            status = session.get(f"{base_url}/api/v1/jobs/{job_id}", timeout=60)
+            with poll_lock:
+                poll_latencies.append(time.perf_counter() - poll_start)
+            status.raise_for_status()
+            if status.json()["status"] in TERMINAL:
+                if status.json()["status"] == "FAILED":
+                    raise RuntimeError(status.json().get("message"))
+                return
+            time.sleep(poll_interval)
+
+    latencies, errors, wall = run_concurrently(call, total, concurrency)
+    return {
+        "generate_end_to_end": summarize(latencies, errors, wall),
+        "generate_submit": summarize(submit_latencies, 0, wall),
+        "jobs_poll": summarize(poll_latencies, 0, wall),
+    }
+
+def scrape_stage_times(base_url):
+    """Reads lesson_pipeline_stage_seconds sum/count per stage from /metrics."""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    text = requests.get(f"{base_url}/metrics", timeout=10).text
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(text):
+        if family.name != "lesson_pipeline_stage_seconds":
+            continue
+        for sample in family.samples:
+            stage = sample.labels.get("stage")
+            if sample.name.endswith("_sum"):
+                sums[stage] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[stage] = sample.value
+    return {
+        stage: {"count": int(counts.get(stage, 0)), "mean_ms": round(sums[stage] / counts[stage] * 1000, 1)}
+        for stage in sums if counts.get(stage)
+    }
+
+def compare(results, baselines, tolerance):
+    """Returns a list of human-readable regressions. A scenario without a baseline is one."""
+    regressions = []
+    for name, current in results.items():
+        base = baselines.get(name)
+        if not base:
+            regressions.append(f"{name}: no baseline (run with --update-baseline to record one)")
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms (+{tolerance:.0%})")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']} rps < baseline {base['throughput_rps']} rps (-{tolerance:.0%})")
+        base_rate = base.get("error_rate", 0.0)
+        if current["error_rate"] > base_rate + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{name}: error rate {current['error_rate']:.1%} ({current['errors']}/{current['requests']}) "
+                               f"> baseline {base_rate:.1%}")
+    return regressions
+
+def load_shape(args):
+    return {key: getattr(args, key) for key in LOAD_SHAPE}
+
+def print_table(results, stages):
+    print(f"\n{'scenario':<22}{'reqs':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    if stages:
+        print(f"\n{'pipeline stage':<22}{'count':>8}{'mean ms':>10}")
+        for stage, s in stages.items():
+            print(f"{stage:<22}{s['count']:>8}{s['mean_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline API/pipeline load test.")
+    parser.add_argument("--profile", help="JSON file overriding upstream latency distributions")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="Multiplier applied to every injected delay")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression vs baseline")
+    parser.add_argument("--baseline-file", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    profile = None
+    if args.profile:
+        with open(args.profile) as f:
+            profile = json.load(f)
+
+    configure_admission(args.time_scale)
+    install(StandIns(profile, time_scale=args.time_scale, seed=args.seed))
+
+    with AppServer() as server, requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+        session.mount("http://", adapter)
+
+        print(f"🏋️ Benchmarking {server.base_url} | concurrency={args.concurrency} requests={args.requests}")
+        results = {"chat": scenario_chat(server.base_url, session, args.requests, args.concurrency)}
+        results.update(scenario_generate(server.base_url, session, args.requests, args.concurrency, args.poll_interval))
+        stages = scrape_stage_times(server.base_url)
+
+    print_table(results, stages)
+    report = {"results": results, "stages": stages, "config": vars(args)}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline_file, "w") as f:
+            json.dump({"config": load_shape(args), "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"\n✅ Baselines written to {args.baseline_file}")
+        return
+
+    if not os.path.exists(args.baseline_file):
+        print(f"\n❌ No baseline file at {args.baseline_file}. Record one with --update-baseline.")
+        sys.exit(1)
+    with open(args.baseline_file) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != load_shape(args):
+        print(f"\n❌ Baseline was recorded with {baseline.get('config')}, this run used {load_shape(args)}. "
+              "Rerun with the baseline's settings, or pass --baseline-file/--update-baseline.")
+        sys.exit(1)
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+    if regressions:
+        print("\n❌ Regressions:")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    print("\n✅ No regressions against baselines.")
+
+if __name__ == "__main__":
+    main()
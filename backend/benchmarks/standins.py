@@ -0,0 +1,306 @@
+"""
+Local stand-ins for the platform's external dependencies, used by the offline benchmarks.
+
+Each upstream gets a latency distribution described by its p50 and p99 in
+milliseconds (sampled as a log-normal), plus an optional error rate:
+
+    {"gemini": {"p50": 900, "p99": 4000, "error_rate": 0.0}, ...}
+
+install() must run BEFORE app.main is imported, because main.py builds its
+service singletons at import time.
+"""
+
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+from types import SimpleNamespace
+
+DEFAULT_PROFILE = {
+    "gemini": {"p50": 900, "p99": 4000},
+    "gemini_fast": {"p50": 300, "p99": 1200},
+    "discovery_engine": {"p50": 250, "p99": 1500},
+    "heygen": {"p50": 400, "p99": 1500},
+    "gcs": {"p50": 80, "p99": 400},
+    "postgres": {"p50": 2, "p99": 25},
+    "ffmpeg": {"p50": 1500, "p99": 4000},
+    "ffprobe": {"p50": 30, "p99": 80},
+}
+
+Z_99 = 2.326
+
+class Latency:
+    """Samples sleep times for one upstream. time_scale shrinks every delay uniformly."""
+    def __init__(self, spec: dict, time_scale: float, rng: random.Random):
+        p50 = max(spec.get("p50", 1), 0.001)
+        p99 = max(spec.get("p99", p50), p50)
+        self.mu = math.log(p50)
+        self.sigma = (math.log(p99) - self.mu) / Z_99
+        self.error_rate = spec.get("error_rate", 0.0)
+        self.time_scale = time_scale
+        self.rng = rng
+        self._lock = threading.Lock()
+
+    def wait(self, name: str):
+        with self._lock:
+            delay_ms = self.rng.lognormvariate(self.mu, self.sigma)
+            failed = self.rng.random() < self.error_rate
+        time.sleep(delay_ms * self.time_scale / 1000.0)
+        if failed:
+            raise RuntimeError(f"Injected {name} failure")
+
+class StandIns:
+    def __init__(self, profile: dict = None, time_scale: float = 0.05, seed: int = 42):
+        rng = random.Random(seed)
+        merged = {**DEFAULT_PROFILE, **(profile or {})}
+        self.latency = {name: Latency(spec, time_scale, rng) for name, spec in merged.items()}
+
+    def wait(self, name: str):
+        self.latency[name].wait(name)
+
+# --- Gemini -----------------------------------------------------------------
+
+class FakeGenerativeModel:
+    standins: StandIns = None
+
+    def __init__(self, model_name, system_instruction=""):
+        self.model_name = model_name
+        self.fast = "flash" in model_name
+        self.validator = "Quality Control" in system_instruction
+
+    def generate_content(self, prompt, **kwargs):
+        self.standins.wait("gemini_fast" if self.fast else "gemini")
+        if self.validator:
+            # Approve everything so renders aren't cancelled and retried
+            return SimpleNamespace(text="APPROVED\nCONFIDENCE: 92")
+        return SimpleNamespace(text=f"[{self.model_name}] Generated content for: {prompt[:200]}")
+
+# --- Discovery Engine -------------------------------------------------------
+
+class FakeSearchServiceClient:
+    standins: StandIns = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def serving_config_path(self, project, location, data_store, serving_config):
+        return f"projects/{project}/locations/{location}/dataStores/{data_store}/servingConfigs/{serving_config}"
+
+    def branch_path(self, project, location, data_store, branch):
+        return f"projects/{project}/locations/{location}/dataStores/{data_store}/branches/{branch}"
+
+    def search(self, request, **kwargs):
+        self.standins.wait("discovery_engine")
+        snippet = {"snippet": f"Textbook passage about {request.query}."}
+        result = SimpleNamespace(document=SimpleNamespace(derived_struct_data={"snippets": [snippet]}))
+        return SimpleNamespace(
+            summary=SimpleNamespace(summary_text=f"Summary of {request.query}"),
+            results=[result] * 3,
+        )
+
+    def import_documents(self, request, **kwargs):
+        self.standins.wait("discovery_engine")
+        return SimpleNamespace(operation=SimpleNamespace(name=f"operations/import-{time.time_ns()}"))
+
+# --- GCS --------------------------------------------------------------------
+
+class FakeBlob:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upload_from_filename(self, filename, **kwargs):
+        self.client.standins.wait("gcs")
+
+    def upload_from_string(self, data, **kwargs):
+        self.client.standins.wait("gcs")
+
+    def generate_signed_url(self, **kwargs):
+        return f"https://storage.googleapis.com/bench/{self.name}?X-Goog-Signature=bench"
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def blob(self, name):
+        return FakeBlob(self.client, name)
+
+class FakeStorageClient:
+    standins: StandIns = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def bucket(self, name):
+        return FakeBucket(self, name)
+
+# --- HeyGen -----------------------------------------------------------------
+
+def install_heygen(standins: StandIns):
+    from app.services.heygen import HeyGenClient
+
+    def generate_video(self, script_text, avatar_id="default_avatar_id", voice_id="default_voice_id", **kwargs):
+        standins.wait("heygen")
+        return {"data": {"video_id": f"bench-{time.time_ns()}"}}
+
+    def get_status(self, video_id):
+        standins.wait("heygen")
+        return "completed"
+
+    def get_video_url(self, video_id):
+        standins.wait("heygen")
+        return f"https://mock.com/{video_id}.mp4"
+
+    def cancel_video(self, video_id):
+        standins.wait("heygen")
+
+    HeyGenClient.generate_video = generate_video
+    HeyGenClient.get_status = get_status
+    HeyGenClient.get_video_url = get_video_url
+    HeyGenClient.cancel_video = cancel_video
+
+# --- ffmpeg -----------------------------------------------------------------
+
+# Every fake clip reports identical H.264/AAC streams, so the stitcher takes the copy path
+FAKE_PROBE = json.dumps({
+    "format": {"duration": "15.0"},
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "profile": "High", "width": 1920, "height": 1080,
+         "pix_fmt": "yuv420p", "r_frame_rate": "25/1", "time_base": "1/12800"},
+        {"codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2},
+    ],
+}).encode()
+
+def install_downloads(standins: StandIns):
+    """Clip downloads (library URLs, HeyGen results) read from GCS; nothing leaves the machine."""
+    from app.services.stitcher import StitcherService
+
+    def download(self, url, path):
+        standins.wait("gcs")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        open(path, "ab").close()
+
+    StitcherService._download_or_mock = download
+
+def make_fake_subprocess_run(standins: StandIns):
+    def fake_run(cmd, *args, **kwargs):
+        if cmd and cmd[0] in ("ffmpeg", "ffprobe"):
+            standins.wait(cmd[0])
+            if cmd[0] == "ffprobe":
+                return subprocess.CompletedProcess(cmd, 0, stdout=FAKE_PROBE, stderr=b"")
+            output = cmd[-1]
+            if isinstance(output, str) and not output.startswith("-"):
+                os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+                open(output, "ab").close()
+            return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+        return subprocess.run(cmd, *args, **kwargs)
+    return fake_run
+
+# --- Postgres ---------------------------------------------------------------
+
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS chapters (
+        chapter_id VARCHAR(50) PRIMARY KEY, book_id VARCHAR(50), chapter_number INTEGER, title VARCHAR(255))""",
+    """CREATE TABLE IF NOT EXISTS topics (
+        topic_id VARCHAR(50) PRIMARY KEY, chapter_id VARCHAR(50), title VARCHAR(255),
+        page_start INTEGER, page_end INTEGER, content_hash VARCHAR(100))""",
+    """CREATE TABLE IF NOT EXISTS visual_assets (
+        asset_id INTEGER PRIMARY KEY AUTOINCREMENT, book_id VARCHAR(50), topic_id VARCHAR(50), image_url TEXT NOT NULL,
+        description TEXT, original_page_number INTEGER, phash VARCHAR(16), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (book_id, phash))""",
+    """CREATE TABLE IF NOT EXISTS video_library (
+        video_id INTEGER PRIMARY KEY AUTOINCREMENT, topic_id VARCHAR(50), language VARCHAR(20) DEFAULT 'English',
+        video_url TEXT NOT NULL, transcript TEXT, script_version VARCHAR(16), confidence_score FLOAT,
+        status VARCHAR(50) DEFAULT 'processed', created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (topic_id, language))""",
+    """CREATE TABLE IF NOT EXISTS render_segments (
+        segment_key VARCHAR(40) PRIMARY KEY, video_url TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS lesson_scripts (
+        topic_id VARCHAR(50), language VARCHAR(20) NOT NULL, script_version VARCHAR(16) NOT NULL,
+        script TEXT NOT NULL, fact_brief TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (topic_id, language, script_version))""",
+    """CREATE TABLE IF NOT EXISTS teacher_jobs (
+        job_id VARCHAR(36) PRIMARY KEY, teacher_id VARCHAR(255) NOT NULL, topic_query VARCHAR(255),
+        matched_topic_id VARCHAR(50), batch_id VARCHAR(36), status VARCHAR(50) DEFAULT 'queued',
+        current_step VARCHAR(100), message TEXT, result_url TEXT, stage_durations TEXT, result_video_id INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS chat_sessions (
+        session_id VARCHAR(64) PRIMARY KEY, summary TEXT, recent_turns TEXT, turn_count INTEGER DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS ingestion_files (
+        gcs_uri VARCHAR(1024) PRIMARY KEY, status VARCHAR(20) NOT NULL, operation VARCHAR(255), error TEXT,
+        submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+]
+
+def make_sqlite_engine_factory(standins: StandIns):
+    """
+    Replaces the pg8000 engine with a throwaway SQLite database that runs the
+    same SQL, with Postgres-like latency injected before every statement.
+    A WAL-mode file gives each pooled connection its own transaction, as
+    Postgres does; one connection shared across threads interleaves commits.
+    """
+    import tempfile
+    from sqlalchemy import create_engine, event, text
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "bench.sqlite")
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=32, max_overflow=32,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure(dbapi_conn, record):
+        dbapi_conn.execute("PRAGMA journal_mode=WAL")
+        dbapi_conn.execute("PRAGMA synchronous=OFF")
+
+    with engine.begin() as conn:
+        for ddl in SQLITE_SCHEMA:
+            conn.execute(text(ddl))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _inject_latency(conn, cursor, statement, parameters, context, executemany):
+        standins.wait("postgres")
+
+    def factory(*args, **kwargs):
+        return engine
+    return factory
+
+# --- Wiring -----------------------------------------------------------------
+
+def install(standins: StandIns):
+    """Patches every external dependency. Call before importing app.main."""
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "bench-project")
+    os.environ.setdefault("DB_HOST", "bench")
+    os.environ.setdefault("TRACE_EXPORTER", "none")
+    # The Vertex embedder would try (and slowly fail) to find credentials on the first chat
+    os.environ.setdefault("ANSWER_CACHE_EMBEDDER", "hashing")
+
+    FakeGenerativeModel.standins = standins
+    FakeSearchServiceClient.standins = standins
+    FakeStorageClient.standins = standins
+
+    import google.cloud.storage as gcs
+    gcs.Client = FakeStorageClient
+
+    import app.agents as agents
+    agents.GenerativeModel = FakeGenerativeModel
+
+    import app.services.rag as rag
+    rag.discoveryengine.SearchServiceClient = FakeSearchServiceClient
+
+    import app.services.db as db
+    db.create_engine = make_sqlite_engine_factory(standins)
+
+    import app.services.stitcher as stitcher
+    stitcher.subprocess = SimpleNamespace(
+        run=make_fake_subprocess_run(standins),
+        PIPE=subprocess.PIPE, DEVNULL=subprocess.DEVNULL,
+        CalledProcessError=subprocess.CalledProcessError,
+    )
+
+    install_heygen(standins)
+    install_downloads(standins)
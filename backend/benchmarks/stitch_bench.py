@@ -0,0 +1,112 @@
+"""
+Stitcher benchmark: runs every applicable concat strategy on synthetic clips
+and reports wall time, CPU time (ffmpeg children) and output size.
+
+Needs ffmpeg/ffprobe on PATH. Clips are generated once into --work-dir.
+
+Usage (from backend/):
+    python -m benchmarks.stitch_bench
+    python -m benchmarks.stitch_bench --lengths 30 120 300 --output stitch.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.stitcher import (
+    StitcherService, choose_strategy, STRATEGY_COPY, STRATEGY_AUDIO, STRATEGY_NORMALIZE, STRATEGY_REENCODE
+)
+
+INTRO_SECONDS = 15
+
+# name -> (width, height, sample_rate, channels)
+CORE_FORMAT = (1920, 1080, 48000, 2)
+INTRO_FORMATS = {
+    "matched": CORE_FORMAT,                  # HeyGen intro at the core's settings
+    "audio_mismatch": (1920, 1080, 44100, 1),
+    "resolution_mismatch": (1280, 720, 44100, 2), # The old mock intro
+}
+
+# Strategies that produce a correct file for each intro format
+VALID_STRATEGIES = {
+    "matched": [STRATEGY_COPY, STRATEGY_AUDIO, STRATEGY_NORMALIZE, STRATEGY_REENCODE],
+    "audio_mismatch": [STRATEGY_AUDIO, STRATEGY_NORMALIZE, STRATEGY_REENCODE],
+    "resolution_mismatch": [STRATEGY_NORMALIZE, STRATEGY_REENCODE],
+}
+
+def make_clip(path, seconds, fmt):
+    if os.path.exists(path):
+        return path
+    width, height, sample_rate, channels = fmt
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=s={width}x{height}:r=25:d={seconds}",
+        "-f", "lavfi", "-i", f"sine=f=440:r={sample_rate}:d={seconds}",
+        "-ac", str(channels),
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-video_track_timescale", "12800",
+        "-c:a", "aac", "-shortest", path,
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return path
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def run_case(stitcher, intro, core, output, strategy):
+    if os.path.exists(output):
+        os.remove(output)
+    cpu_start, wall_start = children_cpu_seconds(), time.perf_counter()
+    used = stitcher.stitch_files([intro, core], output, strategy=strategy)
+    wall = time.perf_counter() - wall_start
+    cpu = children_cpu_seconds() - cpu_start
+    return {
+        "strategy": used,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "output_mb": round(os.path.getsize(output) / (1024 * 1024), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stitch strategies.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[30, 120, 300], help="Core clip lengths (s)")
+    parser.add_argument("--work-dir", default="/tmp/stitch-bench")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    stitcher = StitcherService()
+    results = []
+
+    print("🎬 Generating synthetic clips (cached between runs)...")
+    intros = {
+        name: make_clip(f"{args.work_dir}/intro_{name}.mp4", INTRO_SECONDS, fmt)
+        for name, fmt in INTRO_FORMATS.items()
+    }
+    cores = {length: make_clip(f"{args.work_dir}/core_{length}s.mp4", length, CORE_FORMAT) for length in args.lengths}
+
+    print(f"\n{'intro':<22}{'core s':>7}  {'strategy':<10}{'auto':>6}{'wall s':>9}{'cpu s':>9}{'out MB':>9}")
+    for intro_name, intro_path in intros.items():
+        for length, core_path in cores.items():
+            auto = choose_strategy([stitcher.probe(intro_path), stitcher.probe(core_path)])
+            for strategy in VALID_STRATEGIES[intro_name]:
+                output = f"{args.work_dir}/out_{intro_name}_{length}_{strategy}.mp4"
+                row = run_case(stitcher, intro_path, core_path, output, strategy)
+                row.update({"intro": intro_name, "core_seconds": length, "auto": strategy == auto})
+                results.append(row)
+                print(f"{intro_name:<22}{length:>7}  {strategy:<10}{'✓' if row['auto'] else '':>6}"
+                      f"{row['wall_s']:>9}{row['cpu_s']:>9}{row['output_mb']:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+# Tests import the app the same way the server runs it, from backend/
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# Service singletons read these at import time; tests never talk to real Google Cloud
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test-project")
+os.environ.setdefault("TRACE_EXPORTER", "none")
+
+import pytest
+
+@pytest.fixture(scope="session")
+def app_module():
+    """app.main wired to the offline stand-ins (SQLite, fake Gemini/GCS/HeyGen/ffmpeg)."""
+    from benchmarks.standins import StandIns, install
+    install(StandIns(time_scale=0.01))
+    import app.main
+    return app.main
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as test_client:
+        yield test_client
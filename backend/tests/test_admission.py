@@ -0,0 +1,65 @@
+from app.services import admission
+from app.services.admission import AdmissionController, client_identity
+
+def test_identity_ignores_forwarded_header_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXY_HOPS", 0)
+    assert client_identity({"x-forwarded-for": "1.2.3.4"}, "10.0.0.1") == "ip:10.0.0.1"
+
+def test_identity_takes_address_appended_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXY_HOPS", 1)
+    # The client forged the first entry; the proxy appended the real address
+    assert client_identity({"x-forwarded-for": "6.6.6.6, 203.0.113.7"}, "169.254.1.1") == "ip:203.0.113.7"
+    assert client_identity({}, "169.254.1.1") == "ip:169.254.1.1"
+
+def test_identity_prefers_configured_auth_header(monkeypatch):
+    monkeypatch.setattr(admission, "IDENTITY_HEADER", "X-Goog-Authenticated-User-Email")
+    headers = {"x-goog-authenticated-user-email": "accounts.google.com:t@school.edu", "x-forwarded-for": "1.1.1.1"}
+    assert client_identity(headers, "10.0.0.1") == "user:accounts.google.com:t@school.edu"
+
+def test_clients_get_separate_buckets(monkeypatch):
+    monkeypatch.setattr(admission, "CHAT_CLIENT_LIMIT", (60.0, 3))
+    controller = AdmissionController(redis_url="")
+    assert all(controller.admit_chat("ip:1.1.1.1").allowed for _ in range(3))
+    refused = controller.admit_chat("ip:1.1.1.1")
+    assert not refused.allowed and refused.retry_after >= 1
+    assert controller.admit_chat("ip:2.2.2.2").allowed
+
+def test_queue_depth_sheds_generate():
+    controller = AdmissionController(redis_url="", max_queue_depth=2)
+    assert controller.admit_generate("a", "ip:1").allowed
+    assert controller.admit_generate("b", "ip:2").allowed
+    assert not controller.admit_generate("c", "ip:3").allowed
+    controller.job_finished("a")
+    assert controller.admit_generate("c", "ip:3").allowed
+
+def test_batch_larger_than_the_queue_is_refused_for_good():
+    controller = AdmissionController(redis_url="", max_queue_depth=3)
+    decision = controller.admit_batch(["a", "b", "c", "d"], "ip:1")
+    assert not decision.allowed and decision.permanent
+    assert controller.admit_batch(["a", "b", "c"], "ip:1").allowed
+
+def test_batch_endpoint_caps_size_at_queue_depth(app_module, client):
+    topics = [f"PHY12_01_{i:02d}" for i in range(app_module.admission.max_queue_depth + 1)]
+    assert len(topics) <= app_module.MAX_BATCH_SIZE
+    response = client.post("/api/v1/generate-batch", json={"topic_ids": topics})
+    assert response.status_code == 400 and str(app_module.admission.max_queue_depth) in response.json()["detail"]
+
+def test_batch_pays_one_token_per_lesson(monkeypatch):
+    monkeypatch.setattr(admission, "GENERATE_CLIENT_LIMIT", (60.0, 5))
+    controller = AdmissionController(redis_url="")
+    too_big = controller.admit_batch([f"j{i}" for i in range(6)], "ip:1")
+    assert not too_big.allowed and too_big.permanent
+    assert controller.admit_batch([f"k{i}" for i in range(4)], "ip:1").allowed
+    # One token left: a second batch of two must wait
+    assert not controller.admit_batch(["x", "y"], "ip:1").allowed
+
+def test_global_refusal_refunds_the_client_bucket(monkeypatch):
+    monkeypatch.setattr(admission, "GENERATE_CLIENT_LIMIT", (60.0, 3))
+    monkeypatch.setattr(admission, "GENERATE_GLOBAL_LIMIT", (0.001, 3))
+    controller = AdmissionController(redis_url="")
+    assert controller.admit_batch(["a", "b", "c"], "ip:1").allowed
+    # Global bucket is empty: ip:2 is refused but keeps its own tokens
+    assert not controller.admit_generate("d", "ip:2").allowed
+    monkeypatch.setattr(admission, "GENERATE_GLOBAL_LIMIT", (60.0, 3))
+    controller.store._buckets.pop("generate:global")
+    assert controller.admit_batch(["e", "f", "g"], "ip:2").allowed
@@ -0,0 +1,44 @@
+from app.models import TopicScope
+from app.services.answer_cache import HashingEmbedder, SemanticAnswerCache
+
+def _cache():
+    return SemanticAnswerCache(embedder=HashingEmbedder(), threshold=0.85, scope_size=4, max_scopes=2)
+
+def _store(cache, query, answer, scope=None):
+    cache.put(scope, cache.lookup(query, scope), answer)
+
+def test_rewording_in_the_same_scope_hits():
+    cache = _cache()
+    physics = TopicScope(topic_id="PHY12_01_02")
+    _store(cache, "What is Coulomb's law?", "F = kq1q2/r^2", physics)
+
+    assert cache.lookup("what's coulombs law", physics)["answer"] == "F = kq1q2/r^2"
+    assert cache.lookup("What is Coulomb's law?", TopicScope(topic_id="PHY12_01_03"))["answer"] is None
+
+def test_answers_generated_across_a_clear_are_not_stored():
+    cache = _cache()
+    lookup = cache.lookup("What is Ohm's law?")
+    cache.clear()
+    cache.put(None, lookup, "V = IR")
+    assert cache.lookup("What is Ohm's law?")["answer"] is None
+
+def test_least_recently_written_scope_is_evicted():
+    cache = _cache()
+    for topic in ("A", "B", "C"):
+        _store(cache, "Define capacitance", f"answer {topic}", TopicScope(topic_id=topic))
+    assert cache.lookup("Define capacitance", TopicScope(topic_id="A"))["answer"] is None
+    assert cache.lookup("Define capacitance", TopicScope(topic_id="C"))["answer"] == "answer C"
+
+def test_follow_ups_bypass_the_cache(app_module, monkeypatch):
+    from app import agents
+
+    agent = agents.ChatAgent()
+    seen = []
+    monkeypatch.setattr(agents.answer_cache, "lookup", lambda query, scope=None: seen.append(query) or
+                        {"answer": "an answer from someone else's conversation", "similarity": 1.0, "vector": None, "epoch": 0})
+
+    history = [{"role": "user", "content": "What is Coulomb's law?"}, {"role": "model", "content": "..."}]
+    assert agent.chat("why?", history=history) != "an answer from someone else's conversation"
+    assert agent.chat("why?", summary="We discussed Coulomb's law") != "an answer from someone else's conversation"
+    assert seen == []
+    assert agent.chat("What is Coulomb's law?") == "an answer from someone else's conversation"
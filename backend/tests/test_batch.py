@@ -0,0 +1,39 @@
+import threading
+import time
+import uuid
+from app.models import GenerateLessonRequest, JobStatus
+
+def test_batch_fans_out_one_pipeline_slot_per_item(app_module, monkeypatch):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def slow(*_):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    def produce(job_ids, topic_id, *_):
+        slow()
+        return {"video_url": f"core://{topic_id}"}
+
+    monkeypatch.setattr(app_module, "_lookup_core_lesson", lambda topic_id, *_: None if topic_id == "miss" else {"video_url": "core://hit"})
+    monkeypatch.setattr(app_module, "_write_intros_batch", lambda requests, _: {r.topic_id: "intro" for r in requests})
+    monkeypatch.setattr(app_module, "_produce_core_lesson", produce)
+    monkeypatch.setattr(app_module, "_assemble_lesson",
+                        lambda job_id, *_: (slow(), app_module.set_job_status(job_id, JobStatus.COMPLETED)))
+    slots = threading.BoundedSemaphore(2)
+    monkeypatch.setattr(app_module, "pipeline_slots", slots)
+
+    items = [(f"batch-{uuid.uuid4()}", GenerateLessonRequest(topic_id=topic, teacher_id="t"))
+             for topic in ["hit", "hit", "hit", "miss", "miss"]]
+    for job_id, request in items:
+        app_module.job_store.create(job_id, "t", request.topic_id)
+    app_module.process_lesson_batch("batch-test", items)
+
+    # Several items ran at once, never more than the slots allow
+    assert peak[0] == 2
+    assert all(app_module.job_store.get(job_id).status == JobStatus.COMPLETED for job_id, _ in items)
+    assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
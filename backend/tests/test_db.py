@@ -0,0 +1,24 @@
+from app.services.db import BoundedCache
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = BoundedCache(max_entries=2)
+    cache[("core_lesson", "A", "English")] = {"video_url": "a"}
+    cache[("core_lesson", "B", "English")] = {"video_url": "b"}
+    assert cache.get(("core_lesson", "A", "English")) == {"video_url": "a"}
+    cache[("segment", "k")] = "c"
+
+    assert len(cache) == 2
+    assert ("core_lesson", "B", "English") not in cache
+    assert cache.get(("core_lesson", "B", "English")) is None
+    assert ("core_lesson", "A", "English") in cache and cache.get(("segment", "k")) == "c"
+
+def test_database_service_memory_cache_is_bounded(app_module):
+    assert isinstance(app_module.db_service.memory_cache, BoundedCache)
+
+def test_re_extraction_reports_only_new_visual_assets(app_module):
+    rows = [{"book_id": "DB_TEST", "topic_id": None, "image_url": f"https://img/{i}.png", "description": None,
+             "page": i, "phash": f"{i:016x}"} for i in range(3)]
+    db = app_module.db_service
+    assert db.insert_visual_assets(rows) == 3
+    new = {**rows[0], "phash": "f" * 16}
+    assert db.insert_visual_assets(rows + [new]) == 1
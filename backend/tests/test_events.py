@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+from app.models import JobStatus
+from app.services.events import JobEventBus
+
+def test_publish_only_wakes_subscribers_of_its_streams():
+    bus = JobEventBus()
+
+    async def scenario():
+        other = bus.subscribe("job:b", heartbeat=60)
+        pending = asyncio.ensure_future(other.__anext__())
+        await asyncio.sleep(0.01)
+        (_, wakeup), = bus._waiters["job:b"]
+        bus.publish(["job:a", "teacher:t"], {"status": "RENDERING"})
+        await asyncio.sleep(0.01)
+        woken = wakeup.is_set()
+        pending.cancel()
+        return woken
+
+    assert asyncio.run(scenario()) is False
+
+def test_event_ids_are_increasing_wall_clock_micros():
+    bus = JobEventBus()
+    before = time.time_ns() // 1000
+    ids = [bus.publish(["job:a"], {"n": i}) for i in range(100)]
+    assert ids == sorted(set(ids))
+    assert ids[0] >= before
+    assert [eid for eid, _ in bus.replay("job:a", ids[49])] == ids[50:]
+
+def _create_job(app_module, status=JobStatus.COMPLETED):
+    job_id = f"test-{time.time_ns()}"
+    app_module.job_store.create(job_id, "teacher-x", "PHY12_01_01")
+    app_module.job_store.transition(job_id, status, "done" if status == JobStatus.COMPLETED else None)
+    return job_id
+
+def _forget_locally(app_module, job_id):
+    """As if the job ran on another instance (or this one restarted): only the DB knows it."""
+    with app_module.job_store._lock:
+        del app_module.job_store._jobs[job_id]
+    with app_module.job_events._lock:
+        app_module.job_events._streams.pop(f"job:{job_id}", None)
+
+def test_stream_of_finished_job_sends_snapshot_and_closes(app_module, client):
+    job_id = _create_job(app_module)
+    _forget_locally(app_module, job_id)
+
+    with client.stream("GET", f"/api/v1/jobs/{job_id}/events") as response:
+        body = "".join(response.iter_text())
+    assert '"status": "COMPLETED"' in body
+    assert body.count("event: status") == 1
+
+def test_stream_follows_job_running_elsewhere(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "JOB_STREAM_POLL_SECONDS", 0.1)
+    job_id = _create_job(app_module, JobStatus.RENDERING)
+    _forget_locally(app_module, job_id)
+
+    def finish_elsewhere():
+        time.sleep(0.3)
+        record = app_module.job_store.get(job_id) # loaded from the DB
+        record.status, record.result, record.updated_at = JobStatus.COMPLETED, "https://example/lesson.mp4", time.time()
+        app_module.db_service.save_job(record)
+
+    threading.Thread(target=finish_elsewhere).start()
+    with client.stream("GET", f"/api/v1/jobs/{job_id}/events") as response:
+        body = "".join(response.iter_text())
+    assert '"status": "RENDERING"' in body
+    assert '"status": "COMPLETED"' in body
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "scripts"))
+from extract_diagrams import extract_all
+from upload_textbooks import collect_files
+
+class _Extractor:
+    def __init__(self):
+        self.calls = []
+
+    def extract(self, path, book_id):
+        self.calls.append((path, book_id))
+        return {"book_id": book_id, "pages": 1}
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+
+def test_each_collected_pdf_is_extracted_under_its_relative_name(tmp_path):
+    _touch(tmp_path / "class11" / "physics.pdf")
+    _touch(tmp_path / "class12" / "physics.pdf")
+    extractor = _Extractor()
+
+    results = extract_all(collect_files([str(tmp_path)]), extractor)
+
+    assert [book_id for _, book_id in extractor.calls] == ["class11_physics", "class12_physics"]
+    assert all(os.path.isfile(path) for path, _ in extractor.calls)
+    assert [r["book_id"] for r in results] == ["class11_physics", "class12_physics"]
+
+def test_explicit_book_id_applies_to_a_single_pdf(tmp_path):
+    _touch(tmp_path / "physics.pdf")
+    extractor = _Extractor()
+    extract_all(collect_files([str(tmp_path / "physics.pdf")]), extractor, book_id="TN_SCERT_PHY_12")
+    assert extractor.calls == [(str(tmp_path / "physics.pdf"), "TN_SCERT_PHY_12")]
@@ -0,0 +1,55 @@
+import time
+from types import SimpleNamespace
+from app.services.ingestion import IngestionCoordinator, INDEXED
+
+class _Operation:
+    def __init__(self, name):
+        self.operation = SimpleNamespace(name=name)
+
+    def result(self, timeout=None):
+        return SimpleNamespace(error_samples=[])
+
+class _Rag:
+    def start_import(self, uris):
+        return _Operation(f"op-{len(uris)}")
+
+class _Store:
+    def __init__(self):
+        self.rows = {}
+
+    def save_ingestion_files(self, records):
+        self.rows.update((r["gcs_uri"], dict(r)) for r in records)
+
+    def load_ingestion_file(self, gcs_uri):
+        return self.rows.get(gcs_uri)
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+def test_finished_files_are_forgotten_but_still_queryable():
+    store = _Store()
+    coordinator = IngestionCoordinator(_Rag, window=0.01, store=store, retention=0)
+    coordinator.submit("gs://books/a.pdf")
+    coordinator.submit("gs://books/b.pdf")
+
+    _wait_for(lambda: all(r["status"] == INDEXED for r in store.rows.values()) and len(store.rows) == 2)
+    _wait_for(lambda: not coordinator.snapshot()["files"])
+    assert coordinator.snapshot()["operations"] == []
+    status = coordinator.status("gs://books/a.pdf")
+    assert status["status"] == INDEXED and status["operation"].startswith("op-")
+
+def test_ingestion_status_round_trips_through_the_database(app_module):
+    now = time.time()
+    record = {"gcs_uri": "gs://books/round-trip.pdf", "status": "importing", "operation": "op-7",
+              "error": None, "submitted_at": now, "updated_at": now}
+    app_module.db_service.save_ingestion_files([record])
+    app_module.db_service.save_ingestion_files([dict(record, status=INDEXED)])
+
+    loaded = app_module.db_service.load_ingestion_file("gs://books/round-trip.pdf")
+    assert loaded["status"] == INDEXED and loaded["operation"] == "op-7"
+    assert abs(loaded["submitted_at"] - now) < 1
@@ -0,0 +1,32 @@
+import uuid
+from app.models import MAX_TOPIC_QUERY_LENGTH
+
+def test_job_status_reports_resolved_topic(app_module, client):
+    job_id = str(uuid.uuid4())
+    app_module.job_store.create(job_id, "teacher-x", "PHY12_01_02", topic_query="coulomb's law")
+    assert client.get(f"/api/v1/jobs/{job_id}").json()["topic_id"] == "PHY12_01_02"
+
+def test_topic_query_longer_than_the_job_column_is_rejected(client):
+    too_long = "x" * (MAX_TOPIC_QUERY_LENGTH + 1)
+    assert client.post("/api/v1/generate", json={"topic_query": too_long}).status_code == 422
+    assert client.post("/api/v1/generate-batch", json={"topic_ids": [too_long]}).status_code == 422
+
+def test_long_failure_messages_still_reach_the_job_row(app_module):
+    from sqlalchemy import text
+    from app.models import JobStatus
+    from app.services.db import JOB_STEP_MAX_CHARS, JOB_TEXT_MAX_CHARS
+
+    job_id = str(uuid.uuid4())
+    error = "Segment render failed (" + "x" * 500 + ")"
+    app_module.job_store.create(job_id, "t" * 300, "PHY12_01_02")
+    app_module.job_store.transition(job_id, JobStatus.FAILED, error)
+
+    with app_module.db_service.engine.connect() as conn:
+        teacher_id, status, step, message = conn.execute(
+            text("SELECT teacher_id, status, current_step, message FROM teacher_jobs WHERE job_id = :id"), {"id": job_id}
+        ).fetchone()
+    assert status == "failed" and message == error
+    assert len(step) == JOB_STEP_MAX_CHARS and len(teacher_id) == JOB_TEXT_MAX_CHARS
+
+def test_teacher_fields_longer_than_the_job_column_are_rejected(client):
+    assert client.post("/api/v1/generate", json={"topic_id": "PHY12_01_02", "teacher_name": "t" * 300}).status_code == 422
@@ -0,0 +1,15 @@
+from benchmarks.load_test import compare, summarize
+
+BASE = {"chat": summarize([0.1] * 100, 0, 10.0)}
+
+def test_missing_baseline_is_a_regression():
+    assert compare({"generate": summarize([0.1] * 10, 0, 1.0)}, BASE, 0.25)
+
+def test_same_numbers_pass():
+    assert compare({"chat": summarize([0.1] * 100, 0, 10.0)}, BASE, 0.25) == []
+
+def test_errors_are_a_regression_even_when_latency_improves():
+    # Rejected requests are fast, so they can make p95 and throughput look better
+    current = summarize([0.05] * 40, 60, 2.0)
+    regressions = compare({"chat": current}, BASE, 0.25)
+    assert len(regressions) == 1 and "error rate 60.0%" in regressions[0]
@@ -0,0 +1,21 @@
+import time
+
+def _run_job(client, topic_id):
+    job_id = client.post("/api/v1/generate", json={"topic_id": topic_id}).json()["job_id"]
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        status = client.get(f"/api/v1/jobs/{job_id}").json()["status"]
+        if status in ("COMPLETED", "FAILED"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_lesson_counter_only_labels_catalog_topics(client):
+    _run_job(client, "PHY12_01_03")
+    _run_job(client, "NOT_A_REAL_TOPIC_42")
+
+    metrics = client.get("/metrics").text
+    lessons = [line for line in metrics.splitlines() if line.startswith("lessons_total{")]
+    assert any('topic_id="PHY12_01_03"' in line for line in lessons)
+    assert any('topic_id="unknown"' in line for line in lessons)
+    assert not any("NOT_A_REAL_TOPIC_42" in line for line in lessons)
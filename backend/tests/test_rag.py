@@ -0,0 +1,65 @@
+from app.models import TopicScope
+from app.services import rag
+from app.services.rag import RAGService, TopicContextCache
+
+SCOPE = TopicScope(topic_id="PHY12_01_02", title="Coulomb's law", book_id="TN_PHY_12", page_start=10, page_end=14)
+
+def service():
+    svc = RAGService.__new__(RAGService) # no Discovery Engine client needed for request building
+    svc.data_store_id = "textbooks-search"
+    return svc
+
+def test_content_imports_search_shared_store_unfiltered(monkeypatch):
+    monkeypatch.setattr(rag, "SCOPE_FIELD", "")
+    monkeypatch.setattr(rag, "BOOK_DATA_STORES", {})
+    assert service()._scope_request(SCOPE) == ("textbooks-search", "")
+
+def test_per_book_store_needs_no_filter(monkeypatch):
+    monkeypatch.setattr(rag, "SCOPE_FIELD", "book_id")
+    monkeypatch.setattr(rag, "BOOK_DATA_STORES", {"TN_PHY_12": "phy12-store"})
+    assert service()._scope_request(SCOPE) == ("phy12-store", "")
+
+def test_metadata_filter_when_configured(monkeypatch):
+    monkeypatch.setattr(rag, "SCOPE_FIELD", "book_id")
+    monkeypatch.setattr(rag, "BOOK_DATA_STORES", {})
+    monkeypatch.setattr(rag, "FILTER_PAGES", True)
+    store, search_filter = service()._scope_request(SCOPE)
+    assert store == "textbooks-search"
+    assert search_filter == 'book_id: ANY("TN_PHY_12") AND page >= 10 AND page <= 14'
+
+def test_pinned_context_serves_only_the_query_it_answers(monkeypatch):
+    cache = TopicContextCache(ttl=60, max_topics=2)
+    monkeypatch.setattr(rag, "topic_context_cache", cache)
+    cache.pin(SCOPE.topic_id, rag.topic_query(SCOPE), "pinned context")
+    searched = []
+
+    svc = service()
+    svc._search = lambda query, *args: searched.append(query) or f"results for {query}"
+    assert svc.search("explain  Coulomb's law", SCOPE) == "pinned context"
+    assert svc.search("why is the force inverse square?", SCOPE) == "results for why is the force inverse square?"
+    assert searched == ["why is the force inverse square?"]
+
+def test_pinned_topics_are_lru_bounded():
+    cache = TopicContextCache(ttl=60, max_topics=2)
+    cache.pin("a", "q", "A")
+    cache.pin("b", "q", "B")
+    assert cache.get("a", "q") == "A" # a is now most recent
+    cache.pin("c", "q", "C")
+    assert cache.get("b", "q") is None
+    assert cache.get("a", "q") == "A" and cache.get("c", "q") == "C"
+
+def test_unknown_topics_are_not_cached_as_unscoped(app_module, monkeypatch):
+    rows = {}
+    monkeypatch.setattr(app_module.db_service, "get_topic_scope", lambda topic_id: rows.get(topic_id))
+    monkeypatch.setattr(app_module, "topic_scopes", app_module.BoundedCache(2))
+
+    assert app_module.resolve_topic_scope("NEW_01_01").book_id is None
+    assert len(app_module.topic_scopes) == 0
+    # The book is ingested later: its scope is picked up
+    rows["NEW_01_01"] = TopicScope(topic_id="NEW_01_01", book_id="NEW", page_start=3, page_end=5)
+    assert app_module.resolve_topic_scope("NEW_01_01").book_id == "NEW"
+
+    for topic_id in ("A", "B", "C"):
+        rows[topic_id] = TopicScope(topic_id=topic_id)
+        app_module.resolve_topic_scope(topic_id)
+    assert len(app_module.topic_scopes) == 2
@@ -0,0 +1,64 @@
+import threading
+from app.services.renderer import SegmentedRenderer, segment_key, split_script_sections
+
+SCRIPT = """## Intro
+Hook the class.
+## Concept
+Charges attract or repel.
+## Examples
+Rubbing a balloon on hair.
+## Summary
+Like charges repel.
+"""
+
+class _HeyGen:
+    def __init__(self, fail_once=()):
+        self.rendered = []
+        self._fail_once = set(fail_once)
+        self._lock = threading.Lock()
+
+    def generate_video(self, text):
+        with self._lock:
+            if text in self._fail_once:
+                self._fail_once.discard(text)
+                raise RuntimeError("render farm hiccup")
+            self.rendered.append(text)
+        return {"data": {"video_id": f"v{abs(hash(text))}"}}
+
+    def wait_for_video(self, video_id, cancelled=None):
+        return f"https://video/{video_id}.mp4"
+
+class _Stitcher:
+    def stitch_urls(self, urls, destination):
+        return f"https://stitched/{destination}#{len(urls)}"
+
+class _Segments:
+    def __init__(self):
+        self.rows = {}
+
+    def get_render_segment(self, key):
+        return self.rows.get(key)
+
+    def save_render_segment(self, key, url):
+        self.rows[key] = url
+
+def test_script_splits_at_its_section_headings():
+    assert [name for name, _ in split_script_sections(SCRIPT)] == ["intro", "concept", "examples", "summary"]
+    assert split_script_sections("Just one paragraph.") == [("full", "Just one paragraph.")]
+
+def test_only_changed_sections_are_rerendered():
+    heygen, segments = _HeyGen(), _Segments()
+    renderer = SegmentedRenderer(heygen, _Stitcher(), segments)
+    assert renderer.render(SCRIPT, "English").endswith("#4")
+
+    rewritten = SCRIPT.replace("Rubbing a balloon on hair.", "A comb picking up paper.")
+    heygen.rendered.clear()
+    renderer.render(rewritten, "English")
+    assert heygen.rendered == ["## Examples\nA comb picking up paper."]
+
+def test_failed_segment_is_retried_alone():
+    sections = split_script_sections(SCRIPT)
+    heygen, segments = _HeyGen(fail_once=[sections[1][1]]), _Segments()
+    SegmentedRenderer(heygen, _Stitcher(), segments).render(SCRIPT, "English")
+    assert sorted(heygen.rendered) == sorted(text for _, text in sections)
+    assert segment_key(sections[1][1], "English") in segments.rows
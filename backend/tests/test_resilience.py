@@ -0,0 +1,62 @@
+import time
+import pytest
+from app.services.resilience import HEDGE_INITIAL_DELAY_SECONDS, HEDGE_MIN_SAMPLES, Upstream, UpstreamUnavailable
+
+def slow(seconds, result="ok"):
+    def fn():
+        time.sleep(seconds)
+        return result
+    return fn
+
+def test_refused_hedge_waits_without_spinning():
+    u = Upstream("test-no-budget", hedge=True)
+    u.hedge_delay = lambda *_: 0.01
+    u._hedges = 10**6 # hedge budget used up
+
+    cpu, wall = time.process_time(), time.monotonic()
+    assert u.call(slow(0.5), timeout=5) == "ok"
+    assert time.monotonic() - wall >= 0.5
+    assert time.process_time() - cpu < 0.1
+    assert u._hedges == 10**6
+
+def test_slow_primary_is_hedged():
+    u = Upstream("test-hedge", hedge=True)
+    u.hedge_delay = lambda *_: 0.05
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(1.0 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    start = time.monotonic()
+    assert u.call(fn, timeout=5) == 2
+    assert time.monotonic() - start < 0.5
+    assert u._hedges == 1
+
+def test_timeout_raises_and_breaker_opens():
+    u = Upstream("test-timeout", hedge=False)
+    u.breaker.threshold = 2
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            u.call(slow(0.3), timeout=0.05)
+    assert u.breaker.state == "open"
+    with pytest.raises(UpstreamUnavailable, match="circuit open"):
+        u.call(slow(0), timeout=1)
+
+def test_spent_budget_does_not_count_against_the_upstream():
+    u = Upstream("test-budget", hedge=False)
+    u.breaker.threshold = 1
+    for _ in range(3):
+        with pytest.raises(UpstreamUnavailable, match="no time left"):
+            u.call(slow(0), timeout=0)
+    assert u.breaker.state == "closed"
+    assert u.call(slow(0), timeout=1) == "ok"
+
+def test_call_classes_keep_separate_latency_windows():
+    u = Upstream("test-classes", hedge=False)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        u.call(slow(0), timeout=1, call_class="ChatAgent")
+        u.call(slow(0.01), timeout=1, call_class="ScriptwriterAgent")
+    assert u.latency("ChatAgent").percentile(95) < 0.01 <= u.latency("ScriptwriterAgent").percentile(95)
+    assert u.hedge_delay("ValidationAgent") == HEDGE_INITIAL_DELAY_SECONDS
@@ -0,0 +1,10 @@
+import os
+import re
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "..", "database", "schema.sql")
+
+def test_every_table_is_dropped_by_the_reset_block():
+    sql = open(SCHEMA).read()
+    created = set(re.findall(r"CREATE TABLE IF NOT EXISTS (\w+)", sql))
+    dropped = set(re.findall(r"DROP TABLE IF EXISTS (\w+) CASCADE;", sql))
+    assert created == dropped
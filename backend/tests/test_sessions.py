@@ -0,0 +1,29 @@
+from app.services import sessions as sessions_module
+from app.services.sessions import ChatSessionStore, MAX_RECENT_TURNS
+
+class _Db:
+    def __init__(self):
+        self.rows = {}
+
+    def save_chat_session(self, session_id, summary, turns, turn_count):
+        self.rows[session_id] = {"summary": summary, "turns": [list(t) for t in turns], "turn_count": turn_count}
+
+    def load_chat_session(self, session_id):
+        return self.rows.get(session_id)
+
+def test_old_turns_fold_into_the_summary_and_survive_eviction(monkeypatch):
+    db = _Db()
+    store = ChatSessionStore(db)
+    session = store.get_or_create(None)
+    for i in range(MAX_RECENT_TURNS):
+        store.append_exchange(session, f"question {i}", f"answer {i}")
+
+    assert store.fold_into_summary(session, lambda previous, turns: previous + f"[{len(turns)} turns]")
+    assert len(session.turns) == MAX_RECENT_TURNS and session.turn_count == 2 * MAX_RECENT_TURNS
+    assert session.turns[0] == ("user", f"question {MAX_RECENT_TURNS // 2}")
+
+    # Evicted from memory (or another instance): the stored window and summary come back
+    monkeypatch.setattr(sessions_module, "MAX_SESSIONS_IN_MEMORY", 0)
+    reloaded = store.get_or_create(session.session_id)
+    assert reloaded is not session
+    assert reloaded.summary == f"[{MAX_RECENT_TURNS} turns]" and reloaded.turns == session.turns
@@ -0,0 +1,28 @@
+from app.services.stitcher import (STRATEGY_AUDIO, STRATEGY_COPY, STRATEGY_NORMALIZE, STRATEGY_REENCODE,
+                                   build_lesson_playlist, choose_strategy, parse_media_playlist)
+
+def _probe(codec="h264", width=1280, fps="30/1", audio="aac", sample_rate=48000, duration=20.0):
+    return {
+        "video": {"codec": codec, "width": width, "height": 720, "pix_fmt": "yuv420p", "fps": fps,
+                  "time_base": "1/15360", "profile": "High"},
+        "audio": {"codec": audio, "sample_rate": sample_rate, "channels": 2} if audio else None,
+        "duration": duration,
+    }
+
+def test_cheapest_correct_strategy_is_chosen():
+    core = _probe(duration=300)
+    assert choose_strategy([_probe(), core]) == STRATEGY_COPY
+    assert choose_strategy([_probe(sample_rate=44100), core]) == STRATEGY_AUDIO
+    assert choose_strategy([_probe(width=1920), core]) == STRATEGY_NORMALIZE
+    # A long intro or a core that isn't H.264/AAC falls back to a full re-encode
+    assert choose_strategy([_probe(width=1920, duration=600), core]) == STRATEGY_REENCODE
+    assert choose_strategy([_probe(width=1920), _probe(codec="vp9", duration=300)]) == STRATEGY_REENCODE
+
+def test_lesson_playlist_joins_intro_and_core_segments():
+    intro = parse_media_playlist("#EXTM3U\n#EXTINF:4.0,\nintro0.ts\n#EXT-X-ENDLIST\n", "https://cdn/intro/index.m3u8")
+    core = [(6.0, "https://cdn/core/seg0.ts"), (5.5, "https://cdn/core/seg1.ts")]
+    playlist = build_lesson_playlist([intro, core])
+
+    assert intro == [(4.0, "https://cdn/intro/intro0.ts")]
+    assert "#EXT-X-DISCONTINUITY" in playlist and "#EXT-X-TARGETDURATION:6" in playlist
+    assert parse_media_playlist(playlist, "https://cdn/lesson.m3u8") == intro + core
@@ -0,0 +1,48 @@
+from app.services import topic_index as topic_index_module
+from app.services.topic_index import TopicIndex
+
+CATALOG = [
+    {"topic_id": "PHY12_01_02", "title": "Coulomb's Law", "chapter_title": "Electrostatics", "book_id": "PHY12"},
+    {"topic_id": "PHY12_01_03", "title": "Electric Field Lines", "chapter_title": "Electrostatics", "book_id": "PHY12"},
+    {"topic_id": "PHY12_02_01", "title": "Ohm's Law", "chapter_title": "Current Electricity", "book_id": "PHY12"},
+    {"topic_id": "BIO11_03_01", "title": "Photosynthesis", "chapter_title": "Plant Physiology", "book_id": "BIO11"},
+]
+
+def _index():
+    index = TopicIndex()
+    index.add_catalog(CATALOG)
+    return index
+
+def test_free_text_resolves_through_ids_synonyms_and_misspellings():
+    index = _index()
+    assert index.resolve("PHY12_02_01") == "PHY12_02_01"
+    assert index.resolve("Explain Coulombs law to my class") == "PHY12_01_02"
+    assert index.resolve("teach plants") == "BIO11_03_01"
+    assert index.resolve("electrik feild lines") == "PHY12_01_03"
+    assert index.resolve("quantum chromodynamics") is None
+
+def test_ambiguous_text_resolves_to_nothing():
+    index = _index()
+    assert index.resolve("explain law") is None
+    assert {m["topic_id"] for m in index.search("explain law", limit=2)} == {"PHY12_01_02", "PHY12_02_01"}
+    assert index.resolve("ohms law") == "PHY12_02_01"
+
+def test_reindexing_a_book_replaces_only_its_topics():
+    index = _index()
+    index.add_book("PHY12", [{"topic_id": "PHY12_09_01", "title": "Wave Optics", "chapter_title": "Optics"}])
+    assert "PHY12_01_02" not in index and "PHY12_09_01" in index
+    assert index.resolve("photosynthesis") == "BIO11_03_01"
+
+def test_misspelling_memo_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(topic_index_module, "FUZZY_MEMO_SIZE", 2)
+    index = _index()
+    for word in ("coulomd", "photosinthesis", "coulomd", "electrik"):
+        index.search(word)
+    assert list(index._fuzzy) == ["coulomd", "electrik"]
+
+def test_ambiguous_request_gets_404_with_suggestions(app_module, client, monkeypatch):
+    index = _index()
+    monkeypatch.setattr(app_module, "topic_index", index)
+    response = client.post("/api/v1/generate", json={"topic_query": "explain law"})
+    assert response.status_code == 404
+    assert "Coulomb" in response.json()["detail"] and "Ohm" in response.json()["detail"]
@@ -0,0 +1,21 @@
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from app.services.tracing import JsonLinesFileExporter
+
+def test_file_exporter_rotates_at_size_cap(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonLinesFileExporter(str(path), max_bytes=2000)
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = provider.get_tracer("test")
+
+    for i in range(50):
+        with tracer.start_as_current_span(f"span-{i}"):
+            pass
+
+    rotated = tmp_path / "traces.jsonl.1"
+    assert rotated.exists()
+    # Each file overshoots the cap by at most one export batch (one span here)
+    assert path.stat().st_size < 2000 + 1500
+    assert rotated.stat().st_size < 2000 + 1500
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["traces.jsonl", "traces.jsonl.1"]
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import threading
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "scripts"))
+from upload_textbooks import UploadState, collect_files, trigger_ingestion
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+
+def test_same_named_books_keep_their_folders(tmp_path):
+    _touch(tmp_path / "class11" / "physics.pdf")
+    _touch(tmp_path / "class12" / "physics.pdf")
+    names = [name for _, name in collect_files([str(tmp_path)])]
+    assert names == ["class11/physics.pdf", "class12/physics.pdf"]
+
+def test_glob_names_are_relative_to_its_fixed_prefix(tmp_path):
+    _touch(tmp_path / "books" / "tn" / "bio.pdf")
+    files = collect_files([str(tmp_path / "books" / "**" / "*.pdf")])
+    assert [name for _, name in files] == ["tn/bio.pdf"]
+
+def test_clashing_names_are_rejected(tmp_path):
+    _touch(tmp_path / "a" / "physics.pdf")
+    _touch(tmp_path / "b" / "physics.pdf")
+    with pytest.raises(ValueError, match="physics.pdf"):
+        collect_files([str(tmp_path / "a"), str(tmp_path / "b")])
+
+def test_state_saves_while_workers_mark(tmp_path):
+    state = UploadState(str(tmp_path / "state.json"))
+
+    def worker(n):
+        for i in range(5000):
+            state.mark(f"textbooks/{n}/{i}.pdf", "crc")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        state.save()
+        with open(state.path) as f:
+            json.load(f) # never torn
+    for t in threads:
+        t.join()
+    state.save()
+    assert len(UploadState(state.path).done) == 20000
+    assert os.listdir(tmp_path) == ["state.json"] # no temp files left behind
+
+def test_ingestion_is_split_into_discovery_engine_sized_imports():
+    imports = []
+
+    class _Rag:
+        def import_documents(self, uris):
+            imports.append(list(uris))
+            return f"op-{len(imports)}"
+
+    uris = [f"gs://bucket/textbooks/book{i}.pdf" for i in range(250)]
+    assert trigger_ingestion(uris, _Rag()) == ["op-1", "op-2", "op-3"]
+    assert [len(batch) for batch in imports] == [100, 100, 50]
+    assert sum(imports, []) == uris
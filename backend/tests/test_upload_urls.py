@@ -0,0 +1,24 @@
+def test_upload_urls_caps_files_per_request(app_module, client):
+    files = [{"filename": f"book-{i}.pdf", "size": 1024} for i in range(app_module.MAX_UPLOAD_BATCH + 1)]
+    response = client.post("/api/v1/upload-urls", json={"files": files})
+    assert response.status_code == 400
+
+def test_upload_urls_signs_each_file(client):
+    response = client.post("/api/v1/upload-urls", json={"files": [{"filename": "a.pdf", "size": 1024},
+                                                                  {"filename": "b.pdf", "size": 2048}]})
+    assert response.status_code == 200
+    assert len(response.json()["uploads"]) == 2
+
+def test_single_upload_url_is_signed_off_the_event_loop(app_module, client, monkeypatch):
+    import threading
+    threads = []
+
+    def sign(filename, content_type, size=None):
+        threads.append(threading.current_thread())
+        return {"upload_url": f"https://signed/{filename}"}
+
+    monkeypatch.setattr(app_module.storage_service, "generate_upload_url", sign)
+    response = client.post("/api/v1/upload-url", json={"filename": "a.pdf", "size": 1024})
+    assert response.status_code == 200 and response.json()["upload_url"] == "https://signed/a.pdf"
+    # TestClient runs the event loop in its own thread; a threadpool worker is a different one
+    assert threads[0].name.startswith("AnyIO worker thread")
@@ -0,0 +1,82 @@
+import threading
+from app.services.write_behind import WriteBehindBuffer
+
+class PoisonRow(Exception):
+    pass
+
+class FakeTable:
+    """Accepts rows unless their value is 'poison' (permanent) or 'flaky' while down."""
+    def __init__(self):
+        self.rows = {}
+        self.calls = 0
+        self.down = False
+        self.lock = threading.Lock()
+
+    def upsert(self, rows):
+        with self.lock:
+            self.calls += 1
+            if self.down:
+                raise ConnectionError("database unreachable")
+            if any(row["value"] == "poison" for row in rows):
+                raise PoisonRow("value violates a constraint")
+            for row in rows:
+                self.rows[row["key"]] = row["value"]
+
+def buffer(table, **kwargs):
+    # A long interval keeps the background thread out of the way; tests flush explicitly
+    return WriteBehindBuffer("test", table.upsert, interval=60, batch_size=100,
+                             is_permanent=lambda e: isinstance(e, PoisonRow), **kwargs)
+
+def test_latest_row_per_key_wins():
+    table = FakeTable()
+    buf = buffer(table)
+    for i in range(5):
+        buf.put(i % 2, {"key": i % 2, "value": f"v{i}"})
+    assert buf.flush() == 2
+    assert table.rows == {0: "v4", 1: "v3"}
+
+def test_poison_row_is_dropped_and_does_not_block_others():
+    table = FakeTable()
+    buf = buffer(table)
+    buf.put("a", {"key": "a", "value": "ok-a"})
+    buf.put("bad", {"key": "bad", "value": "poison"})
+    buf.put("b", {"key": "b", "value": "ok-b"})
+
+    assert buf.flush() == 2
+    assert table.rows == {"a": "ok-a", "b": "ok-b"}
+    assert len(buf) == 0 # dropped, not re-queued
+
+    buf.put("c", {"key": "c", "value": "ok-c"})
+    assert buf.flush() == 1
+    assert table.rows["c"] == "ok-c"
+
+def test_transient_failures_retry_then_give_up():
+    table = FakeTable()
+    buf = buffer(table, max_attempts=3)
+    table.down = True
+    buf.put("a", {"key": "a", "value": "v"})
+    for _ in range(2):
+        assert buf.flush() == 0
+        assert len(buf) == 1
+    table.down = False
+    assert buf.flush() == 1
+    assert table.rows == {"a": "v"}
+
+    table.down = True
+    buf.put("b", {"key": "b", "value": "v"})
+    for _ in range(3):
+        buf.flush()
+    assert len(buf) == 0 # capped at max_attempts
+
+def test_newer_row_replaces_failed_one():
+    table = FakeTable()
+    buf = buffer(table, max_attempts=2)
+    table.down = True
+    buf.put("a", {"key": "a", "value": "v1"})
+    assert buf.flush() == 0
+    buf.put("a", {"key": "a", "value": "v2"}) # fresh row, fresh attempt count
+    assert buf.flush() == 0
+    assert len(buf) == 1
+    table.down = False
+    assert buf.flush() == 1
+    assert table.rows == {"a": "v2"}
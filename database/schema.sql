@@ -1,8 +1,12 @@
 -- Database Schema for Textbook-to-Video RAG Platform
 -- Based on User Architecture
 -- WARNING: This drops existing tables to ensure clean schema update during POC.
+DROP TABLE IF EXISTS ingestion_files CASCADE;
+DROP TABLE IF EXISTS chat_sessions CASCADE;
 DROP TABLE IF EXISTS teacher_jobs CASCADE;
 DROP TABLE IF EXISTS video_library CASCADE;
+DROP TABLE IF EXISTS render_segments CASCADE;
+DROP TABLE IF EXISTS lesson_scripts CASCADE;
 DROP TABLE IF EXISTS visual_assets CASCADE;
 DROP TABLE IF EXISTS topics CASCADE;
 DROP TABLE IF EXISTS chapters CASCADE;
@@ -40,10 +44,12 @@ CREATE TABLE IF NOT EXISTS topics (
 -- 3. Visual Assets: Extracted diagrams and flowcharts
 CREATE TABLE IF NOT EXISTS visual_assets (
     asset_id SERIAL PRIMARY KEY,
+    book_id VARCHAR(50),
     topic_id VARCHAR(50) REFERENCES topics(topic_id),
     image_url TEXT NOT NULL,       -- GCS URL of the cropped diagram
     description TEXT,              -- AI Generated description (Vision Agent)
     original_page_number INTEGER,
+    phash VARCHAR(16),             -- Perceptual hash; one row per distinct figure per book
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -51,10 +57,31 @@ CREATE TABLE IF NOT EXISTS visual_assets (
 CREATE TABLE IF NOT EXISTS video_library (
     video_id SERIAL PRIMARY KEY,
     topic_id VARCHAR(50) REFERENCES topics(topic_id),
+    language VARCHAR(20) DEFAULT 'English',
     video_url TEXT NOT NULL,       -- Final MP4 URL in GCS
-    transcript TEXT,               -- Full transcript for validation
+    transcript TEXT,               -- Full transcript for validation (the core script, in this language)
+    script_version VARCHAR(16),    -- Base script version this video was rendered from (lesson_scripts)
     confidence_score FLOAT,        -- 0.0 to 1.0 (Validator Agent Output)
-    status VARCHAR(50) DEFAULT 'processed', -- 'processed', 'flagged'
+    status VARCHAR(50) DEFAULT 'processed', -- 'processed', 'flagged' (rejected after rewrites), 'unvalidated' (validator unavailable)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 4b. Lesson Scripts: the base-language fact brief + core script per topic,
+--     and its translations, keyed by (topic, language, base script version)
+CREATE TABLE IF NOT EXISTS lesson_scripts (
+    topic_id VARCHAR(50) REFERENCES topics(topic_id),
+    language VARCHAR(20) NOT NULL,
+    script_version VARCHAR(16) NOT NULL, -- Hash of the base-language script
+    script TEXT NOT NULL,
+    fact_brief TEXT,               -- Base language only: research output the script was written from
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (topic_id, language, script_version)
+);
+
+-- 4c. Render Segments: HeyGen renders of single script sections, keyed by content
+CREATE TABLE IF NOT EXISTS render_segments (
+    segment_key VARCHAR(40) PRIMARY KEY, -- sha1 of language + section text
+    video_url TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -64,14 +91,45 @@ CREATE TABLE IF NOT EXISTS teacher_jobs (
     teacher_id VARCHAR(255) NOT NULL,
     topic_query VARCHAR(255),      -- Original input e.g. "Explain Plants"
     matched_topic_id VARCHAR(50) REFERENCES topics(topic_id),
+    batch_id UUID,                 -- Set for lessons queued through /generate-batch
     status VARCHAR(50) DEFAULT 'queued', -- 'queued', 'researching', 'scripting', 'rendering', 'validating', 'completed', 'failed'
     current_step VARCHAR(100),     -- For detailed UI progress bars
+    message TEXT,                  -- Last status message shown to the teacher
+    result_url TEXT,               -- Final stitched lesson URL
+    stage_durations JSONB,         -- Seconds spent per pipeline stage
     result_video_id INTEGER REFERENCES video_library(video_id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 6. Chat Sessions: Server-side conversation state
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id VARCHAR(64) PRIMARY KEY,
+    summary TEXT,                  -- Rolling summary of turns older than the window
+    recent_turns JSONB,            -- Last few turns verbatim: [["user", "..."], ["assistant", "..."]]
+    turn_count INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 7. Ingestion Files: Discovery Engine indexing progress per uploaded file
+CREATE TABLE IF NOT EXISTS ingestion_files (
+    gcs_uri VARCHAR(1024) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL,   -- 'pending', 'queued', 'importing', 'indexed', 'failed'
+    operation VARCHAR(255),        -- Discovery Engine import operation id
+    error TEXT,
+    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for performance
 CREATE INDEX idx_books_meta ON books(subject, grade_level, board);
 CREATE INDEX idx_topics_title ON topics(title);
+-- One library entry per topic and language (upsert target); INCLUDE keeps lookups index-only
+CREATE UNIQUE INDEX idx_video_library_topic_lang ON video_library(topic_id, language)
+    INCLUDE (video_url, confidence_score, status);
+CREATE INDEX idx_jobs_matched_topic ON teacher_jobs(created_at, matched_topic_id); -- Warm-start hot topics
+CREATE INDEX idx_visual_assets_topic ON visual_assets(topic_id);
+CREATE UNIQUE INDEX idx_visual_assets_book_phash ON visual_assets(book_id, phash); -- Re-extraction is idempotent
 CREATE INDEX idx_jobs_teacher ON teacher_jobs(teacher_id);
+CREATE INDEX idx_jobs_batch ON teacher_jobs(batch_id);
+CREATE INDEX idx_chat_sessions_updated ON chat_sessions(updated_at); -- For expiring stale sessions
@@ -56,6 +56,13 @@ export default function TeacherDashboard() {
   const [tone, setTone] = useState("Concept Focused");
   const [lang, setLang] = useState("English");
 
+  // Warm the topic's retrieval context as soon as it is opened
+  useEffect(() => {
+    if (!selectedTopic) return;
+    fetch(`/api/v1/topics/${encodeURIComponent(selectedTopic)}/prefetch`, { method: 'POST' })
+      .catch(err => console.warn("Topic prefetch failed", err));
+  }, [selectedTopic]);
+
   const toggleUnit = (unitId: string) => {
     setExpandedUnits(prev => prev.includes(unitId) ? prev.filter(id => id !== unitId) : [...prev, unitId]);
   }
@@ -157,7 +164,7 @@ export default function TeacherDashboard() {
   return (
     <div className="flex h-screen bg-slate-50 text-slate-900 font-sans overflow-hidden relative">
 
-      <ChatInterface isOpen={isChatOpen} onClose={() => setIsChatOpen(false)} />
+      <ChatInterface isOpen={isChatOpen} onClose={() => setIsChatOpen(false)} topicId={selectedTopic} />
 
       {/* Floating Chat Toggle (Visible on Desktop) */}
       {!isChatOpen && (
@@ -10,14 +10,17 @@ interface Message {
 interface ChatInterfaceProps {
     isOpen: boolean;
     onClose: () => void;
+    topicId?: string | null; // Scopes answers to the topic open in the book tree
 }
 
-export default function ChatInterface({ isOpen, onClose }: ChatInterfaceProps) {
+export default function ChatInterface({ isOpen, onClose, topicId }: ChatInterfaceProps) {
     const [messages, setMessages] = useState<Message[]>([
         { role: 'assistant', content: 'Hello! I can answer questions about your uploaded textbook. What would you like to know?' }
     ]);
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
+    // Server keeps the conversation; we only send the new message + session id
+    const [sessionId, setSessionId] = useState<string | null>(null);
     const messagesEndRef = useRef<HTMLDivElement>(null);
 
     const scrollToBottom = () => {
@@ -42,12 +45,13 @@ export default function ChatInterface({ isOpen, onClose }: ChatInterfaceProps) {
             const res = await fetch('/api/v1/chat', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: userMsg, history: messages })
+                body: JSON.stringify({ message: userMsg, session_id: sessionId, topic_id: topicId })
             });
 
             if (!res.ok) throw new Error("Failed to fetch response");
 
             const data = await res.json();
+            if (data.session_id) setSessionId(data.session_id);
             setMessages(prev => [...prev, { role: 'assistant', content: data.reply }]);
 
         } catch (error) {
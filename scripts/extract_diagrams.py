@@ -0,0 +1,66 @@
+"""
+Extracts diagrams from textbook PDFs into visual_assets and reports throughput.
+
+Works fully offline: without GOOGLE_CLOUD_PROJECT thumbnails are written to
+--output-dir, and without DB_HOST nothing is inserted (stats still printed).
+
+Usage:
+    python scripts/extract_diagrams.py samples/physics12.pdf --book-id TN_SCERT_PHY_12
+    python scripts/extract_diagrams.py textbooks/ --workers 4 --report diagrams.json
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from upload_textbooks import collect_files
+from app.services.db import DatabaseService
+from app.services.diagrams import DiagramExtractor, DIAGRAM_WORKERS
+
+def book_id_for(name):
+    """Book id from a collected file name: class12/physics.pdf -> class12_physics."""
+    return os.path.splitext(name)[0].replace("/", "_")
+
+def extract_all(files, extractor, book_id=None):
+    """Runs the extractor over collect_files() output; returns per-book stats."""
+    return [extractor.extract(path, book_id or book_id_for(name)) for path, name in files]
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract textbook diagrams into visual_assets.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--book-id", help="Book id for a single PDF (default: path under the input, without extension)")
+    parser.add_argument("--workers", type=int, default=DIAGRAM_WORKERS, help="Worker processes")
+    parser.add_argument("--output-dir", help="Local thumbnail directory when GCS is not configured")
+    parser.add_argument("--report", help="Write per-book stats as JSON here")
+    args = parser.parse_args()
+
+    try:
+        files = collect_files(args.inputs)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if not files:
+        print(f"No PDF files found in: {' '.join(args.inputs)}")
+        sys.exit(1)
+    if args.book_id and len(files) > 1:
+        print("--book-id only applies to a single PDF")
+        sys.exit(1)
+
+    extractor = DiagramExtractor(DatabaseService(), workers=args.workers, output_dir=args.output_dir)
+    results = extract_all(files, extractor, args.book_id)
+
+    pages = sum(r.get("pages", 0) for r in results)
+    seconds = sum(r.get("extract_seconds", 0) for r in results)
+    if seconds:
+        print(f"\n📊 {len(files)} book(s), {pages} pages at {pages / seconds:.1f} pages/s with {args.workers} workers")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
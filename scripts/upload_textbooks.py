@@ -1,39 +1,270 @@
 import os
 import sys
+import glob
+import json
+import math
+import base64
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import google_crc32c
 from google.cloud import storage
 
 # Configuration
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", "poc-project-477509")
 BUCKET_NAME = f"{PROJECT_ID}-assets"
 
-def upload_to_gcs(source_file_path, destination_blob_name):
-    """Uploads a file to the bucket."""
-    try:
-        storage_client = storage.Client(project=PROJECT_ID)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(destination_blob_name)
+DEFAULT_WORKERS = 8
+CHUNK_THRESHOLD = 64 * 1024 * 1024   # Files above this are split into composite parts
+CHUNK_SIZE = 32 * 1024 * 1024
+MAX_COMPOSE_PARTS = 32               # GCS compose limit per call
+READ_BLOCK = 1024 * 1024
+STATE_FILE = ".upload_state.json"
 
-        print(f"Uploading {source_file_path} to gs://{BUCKET_NAME}/{destination_blob_name}...")
-        blob.upload_from_filename(source_file_path)
+def crc32c_of(path, offset=0, length=None):
+    """Base64 CRC32C of a file (or a byte range of it), as GCS reports it."""
+    checksum = google_crc32c.Checksum()
+    remaining = length
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while remaining is None or remaining > 0:
+            block = f.read(READ_BLOCK if remaining is None else min(READ_BLOCK, remaining))
+            if not block:
+                break
+            checksum.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
 
-        print(f"✅ Upload Comlete! URI: gs://{BUCKET_NAME}/{destination_blob_name}")
-        print("ℹ️  Note: Vertex AI Search will automatically index this if the Data Store is connected.")
-        
-    except Exception as e:
-        print(f"❌ Error uploading to GCS: {e}")
+def _input_root(item):
+    """Directory that names are taken relative to: the directory itself, or a glob's fixed prefix."""
+    if os.path.isdir(item):
+        return item
+    parts = item.split(os.sep)
+    fixed = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        fixed.append(part)
+    return os.sep.join(fixed) or "."
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python upload_textbooks.py <path_to_pdf>")
+def collect_files(inputs):
+    """
+    Expands directories and globs into a de-duplicated, sorted list of
+    (path, name) for every PDF, where name is the path relative to the input it
+    was found under ("class12/physics/vol1.pdf"), so same-named books in
+    different folders stay apart.
+    """
+    found = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "**", "*.pdf"), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True)
+        root = os.path.abspath(_input_root(item))
+        for match in matches:
+            if os.path.isfile(match):
+                path = os.path.abspath(match)
+                found.setdefault(path, os.path.relpath(path, root).replace(os.sep, "/"))
+
+    by_name = {}
+    for path, name in found.items():
+        by_name.setdefault(name, []).append(path)
+    clashes = {name: paths for name, paths in by_name.items() if len(paths) > 1}
+    if clashes:
+        details = "; ".join(f"{name}: {', '.join(sorted(paths))}" for name, paths in sorted(clashes.items()))
+        raise ValueError(f"Different files would upload to the same name ({details}). Pass their common parent folder instead.")
+    return sorted(found.items())
+
+class UploadState:
+    """
+    Tiny JSON manifest of completed uploads so an interrupted run can resume
+    without re-hashing every remote object.
+    """
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock() # workers mark() while the main thread save()s
+        self.done = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.done = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable state file {path}: {e}")
+
+    def is_done(self, blob_name, crc):
+        with self._lock:
+            return self.done.get(blob_name) == crc
+
+    def mark(self, blob_name, crc):
+        with self._lock:
+            self.done[blob_name] = crc
+
+    def save(self):
+        """Writes a snapshot atomically: an interrupted save leaves the previous manifest intact."""
+        with self._lock:
+            snapshot = dict(self.done)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".upload_state.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+class BulkUploader:
+    """
+    Uploads many textbooks concurrently through a single shared storage.Client.
+    - Skips files whose CRC32C already matches the remote object.
+    - Splits large PDFs into parallel part uploads and composes them server-side.
+    - Part uploads are kept until compose succeeds, so a rerun resumes from the
+      parts that already landed.
+    """
+    def __init__(self, bucket_name=BUCKET_NAME, prefix="textbooks", workers=DEFAULT_WORKERS, state=None):
+        self.client = storage.Client(project=PROJECT_ID)
+        self.bucket = self.client.bucket(bucket_name)
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+        self.workers = workers
+        self.state = state or UploadState()
+
+    def blob_name_for(self, name):
+        """Object name for a file's name relative to its input root (see collect_files)."""
+        return f"{self.prefix}/{name}"
+
+    def _remote_matches(self, blob_name, crc):
+        blob = self.bucket.get_blob(blob_name)
+        return blob is not None and blob.crc32c == crc
+
+    def _upload_single(self, path, blob_name):
+        blob = self.bucket.blob(blob_name)
+        blob.upload_from_filename(path, content_type="application/pdf", checksum="crc32c")
+
+    def _upload_part(self, path, part_name, offset, length):
+        part_crc = crc32c_of(path, offset, length)
+        if self._remote_matches(part_name, part_crc):
+            return part_name  # Landed in a previous (interrupted) run
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        self.bucket.blob(part_name).upload_from_string(data, content_type="application/pdf", checksum="crc32c")
+        return part_name
+
+    def _upload_composite(self, path, blob_name, size, pool):
+        # Grow the chunk size if needed so a single compose call is enough
+        chunk = max(CHUNK_SIZE, math.ceil(size / MAX_COMPOSE_PARTS))
+        offsets = list(range(0, size, chunk))
+        part_names = [f"_parts/{blob_name}.part{i:02d}" for i in range(len(offsets))]
+
+        futures = [
+            pool.submit(self._upload_part, path, name, offset, min(chunk, size - offset))
+            for name, offset in zip(part_names, offsets)
+        ]
+        for fut in futures:
+            fut.result()
+
+        parts = [self.bucket.blob(name) for name in part_names]
+        destination = self.bucket.blob(blob_name)
+        destination.content_type = "application/pdf"
+        destination.compose(parts)
+
+        for part in parts:
+            try:
+                part.delete()
+            except Exception as e:
+                print(f"⚠️ Could not clean up part {part.name}: {e}")
+
+    def upload_file(self, path, name, part_pool):
+        """Returns (blob_name, outcome) where outcome is 'uploaded' or 'skipped'."""
+        blob_name = self.blob_name_for(name)
+        crc = crc32c_of(path)
+
+        if self.state.is_done(blob_name, crc) or self._remote_matches(blob_name, crc):
+            self.state.mark(blob_name, crc)
+            return blob_name, "skipped"
+
+        size = os.path.getsize(path)
+        if size > CHUNK_THRESHOLD:
+            print(f"📦 Uploading {name} in parallel parts ({size // (1024 * 1024)} MB)...")
+            self._upload_composite(path, blob_name, size, part_pool)
+        else:
+            self._upload_single(path, blob_name)
+
+        if not self._remote_matches(blob_name, crc):
+            raise Exception(f"Checksum mismatch after upload for {blob_name}")
+        self.state.mark(blob_name, crc)
+        return blob_name, "uploaded"
+
+    def upload_all(self, files):
+        """Uploads every (path, name) from collect_files; returns the gs:// URIs that are now present remotely."""
+        uploaded, skipped, failed = [], [], []
+        # Separate pool for parts so whole-file workers never deadlock waiting on themselves
+        with ThreadPoolExecutor(max_workers=self.workers) as file_pool, \
+             ThreadPoolExecutor(max_workers=self.workers) as part_pool:
+            futures = {file_pool.submit(self.upload_file, path, name, part_pool): path for path, name in files}
+            for fut in as_completed(futures):
+                path = futures[fut]
+                try:
+                    blob_name, outcome = fut.result()
+                    (uploaded if outcome == "uploaded" else skipped).append(blob_name)
+                    icon = "✅" if outcome == "uploaded" else "⏭️ "
+                    print(f"{icon} {outcome.capitalize()}: gs://{self.bucket_name}/{blob_name}")
+                except Exception as e:
+                    failed.append(path)
+                    print(f"❌ Error uploading {path}: {e}")
+                finally:
+                    self.state.save()
+
+        print(f"\n📊 Uploaded: {len(uploaded)} | Skipped (unchanged): {len(skipped)} | Failed: {len(failed)}")
+        return [f"gs://{self.bucket_name}/{name}" for name in uploaded + skipped], uploaded, failed
+
+def trigger_ingestion(gcs_uris, rag_service=None):
+    """
+    Starts Vertex AI Search imports for the batch, IMPORT_MAX_BATCH URIs each
+    (Discovery Engine caps a GcsSource at 100). Returns the operation names.
+    """
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
+    from app.services.ingestion import IMPORT_MAX_BATCH
+    if rag_service is None:
+        from app.services.rag import RAGService
+        rag_service = RAGService(project_id=PROJECT_ID)
+
+    return [rag_service.import_documents(gcs_uris[i:i + IMPORT_MAX_BATCH])
+            for i in range(0, len(gcs_uris), IMPORT_MAX_BATCH)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk upload textbooks to GCS.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent uploads")
+    parser.add_argument("--prefix", default="textbooks", help="Destination prefix inside the bucket")
+    parser.add_argument("--state-file", default=STATE_FILE, help="Resume manifest path")
+    parser.add_argument("--ingest", action="store_true", help="Trigger Vertex AI imports for the batch (100 files each)")
+    args = parser.parse_args()
+
+    try:
+        files = collect_files(args.inputs)
+    except ValueError as e:
+        print(f"❌ {e}")
         sys.exit(1)
-        
-    file_path = sys.argv[1]
-    if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
+    if not files:
+        print(f"No PDF files found in: {' '.join(args.inputs)}")
+        sys.exit(1)
+
+    print(f"📚 Found {len(files)} textbook(s). Uploading with {args.workers} workers...")
+    uploader = BulkUploader(prefix=args.prefix, workers=args.workers, state=UploadState(args.state_file))
+    gcs_uris, uploaded, failed = uploader.upload_all(files)
+
+    if args.ingest and uploaded:
+        trigger_ingestion(gcs_uris)
+    elif not args.ingest:
+        print("ℹ️  Note: Vertex AI Search will automatically index these if the Data Store is connected.")
+
+    if failed:
         sys.exit(1)
-        
-    filename = os.path.basename(file_path)
-    # Organize by 'textbooks/' prefix
-    destination = f"textbooks/{filename}"
-    
-    upload_to_gcs(file_path, destination)
+
+if __name__ == "__main__":
+    main()